@@ -1,16 +1,32 @@
 from .database import db, client
-from .security import security, get_current_user, JWT_SECRET, JWT_ALGORITHM, JWT_EXPIRATION_HOURS
+from .security import (
+    security,
+    get_current_user,
+    revoke_token,
+    revoke_user_tokens,
+    get_token_cache_stats,
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    JWT_EXPIRATION_HOURS,
+)
 from .settings import ROOT_DIR, pwd_context, stripe
+from .indexes import ensure_indexes, check_indexes, report_indexes
 
 __all__ = [
     "db",
     "client",
     "security",
     "get_current_user",
+    "revoke_token",
+    "revoke_user_tokens",
+    "get_token_cache_stats",
     "JWT_SECRET",
     "JWT_ALGORITHM",
     "JWT_EXPIRATION_HOURS",
     "ROOT_DIR",
     "pwd_context",
     "stripe",
+    "ensure_indexes",
+    "check_indexes",
+    "report_indexes",
 ]
@@ -0,0 +1,58 @@
+from typing import Optional
+import threading
+
+
+class CacheStats:
+    """Counters of one in-process cache, reported the same way by every cache
+
+    Counts are kept per worker process, so /admin/metrics shows the worker
+    that answered. Safe to update from threads.
+    """
+
+    def __init__(self, *counters: str, hits: bool = True):
+        names = (("hits", "misses") if hits else ()) + counters
+        self._counters = {name: 0 for name in names}
+        self._hits = hits
+        self._lock = threading.Lock()
+
+    def hit(self, counter: Optional[str] = None):
+        """Count a hit, and optionally which kind of hit it was"""
+        with self._lock:
+            self._counters["hits"] += 1
+            if counter:
+                self._counters[counter] += 1
+
+    def miss(self):
+        with self._lock:
+            self._counters["misses"] += 1
+
+    def add(self, *counters: str, **amounts):
+        """Add one to each of `counters` and each amount to its counter, atomically"""
+        with self._lock:
+            for counter in counters:
+                self._counters[counter] += 1
+            for counter, amount in amounts.items():
+                self._counters[counter] += amount
+
+    def reserve(self, counter: str, limit: int, peak: Optional[str] = None) -> bool:
+        """Add one to `counter` unless it reached `limit`, keeping `peak` at its highest value"""
+        with self._lock:
+            if self._counters[counter] >= limit:
+                return False
+            self._counters[counter] += 1
+            if peak:
+                self._counters[peak] = max(self._counters[peak], self._counters[counter])
+            return True
+
+    def get(self, counter: str):
+        return self._counters[counter]
+
+    def snapshot(self, **extra) -> dict:
+        """Every counter, the hit rate when the cache counts hits, then `extra`"""
+        with self._lock:
+            stats = dict(self._counters)
+        if self._hits:
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats.update(extra)
+        return stats
@@ -0,0 +1,159 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+import logging
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+# Every index the application relies on, declared once per collection.
+# Keyset pagination sorts on (created_at, id) descending, scoped by the owner
+# of the listing. Unique indexes back the places where the code assumes a
+# single match: user email, order reference, one review per order.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("role", ASCENDING), ("status", ASCENDING)], name="role_status"),
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("reference_number", ASCENDING)], name="reference_number_unique", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel([("cobbler_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="cobbler_created_at"),
+        IndexModel([("client_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="client_created_at"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at"),
+        IndexModel([("assignment_status", ASCENDING), ("assignment_next_attempt_at", ASCENDING)], name="assignment_queue"),
+    ],
+    "services": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "media": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category", ASCENDING), ("position", ASCENDING)], name="category_position"),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+    "reviews": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        IndexModel([("cobbler_id", ASCENDING)], name="cobbler_id"),
+    ],
+    "payment_transactions": [
+        IndexModel([("session_id", ASCENDING)], name="session_id"),
+        IndexModel([("order_id", ASCENDING), ("payment_status", ASCENDING)], name="order_id_payment_status"),
+    ],
+    "assignment_dead_letters": [
+        IndexModel([("order_id", ASCENDING)], name="order_id_unique", unique=True),
+        IndexModel([("created_at", DESCENDING)], name="created_at"),
+    ],
+    "settings": [
+        IndexModel([("type", ASCENDING)], name="type"),
+    ],
+    "geocode_cache": [
+        # Entries are dropped by MongoDB once expires_at has passed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "blobs": [
+        # Multikey index over the owners, for releasing an owner's references
+        IndexModel([("refs", ASCENDING)], name="refs"),
+    ],
+    "monthly_rollups": [
+        IndexModel([("scope", ASCENDING), ("year", ASCENDING), ("month", ASCENDING)], name="scope_year_month"),
+    ],
+}
+
+# Query shapes issued by the application: (collection, equality/range fields,
+# sort, where it comes from). check_indexes flags any shape no index serves.
+QUERY_SHAPES = [
+    ("users", ["id"], [], "user lookups by id"),
+    ("users", ["email"], [], "login and registration"),
+    ("users", ["role", "status"], [], "partner listings and cobbler assignment"),
+    ("orders", ["id"], [], "order lookups by id"),
+    ("orders", [], [("created_at", -1), ("id", -1)], "admin order listing and reports"),
+    ("orders", ["cobbler_id"], [("created_at", -1), ("id", -1)], "cobbler order listing and reports"),
+    ("orders", ["client_id"], [("created_at", -1), ("id", -1)], "client order listing"),
+    ("orders", ["status"], [("created_at", -1), ("id", -1)], "order listing by status"),
+    ("orders", ["assignment_status"], [("assignment_next_attempt_at", 1)], "assignment worker claims"),
+    ("services", ["id"], [], "service lookups and cart pricing"),
+    ("media", ["id"], [], "media lookups by id"),
+    ("media", ["category"], [("position", 1)], "carousel and gallery"),
+    ("media", [], [("created_at", -1)], "admin media listing"),
+    ("reviews", ["order_id"], [], "one review per order check"),
+    ("reviews", ["cobbler_id"], [], "cobbler reviews"),
+    ("payment_transactions", ["session_id"], [], "checkout status and Stripe webhook"),
+    ("payment_transactions", ["order_id", "payment_status"], [], "already-paid check"),
+    ("assignment_dead_letters", ["order_id"], [], "dead letter upserts"),
+    ("settings", ["type"], [], "app settings and catalog version"),
+    ("blobs", ["refs"], [], "blob reference release"),
+    ("monthly_rollups", ["scope", "year"], [("month", 1)], "yearly report breakdown"),
+]
+
+def _index_key(model: IndexModel) -> list:
+    return list(model.document["key"].items())
+
+def _serves(key: list, fields: list, sort: list) -> bool:
+    """Whether an index with this key pattern can answer the query shape without a scan or in-memory sort"""
+    if len(key) < len(fields) + len(sort):
+        return False
+    if {field for field, _ in key[:len(fields)]} != set(fields):
+        return False
+    if not sort:
+        return True
+    rest = key[len(fields):len(fields) + len(sort)]
+    forward = [(field, direction) for field, direction in sort]
+    backward = [(field, -direction) for field, direction in sort]
+    return rest in (forward, backward)
+
+async def ensure_indexes() -> dict:
+    """Create every declared index; existing identical indexes are left untouched
+
+    Indexes are created one at a time so a single failure (for example a unique
+    index over duplicate data) does not block the others. Returns the failures
+    as {"collection.index": error}.
+    """
+    failures = {}
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except Exception as e:
+                name = f"{collection}.{index.document['name']}"
+                failures[name] = str(e)
+                logger.warning(f"Could not create index {name}: {e}")
+    return failures
+
+async def check_indexes() -> dict:
+    """Compare the declared indexes and query shapes with what the database actually has"""
+    existing = {}
+    for collection in set(INDEXES) | {shape[0] for shape in QUERY_SHAPES}:
+        try:
+            info = await db[collection].index_information()
+        except Exception:
+            info = {}
+        existing[collection] = {name: [(field, direction) for field, direction in spec["key"]] for name, spec in info.items()}
+
+    missing = []
+    for collection, indexes in INDEXES.items():
+        keys = list(existing[collection].values())
+        for index in indexes:
+            if _index_key(index) not in keys:
+                missing.append({"collection": collection, "index": index.document["name"], "key": _index_key(index)})
+
+    unindexed = []
+    for collection, fields, sort, used_by in QUERY_SHAPES:
+        if not any(_serves(key, fields, sort) for key in existing[collection].values()):
+            unindexed.append({"collection": collection, "fields": fields, "sort": sort, "used_by": used_by})
+
+    return {"missing": missing, "unindexed_queries": unindexed}
+
+async def report_indexes() -> dict:
+    """Log the result of check_indexes, warning about anything not served by an index"""
+    report = await check_indexes()
+    for entry in report["missing"]:
+        logger.warning(f"Missing index {entry['collection']}.{entry['index']} {entry['key']}")
+    for entry in report["unindexed_queries"]:
+        logger.warning(
+            f"Unindexed query on {entry['collection']} "
+            f"(fields={entry['fields']}, sort={entry['sort']}) used by {entry['used_by']}"
+        )
+    if not report["missing"] and not report["unindexed_queries"]:
+        logger.info("All declared indexes are present")
+    return report
@@ -1,26 +1,107 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
 import os
 import jwt
+import time
 from datetime import datetime, timezone, timedelta
+from .cache_stats import CacheStats
 
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
+# Verified tokens kept per worker, so hot tokens skip signature checks
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 4096))
+
 # Security
 security = HTTPBearer()
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# token -> verified payload, least recently used first
+_token_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+# Revocation hook: single tokens until they expire, and per-user cut-offs
+# (tokens issued before the cut-off are rejected). This is NOT working
+# revocation yet: entries live in memory on one worker only, are lost on
+# restart, and no route calls revoke_token or revoke_user_tokens.
+_revoked_tokens = {}
+_user_not_before = {}
+
+_stats = CacheStats("expired", "invalid")
+
+def revoke_token(token: str, exp: float):
+    """Reject a token from now on, until it would have expired anyway
+
+    Hook only: the revocation stays on this worker and is lost on restart.
+    """
+    _token_cache.pop(token, None)
+    _revoked_tokens[token] = exp
+    now = time.time()
+    for revoked, revoked_exp in list(_revoked_tokens.items()):
+        if revoked_exp <= now:
+            del _revoked_tokens[revoked]
+
+def revoke_user_tokens(user_id: str, before: float = None):
+    """Reject every token of a user issued before `before` (default: now)
+
+    Hook only: the cut-off stays on this worker and is lost on restart.
+    """
+    now = time.time()
+    _user_not_before[user_id] = before if before is not None else int(now)
+    # Once a cut-off is older than a token's lifetime, every token it rejects has expired
+    oldest = now - JWT_EXPIRATION_HOURS * 3600
+    for revoked_user, not_before in list(_user_not_before.items()):
+        if not_before <= oldest:
+            del _user_not_before[revoked_user]
+    for token, payload in list(_token_cache.items()):
+        if payload.get("user_id") == user_id:
+            del _token_cache[token]
+
+def _is_revoked(token: str, payload: dict) -> bool:
+    if token in _revoked_tokens:
+        return True
+    not_before = _user_not_before.get(payload.get("user_id"))
+    return not_before is not None and payload.get("iat", 0) < not_before
+
+def _verify_token(token: str) -> dict:
+    payload = _token_cache.get(token)
+    if payload is not None:
+        if payload["exp"] <= time.time():
+            del _token_cache[token]
+            _stats.add("expired")
+            raise HTTPException(status_code=401, detail="Token has expired")
+        _token_cache.move_to_end(token)
+        _stats.hit()
+        return payload
+
+    _stats.miss()
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        return payload
     except jwt.ExpiredSignatureError:
+        _stats.add("expired")
         raise HTTPException(status_code=401, detail="Token has expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
+        _stats.add("invalid")
         raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+    if payload.get("user_id") is None or "exp" not in payload:
+        _stats.add("invalid")
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+    _token_cache[token] = payload
+    while len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+    return payload
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
+    payload = _verify_token(token)
+    if _is_revoked(token, payload):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    # Handlers get their own copy so the cached payload cannot be altered
+    return dict(payload)
+
+def get_token_cache_stats() -> dict:
+    """Counters of the verified-token cache (see CacheStats)"""
+    return _stats.snapshot(entries=len(_token_cache))
@@ -7,8 +7,10 @@ from dotenv import load_dotenv
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Hashes made with other rounds still verify and are
+# upgraded on the next successful login.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # Stripe configuration
 stripe_lib.api_key = os.environ.get('STRIPE_SECRET_KEY', 'sk_test_51QwQp5D7UUhz3svR8J0Q3GhAaCvAz7jI0Gy5j6DPOEMdQdFZOd7P7W1KWZqWJQP2jKdLfXb0H4JKlKAWYSuqCL3C00CIZ8tHgR')
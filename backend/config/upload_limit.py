@@ -0,0 +1,41 @@
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+class UploadSizeLimitMiddleware:
+    """Reject request bodies above max_bytes on POSTs under path_prefix
+
+    Declared Content-Length values are checked up front, so oversized uploads
+    are refused before any of the body is parsed; bodies without a length are
+    counted as they stream in.
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefix: str):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": "Upload exceeds the request size limit"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the route, so FastAPI turns it into a 413 response
+                    raise HTTPException(status_code=413, detail="Upload exceeds the request size limit")
+            return message
+
+        await self.app(scope, limited_receive, send)
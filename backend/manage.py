@@ -0,0 +1,153 @@
+"""Maintenance commands, run from the backend directory:
+
+    python manage.py migrate-order-images
+    python manage.py migrate-datetimes
+    python manage.py render-image-variants
+    python manage.py rebuild-stats
+    python manage.py rebuild-rollups
+    python manage.py indexes [--check]
+    python manage.py migrate-blobs
+    python manage.py gc-blobs [--dry-run]
+    python manage.py storage-report
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("manage")
+
+async def migrate_order_images(args):
+    from services.image_store import migrate_inline_order_images
+    result = await migrate_inline_order_images(batch_size=args.batch_size)
+    logger.info(
+        f"Moved {result['images']} inline images out of {result['orders']} orders "
+        f"({result['failed_images']} could not be decoded)"
+    )
+
+async def migrate_datetimes(args):
+    from services.migrations import migrate_datetime_fields
+    from services.rollup_service import rebuild_monthly_rollups
+    converted = await migrate_datetime_fields(batch_size=args.batch_size)
+    logger.info(f"Converted {sum(converted.values())} string timestamps to dates")
+    # Rollups only bucket orders whose created_at is a date
+    rollups = await rebuild_monthly_rollups()
+    logger.info(f"Rebuilt {rollups} monthly rollups")
+
+async def render_image_variants(args):
+    from config.database import db
+    from config.settings import ROOT_DIR
+    from services.image_store import render_order_image_variants
+    from services.image_processing import render_image_variants, shutdown_image_pool
+    try:
+        orders = 0
+        cursor = db.orders.find(
+            {"shoe_images.0": {"$exists": True}, "image_variants.0": {"$exists": False}},
+            {"_id": 0, "id": 1, "shoe_images": 1}
+        )
+        async for order in cursor:
+            await render_order_image_variants(order['id'], order['shoe_images'])
+            orders += 1
+
+        media_count = 0
+        async for media in db.media.find({"variants.0": {"$exists": False}}, {"_id": 0, "id": 1, "filename": 1}):
+            path = ROOT_DIR / 'uploads' / 'media' / media['filename']
+            if not path.exists():
+                continue
+            variants = await render_image_variants(path)
+            await db.media.update_one({"id": media['id']}, {"$set": {"variants": [
+                {"url": f"/api/media/{variant.pop('name')}", **variant}
+                for variant in variants
+            ]}})
+            media_count += 1
+        logger.info(f"Rendered image variants for {orders} orders and {media_count} media files")
+    finally:
+        shutdown_image_pool()
+
+async def rebuild_stats(args):
+    from services.stats_service import rebuild_order_stats
+    scopes = await rebuild_order_stats()
+    logger.info(f"Rebuilt stats counters for {scopes} scopes")
+
+async def rebuild_rollups(args):
+    from services.rollup_service import rebuild_monthly_rollups
+    rollups = await rebuild_monthly_rollups()
+    logger.info(f"Rebuilt {rollups} monthly rollups")
+
+async def indexes(args):
+    from config.indexes import ensure_indexes, report_indexes
+    if not args.check:
+        failures = await ensure_indexes()
+        logger.info(f"Applied index manifest ({len(failures)} failures)")
+    report = await report_indexes()
+    if report["missing"] or report["unindexed_queries"]:
+        sys.exit(1)
+
+async def migrate_blobs(args):
+    from services.migrations import migrate_files_to_blob_store
+    moved = await migrate_files_to_blob_store()
+    logger.info(
+        f"Moved {moved['order_images']} order images, {moved['media']} media files and "
+        f"{moved['documents']} partner documents into the blob store ({moved['blobs']} blobs)"
+    )
+
+async def gc_blobs(args):
+    from services.blob_store import collect_garbage, BLOB_GC_GRACE_SECONDS
+    removed = await collect_garbage(dry_run=args.dry_run)
+    action = "Would remove" if args.dry_run else "Removed"
+    logger.info(
+        f"{action} {removed['blobs']} unreferenced blobs, {removed['variants']} variants and "
+        f"{removed['temporary']} abandoned uploads ({removed['bytes']} bytes, "
+        f"grace period {BLOB_GC_GRACE_SECONDS}s)"
+    )
+
+async def storage_report(args):
+    from services.blob_store import storage_report as build_storage_report
+    print(json.dumps(await build_storage_report(), indent=2))
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Backend maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("migrate-order-images", help="Move base64 images embedded in orders into the image store")
+    cmd.add_argument("--batch-size", type=int, default=100)
+    cmd.set_defaults(handler=migrate_order_images)
+
+    cmd = commands.add_parser("migrate-datetimes", help="Convert ISO string timestamps to native BSON dates")
+    cmd.add_argument("--batch-size", type=int, default=500)
+    cmd.set_defaults(handler=migrate_datetimes)
+
+    cmd = commands.add_parser("render-image-variants", help="Render WebP/AVIF variants for photos uploaded before processing existed")
+    cmd.set_defaults(handler=render_image_variants)
+
+    cmd = commands.add_parser("rebuild-stats", help="Recompute the materialized dashboard counters from orders")
+    cmd.set_defaults(handler=rebuild_stats)
+
+    cmd = commands.add_parser("rebuild-rollups", help="Backfill the monthly report rollups from orders")
+    cmd.set_defaults(handler=rebuild_rollups)
+
+    cmd = commands.add_parser("indexes", help="Create the declared indexes and report missing ones")
+    cmd.add_argument("--check", action="store_true", help="Only report, do not create anything")
+    cmd.set_defaults(handler=indexes)
+
+    cmd = commands.add_parser("migrate-blobs", help="Move stored photos, media and partner documents into the blob store")
+    cmd.set_defaults(handler=migrate_blobs)
+
+    cmd = commands.add_parser("gc-blobs", help="Delete blobs no media, order or partner references any more")
+    cmd.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+    cmd.set_defaults(handler=gc_blobs)
+
+    cmd = commands.add_parser("storage-report", help="Print disk usage of the blob store and deduplication savings")
+    cmd.set_defaults(handler=storage_report)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
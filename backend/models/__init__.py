@@ -1,9 +1,9 @@
 from .user import User, UserCreate, UserLogin
 from .service import Service, ServiceCreate
-from .order import Order, OrderCreate, OrderItem
+from .order import Order, OrderCreate, OrderItem, OrderImageVariants, OrderSummary, ORDER_SUMMARY_PROJECTION
 from .review import Review, ReviewCreate
 from .stats import Stats
-from .media import Media
+from .media import Media, ImageVariant
 from .payment import PaymentTransaction
 
 __all__ = [
@@ -15,9 +15,13 @@ __all__ = [
     "Order",
     "OrderCreate",
     "OrderItem",
+    "OrderImageVariants",
+    "OrderSummary",
+    "ORDER_SUMMARY_PROJECTION",
     "Review",
     "ReviewCreate",
     "Stats",
     "Media",
+    "ImageVariant",
     "PaymentTransaction",
 ]
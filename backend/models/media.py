@@ -1,8 +1,15 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
 
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+    format: str  # 'webp' or 'avif'
+    bytes: int
+
 class Media(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -13,4 +20,5 @@ class Media(BaseModel):
     title: Optional[str] = None  # Title/description to identify the image
     position: Optional[int] = None  # Order position (1, 2, 3... for carousel, etc.)
     uploaded_by: str  # admin user id
+    variants: List[ImageVariant] = []  # Resized WebP/AVIF renditions
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
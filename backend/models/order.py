@@ -2,6 +2,7 @@ from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
+from .media import ImageVariant
 
 class OrderItem(BaseModel):
     service_id: str
@@ -9,6 +10,10 @@ class OrderItem(BaseModel):
     service_price: float
     quantity: int = 1
 
+class OrderImageVariants(BaseModel):
+    source: str  # URL of the original photo
+    variants: List[ImageVariant] = []
+
 class Order(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -30,13 +35,43 @@ class Order(BaseModel):
     total_amount: float
     status: str  # 'pending', 'accepted', 'in_progress', 'shipped', 'delivered', 'cancelled'
     payment_status: str = 'pending'  # 'pending', 'paid', 'failed', 'refunded'
-    shoe_images: List[str] = []
+    shoe_images: List[str] = []  # URLs served by GET /api/orders/images/{filename}
+    image_variants: List[OrderImageVariants] = []  # Filled in once the photos are processed
     notes: Optional[str] = None
     payment_intent_id: Optional[str] = None
     is_guest: bool = False
+    assignment_status: Optional[str] = None  # 'queued', 'processing', 'assigned', 'unassigned', 'dead_letter', 'skipped'
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class OrderSummary(BaseModel):
+    """Lean order representation for list views (no photos or notes)"""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    reference_number: str
+    client_id: Optional[str] = None
+    client_name: Optional[str] = None
+    cobbler_id: Optional[str] = None
+    service_name: Optional[str] = None
+    items: List[OrderItem] = []
+    delivery_option: str
+    commission: float
+    total_amount: float
+    status: str
+    payment_status: str = 'pending'
+    assignment_status: Optional[str] = None
+    is_guest: bool = False
+    image_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+# Projection matching OrderSummary, so list queries never load photos
+ORDER_SUMMARY_PROJECTION = {
+    "_id": 0,
+    **{field: 1 for field in OrderSummary.model_fields if field != "image_count"},
+    "image_count": {"$size": {"$ifNull": ["$shoe_images", []]}},
+}
+
 class OrderCreate(BaseModel):
     service_id: str
     delivery_option: str
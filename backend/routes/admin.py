@@ -1,15 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import Optional
-from config import db, get_current_user, ROOT_DIR
-from services import load_file_as_base64, get_coordinates_from_address
+from config import db, get_current_user, get_token_cache_stats
+from fastapi.concurrency import run_in_threadpool
+from services import (
+    file_response,
+    sniff_document_type,
+    document_preview,
+    get_cached_coordinates,
+    GeocodeUnavailable,
+    location_fields,
+    invalidate_cobbler_index,
+    purge_geocode_cache,
+    get_geocode_cache_stats,
+    requeue_order,
+    get_password_pool_stats,
+    invalidate_user_profile,
+    get_user_cache_stats,
+    get_media_cache_stats,
+)
 from datetime import datetime, timezone
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# Fields of a cobbler holding the path of an uploaded document
+PARTNER_DOCUMENT_TYPES = ("id_recto", "id_verso", "che_kbis")
+
 class UpdatePartnerRequest(BaseModel):
     name: Optional[str] = None
     phone: Optional[str] = None
@@ -37,40 +57,65 @@ async def get_pending_partners(current_user: dict = Depends(get_current_user)):
         logger.error(f"Error fetching pending partners: {e}")
         raise HTTPException(status_code=500, detail="Error fetching pending partners")
 
+async def find_partner_document(partner_id: str, doc_type: str) -> str:
+    """Path of a partner's uploaded document, or 404"""
+    if doc_type not in PARTNER_DOCUMENT_TYPES:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    partner = await db.users.find_one({"id": partner_id, "role": "cobbler"}, {"_id": 0, doc_type: 1})
+    if not partner:
+        raise HTTPException(status_code=404, detail="Partner not found")
+    
+    doc_path = partner.get(doc_type)
+    if not doc_path or not os.path.isfile(doc_path):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return doc_path
+
 @router.get("/partners/{partner_id}/document/{doc_type}")
 async def get_partner_document(
     partner_id: str, 
     doc_type: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
+    """Stream a partner document as binary, with ETag/Last-Modified and Range support"""
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
     try:
-        # Find partner
-        partner = await db.users.find_one({"id": partner_id, "role": "cobbler"})
-        if not partner:
-            raise HTTPException(status_code=404, detail="Partner not found")
-        
-        # Get document path
-        doc_path = partner.get(doc_type)
-        if not doc_path:
-            raise HTTPException(status_code=404, detail="Document not found")
-        
-        # Load and return document as base64
-        doc_data = load_file_as_base64(doc_path)
-        if not doc_data:
-            raise HTTPException(status_code=404, detail="Document file not found")
-        
-        return {"document": doc_data, "type": doc_type}
+        doc_path = await find_partner_document(partner_id, doc_type)
+        return file_response(request, doc_path, sniff_document_type(doc_path))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error loading document: {e}")
         raise HTTPException(status_code=500, detail="Error loading document")
 
+@router.get("/partners/{partner_id}/document/{doc_type}/preview")
+async def get_partner_document_preview(
+    partner_id: str,
+    doc_type: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Low-resolution JPEG preview of an image document, for the review queue"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        doc_path = await find_partner_document(partner_id, doc_type)
+        preview_path = await run_in_threadpool(document_preview, doc_path)
+        if not preview_path:
+            raise HTTPException(status_code=404, detail="No preview for this document")
+        return file_response(request, preview_path, "image/jpeg")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating document preview: {e}")
+        raise HTTPException(status_code=500, detail="Error generating document preview")
+
 @router.post("/partners/{partner_id}/approve")
-async def approve_partner(partner_id: str, current_user: dict = Depends(get_current_user)):
+async def approve_partner(partner_id: str, request: Request, current_user: dict = Depends(get_current_user)):
     if current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
@@ -83,20 +128,25 @@ async def approve_partner(partner_id: str, current_user: dict = Depends(get_curr
         # Update status to approved and add coordinates if address exists
         update_data = {
             "status": "approved",
-            "approved_at": datetime.now(timezone.utc).isoformat()
+            "approved_at": datetime.now(timezone.utc)
         }
         
         # Get coordinates from address
         if partner.get('address'):
-            coords = get_coordinates_from_address(partner['address'])
+            try:
+                coords = await get_cached_coordinates(partner['address'], request=request)
+            except GeocodeUnavailable:
+                logger.warning(f"Geocoding unavailable, approving partner {partner_id} without coordinates")
+                coords = None
             if coords:
-                update_data['latitude'] = coords[0]
-                update_data['longitude'] = coords[1]
+                update_data.update(location_fields(*coords))
         
         await db.users.update_one(
             {"id": partner_id},
             {"$set": update_data}
         )
+        invalidate_user_profile(partner_id)
+        invalidate_cobbler_index()
         
         # TODO: Send approval email (mocked for now)
         logger.info(f"Partner {partner_id} approved. Email would be sent to {partner['email']}")
@@ -124,10 +174,12 @@ async def reject_partner(partner_id: str, reason: str = None, current_user: dict
             {"id": partner_id},
             {"$set": {
                 "status": "rejected",
-                "rejected_at": datetime.now(timezone.utc).isoformat(),
+                "rejected_at": datetime.now(timezone.utc),
                 "rejection_reason": reason
             }}
         )
+        invalidate_user_profile(partner_id)
+        invalidate_cobbler_index()
         
         # TODO: Send rejection email (mocked for now)
         logger.info(f"Partner {partner_id} rejected. Email would be sent to {partner['email']}")
@@ -144,6 +196,7 @@ async def reject_partner(partner_id: str, reason: str = None, current_user: dict
 async def update_partner(
     partner_id: str, 
     update_data: UpdatePartnerRequest,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Update partner information (admin only)"""
@@ -177,11 +230,13 @@ async def update_partner(
             
             # Geocode the new workshop address
             logger.info(f"Geocoding workshop address: {update_data.workshop_address}")
-            coords = get_coordinates_from_address(update_data.workshop_address)
+            try:
+                coords = await get_cached_coordinates(update_data.workshop_address, request=request)
+            except GeocodeUnavailable:
+                coords = None
             
             if coords:
-                update_fields['latitude'] = coords[0]
-                update_fields['longitude'] = coords[1]
+                update_fields.update(location_fields(*coords))
                 logger.info(f"Geocoded to: {coords}")
             else:
                 logger.warning(f"Could not geocode address: {update_data.workshop_address}")
@@ -191,7 +246,7 @@ async def update_partner(
             raise HTTPException(status_code=400, detail="No fields to update")
         
         # Update timestamp
-        update_fields['updated_at'] = datetime.now(timezone.utc).isoformat()
+        update_fields['updated_at'] = datetime.now(timezone.utc)
         
         # Perform update
         result = await db.users.update_one(
@@ -199,8 +254,11 @@ async def update_partner(
             {"$set": update_fields}
         )
         
+        invalidate_user_profile(partner_id)
         if result.modified_count == 0:
             logger.warning(f"No changes made to partner {partner_id}")
+        elif 'location' in update_fields:
+            invalidate_cobbler_index()
         
         logger.info(f"Partner {partner_id} updated by admin {current_user['user_id']}")
         
@@ -215,3 +273,85 @@ async def update_partner(
     except Exception as e:
         logger.error(f"Error updating partner: {e}")
         raise HTTPException(status_code=500, detail=f"Error updating partner: {str(e)}")
+
+
+@router.get("/geocode-cache")
+async def get_geocode_cache(current_user: dict = Depends(get_current_user)):
+    """Geocode cache hit/miss metrics (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        return await get_geocode_cache_stats()
+    except Exception as e:
+        logger.error(f"Error reading geocode cache stats: {e}")
+        raise HTTPException(status_code=500, detail="Error reading geocode cache stats")
+
+
+@router.delete("/geocode-cache")
+async def clear_geocode_cache(
+    address: Optional[str] = None,
+    failed_only: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    """Purge cached geocoding results for one address, failed lookups, or everything (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        deleted = await purge_geocode_cache(address=address, failed_only=failed_only)
+        logger.info(f"Geocode cache purged by admin {current_user['user_id']}: {deleted} entries")
+        return {"message": "Geocode cache purged", "deleted": deleted}
+    except Exception as e:
+        logger.error(f"Error purging geocode cache: {e}")
+        raise HTTPException(status_code=500, detail="Error purging geocode cache")
+
+
+@router.get("/assignments/dead-letters")
+async def get_assignment_dead_letters(current_user: dict = Depends(get_current_user)):
+    """Orders whose delivery address could not be geocoded for cobbler assignment (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        return await db.assignment_dead_letters.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    except Exception as e:
+        logger.error(f"Error fetching assignment dead letters: {e}")
+        raise HTTPException(status_code=500, detail="Error fetching assignment dead letters")
+
+
+@router.post("/assignments/{order_id}/retry")
+async def retry_order_assignment(
+    order_id: str,
+    delivery_address: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Requeue a dead-lettered or unassigned order, optionally with a corrected address (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    try:
+        if not await requeue_order(order_id, delivery_address):
+            raise HTTPException(status_code=404, detail="No failed assignment for this order")
+        
+        logger.info(f"Assignment of order {order_id} requeued by admin {current_user['user_id']}")
+        return {"message": "Order requeued for assignment", "order_id": order_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error requeuing order assignment: {e}")
+        raise HTTPException(status_code=500, detail="Error requeuing order assignment")
+
+
+@router.get("/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    """In-process performance counters of the worker serving this request (admin only)"""
+    if current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    return {
+        "password_pool": get_password_pool_stats(),
+        "token_cache": get_token_cache_stats(),
+        "user_cache": get_user_cache_stats(),
+        "media_cache": get_media_cache_stats()
+    }
@@ -1,6 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from models import User, UserCreate, UserLogin
-from services import hash_password, verify_password, create_access_token, save_base64_file
+from services import (
+    hash_password,
+    verify_and_update_password,
+    create_access_token,
+    save_base64_document,
+    add_partner_document_refs,
+    get_user_profile,
+    invalidate_user_profile,
+)
 from config import db, get_current_user
 from datetime import datetime, timezone
 
@@ -27,32 +35,30 @@ async def register(user_data: UserCreate):
     )
     
     user_dict = user.model_dump()
-    user_dict['password'] = hash_password(user_data.password)
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
+    user_dict['password'] = await hash_password(user_data.password)
     
     # If cobbler, add documents and signature timestamp
     if user_data.role == 'cobbler':
         user_dict['status'] = 'pending'
         
-        # Save documents to files
+        # Save documents to the blob store (identical files are kept once)
         if user_data.id_recto:
-            id_recto_filename = f"{user.id}_id_recto.jpg"
-            user_dict['id_recto'] = save_base64_file(user_data.id_recto, id_recto_filename)
+            user_dict['id_recto'] = save_base64_document(user_data.id_recto)
         
         if user_data.id_verso:
-            id_verso_filename = f"{user.id}_id_verso.jpg"
-            user_dict['id_verso'] = save_base64_file(user_data.id_verso, id_verso_filename)
+            user_dict['id_verso'] = save_base64_document(user_data.id_verso)
         
         if user_data.che_kbis:
-            che_kbis_filename = f"{user.id}_che_kbis.pdf"
-            user_dict['che_kbis'] = save_base64_file(user_data.che_kbis, che_kbis_filename)
+            user_dict['che_kbis'] = save_base64_document(user_data.che_kbis)
         
         user_dict['bank_account'] = user_data.bank_account
-        user_dict['terms_signed_at'] = datetime.now(timezone.utc).isoformat()
+        user_dict['terms_signed_at'] = datetime.now(timezone.utc)
         # Note: In production, get real IP from request.client.host
         user_dict['terms_ip_address'] = '0.0.0.0'  # Placeholder
     
     await db.users.insert_one(user_dict)
+    if user_data.role == 'cobbler':
+        await add_partner_document_refs(user_dict)
     
     # Create token
     token = create_access_token(user.id, user.email, user.role)
@@ -70,8 +76,15 @@ async def register(user_data: UserCreate):
 @router.post("/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user['password']):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    valid, new_hash = await verify_and_update_password(credentials.password, user['password'])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # Stored with other bcrypt rounds than BCRYPT_ROUNDS
+        await db.users.update_one({"id": user['id']}, {"$set": {"password": new_hash}})
     
     token = create_access_token(user['id'], user['email'], user['role'])
     
@@ -87,7 +100,7 @@ async def login(credentials: UserLogin):
 
 @router.get("/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0, "password": 0})
+    user = await get_user_profile(current_user['user_id'])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -112,10 +125,8 @@ async def update_me(user_data: dict, current_user: dict = Depends(get_current_us
         raise HTTPException(status_code=404, detail="User not found")
     
     # Return updated user
-    updated_user = await db.users.find_one(
-        {"id": current_user['user_id']}, 
-        {"_id": 0, "password": 0}
-    )
+    invalidate_user_profile(current_user['user_id'])
+    updated_user = await get_user_profile(current_user['user_id'])
     
     return {
         "message": "Profile updated successfully",
@@ -124,26 +135,36 @@ async def update_me(user_data: dict, current_user: dict = Depends(get_current_us
 
 @router.get("/users/{user_id}")
 async def get_user(user_id: str, current_user: dict = Depends(get_current_user)):
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0, "id_recto": 0, "id_verso": 0, "che_kbis": 0, "bank_account": 0})
+    user = await get_user_profile(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    for field in ("id_recto", "id_verso", "che_kbis", "bank_account"):
+        user.pop(field, None)
     return user
 
 @router.put("/users/{user_id}/location")
 async def update_user_location(
     user_id: str,
     address: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     from fastapi import Form
-    from services import get_coordinates_from_address
+    from services import get_cached_coordinates, location_fields, invalidate_cobbler_index, GeocodeUnavailable
     
     # Only allow users to update their own location or admins
     if current_user['user_id'] != user_id and current_user['role'] != 'admin':
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Geocode the address
-    coords = get_coordinates_from_address(address)
+    try:
+        coords = await get_cached_coordinates(address, request=request)
+    except GeocodeUnavailable:
+        raise HTTPException(
+            status_code=503,
+            detail="Geocoding is temporarily unavailable, please retry",
+            headers={"Retry-After": "30"}
+        )
     if not coords:
         raise HTTPException(status_code=400, detail="Could not geocode address")
     
@@ -154,14 +175,16 @@ async def update_user_location(
         {"id": user_id},
         {"$set": {
             "address": address,
-            "latitude": lat,
-            "longitude": lon
+            **location_fields(lat, lon)
         }}
     )
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    invalidate_user_profile(user_id)
+    invalidate_cobbler_index()
+    
     return {
         "message": "Location updated successfully",
         "latitude": lat,
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from models import User
 from config import db, get_current_user
-from services import get_coordinates_from_address
+from services import (
+    get_cached_coordinates,
+    GeocodeUnavailable,
+    location_fields,
+    invalidate_cobbler_index,
+    get_user_profile,
+    invalidate_user_profile,
+)
 from typing import List
 from datetime import datetime, timezone
 import logging
@@ -11,7 +18,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/cobbler", tags=["cobbler"])
 
 @router.put("/address")
-async def update_cobbler_address(address_data: dict, current_user: dict = Depends(get_current_user)):
+async def update_cobbler_address(address_data: dict, request: Request, current_user: dict = Depends(get_current_user)):
     if current_user['role'] != 'cobbler':
         raise HTTPException(status_code=403, detail="Cobbler access required")
     
@@ -24,15 +31,17 @@ async def update_cobbler_address(address_data: dict, current_user: dict = Depend
         
         update_data = {
             "workshop_address": address,
-            "address_updated_at": datetime.now(timezone.utc).isoformat()
+            "address_updated_at": datetime.now(timezone.utc)
         }
         
         # Try to get coordinates from address
         if not skip_geocoding:
-            coords = get_coordinates_from_address(address)
+            try:
+                coords = await get_cached_coordinates(address, request=request)
+            except GeocodeUnavailable:
+                coords = None
             if coords:
-                update_data["latitude"] = coords[0]
-                update_data["longitude"] = coords[1]
+                update_data.update(location_fields(*coords))
                 logger.info(f"Address geocoded successfully for user {current_user['user_id']}")
             else:
                 logger.warning(f"Could not geocode address for user {current_user['user_id']}, saving without coordinates")
@@ -47,11 +56,12 @@ async def update_cobbler_address(address_data: dict, current_user: dict = Depend
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
         
+        invalidate_user_profile(current_user['user_id'])
+        if "location" in update_data:
+            invalidate_cobbler_index()
+        
         # Fetch and return complete user data
-        updated_user = await db.users.find_one(
-            {"id": current_user['user_id']},
-            {"_id": 0, "password": 0}
-        )
+        updated_user = await get_user_profile(current_user['user_id'])
         
         response = {
             "message": "Address updated successfully",
@@ -73,7 +83,4 @@ async def update_cobbler_address(address_data: dict, current_user: dict = Depend
 @router.get("/cobblers", response_model=List[User])
 async def get_cobblers():
     cobblers = await db.users.find({"role": "cobbler"}, {"_id": 0, "password": 0}).to_list(1000)
-    for cobbler in cobblers:
-        if isinstance(cobbler['created_at'], str):
-            cobbler['created_at'] = datetime.fromisoformat(cobbler['created_at'])
     return cobblers
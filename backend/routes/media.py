@@ -1,16 +1,68 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from models import Media
 from config import db, get_current_user, ROOT_DIR
+from services import (
+    render_image_variants,
+    select_variant,
+    file_response,
+    bytes_response,
+    content_etag,
+    IMAGE_MEDIA_TYPES,
+    get_media_listing,
+    get_resolved_name,
+    remember_resolved_name,
+    get_media_file,
+    load_media_file,
+    invalidate_media_cache,
+    blob_path,
+    save_image_upload,
+    add_blob_ref,
+    release_blob_refs,
+    blob_referenced_by,
+    BLOB_NAME_PATTERN,
+)
 from typing import Optional
 from datetime import datetime
-import uuid
+import mimetypes
+import os
+import re
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/media", tags=["media"])
 
+# Uploads are stored in the blob store as <sha256>.<ext>; MEDIA_DIR holds the
+# <uuid4>.<ext> files of older uploads. Variants are <stem>.w<width>.<ext>.
+MEDIA_DIR = ROOT_DIR / 'uploads' / 'media'
+MEDIA_UPLOAD_MAX_BYTES = int(os.environ.get('MEDIA_UPLOAD_MAX_BYTES', 20 * 1024 * 1024))
+
+MEDIA_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]+(\.w\d+)?\.[A-Za-z0-9]+$")
+UUID_STEM_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+def media_type_for(filename: str) -> str:
+    extension = filename.rsplit('.', 1)[-1].lower()
+    return IMAGE_MEDIA_TYPES.get(extension) or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+def media_directory(filename: str):
+    return blob_path(filename).parent if BLOB_NAME_PATTERN.match(filename) else MEDIA_DIR
+
+def remove_media_files(filename: str):
+    """Delete a legacy media file together with its processed variants"""
+    stem = filename.split('.', 1)[0]
+    for path in [MEDIA_DIR / filename, *MEDIA_DIR.glob(f"{stem}.w*")]:
+        if path.exists():
+            path.unlink()
+            logger.info(f"Deleted media file: {path}")
+
+async def release_media_files(media: dict):
+    """Give up a media record's files: blobs lose a reference, legacy files are deleted"""
+    if BLOB_NAME_PATTERN.match(media['filename']):
+        await release_blob_refs(f"media:{media['id']}")
+    else:
+        remove_media_files(media['filename'])
+
 @router.post("/admin/upload")
 async def upload_media(
     file: UploadFile = File(...),
@@ -28,10 +80,6 @@ async def upload_media(
         if file.content_type not in allowed_types:
             raise HTTPException(status_code=400, detail="Only image files are allowed (JPEG, PNG, WEBP)")
         
-        # Generate unique filename
-        file_extension = file.filename.split('.')[-1]
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        
         # Convert position to int if provided
         position_int = None
         if position:
@@ -40,6 +88,12 @@ async def upload_media(
             except (ValueError, TypeError):
                 position_int = None
         
+        # Stream the file into the blob store without its metadata; re-uploading
+        # an image reuses its file. This comes first, so a rejected upload
+        # leaves the media it would replace in place
+        filename, _ = await save_image_upload(file, MEDIA_UPLOAD_MAX_BYTES)
+        file_path = blob_path(filename)
+        
         # Check if an image already exists at this position and category
         if position_int is not None and category:
             logger.info(f"Checking for existing media: category={category}, position={position_int}")
@@ -51,40 +105,35 @@ async def upload_media(
             
             if existing_media:
                 logger.info(f"Replacing media ID: {existing_media['id']}")
-                # Delete the old file
-                old_file_path = ROOT_DIR / 'uploads' / 'media' / existing_media['filename']
-                if old_file_path.exists():
-                    old_file_path.unlink()
-                    logger.info(f"Deleted old file: {old_file_path}")
+                # Release the old file and its variants
+                await release_media_files(existing_media)
                 # Delete old record from DB
                 await db.media.delete_one({"id": existing_media['id']})
                 logger.info(f"Replaced existing media at position {position_int} in category {category}")
         
-        # Save file to media folder
-        media_dir = ROOT_DIR / 'uploads' / 'media'
-        media_dir.mkdir(exist_ok=True, parents=True)
-        file_path = media_dir / unique_filename
-        
-        # Read and save file
-        contents = await file.read()
-        with open(file_path, 'wb') as f:
-            f.write(contents)
+        # Downscaled WebP/AVIF variants without EXIF data, rendered in the image process pool
+        variants = await render_image_variants(file_path)
         
         # Create media record in database
         media = Media(
-            filename=unique_filename,
+            filename=filename,
             original_name=file.filename,
-            url=f"/api/media/{unique_filename}",  # Use API endpoint instead of static
+            url=f"/api/media/{filename}",  # Use API endpoint instead of static
             category=category,
             title=title,
             position=position_int,  # Use converted int
-            uploaded_by=current_user['user_id']
+            uploaded_by=current_user['user_id'],
+            variants=[
+                {"url": f"/api/media/{variant.pop('name')}", **variant}
+                for variant in variants
+            ]
         )
         
         media_dict = media.model_dump()
-        media_dict['created_at'] = media_dict['created_at'].isoformat()
         
         await db.media.insert_one(media_dict)
+        await add_blob_ref(filename, f"media:{media.id}")
+        await invalidate_media_cache()
         
         return {
             "message": "Media uploaded successfully",
@@ -92,7 +141,8 @@ async def upload_media(
                 "id": media.id,
                 "filename": media.filename,
                 "url": media.url,
-                "category": media.category
+                "category": media.category,
+                "variants": media_dict['variants']
             }
         }
     except HTTPException:
@@ -150,6 +200,7 @@ async def update_media(
                 {"id": media_id},
                 {"$set": update_data}
             )
+            await invalidate_media_cache()
         
         return {"message": "Media updated successfully"}
     except HTTPException:
@@ -162,12 +213,8 @@ async def update_media(
 async def get_carousel_images():
     """Public endpoint to get carousel images"""
     try:
-        # Get carousel images sorted by position
-        images = await db.media.find(
-            {"category": "carousel"},
-            {"_id": 0}
-        ).sort("position", 1).to_list(10)
-        return images
+        # Get carousel images sorted by position (served from memory while cached)
+        return await get_media_listing("carousel", 10)
     except Exception as e:
         logger.error(f"Error getting carousel images: {e}")
         return []
@@ -176,24 +223,74 @@ async def get_carousel_images():
 async def get_gallery_images():
     """Public endpoint to get gallery (before/after) images"""
     try:
-        # Get gallery images sorted by position
-        images = await db.media.find(
-            {"category": "gallery"},
-            {"_id": 0}
-        ).sort("position", 1).to_list(20)
-        return images
+        # Get gallery images sorted by position (served from memory while cached)
+        return await get_media_listing("gallery", 20)
     except Exception as e:
         logger.error(f"Error getting gallery images: {e}")
         return []
 
 @router.get("/{filename}")
-async def serve_media(filename: str):
-    """Serve media files via API endpoint"""
+async def serve_media(
+    filename: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096)
+):
+    """Serve media files via API endpoint
+
+    Originals are answered with their best-fitting WebP/AVIF variant (for
+    Accept and ?w=) once one has been rendered. Upload names are content
+    hashes or random UUIDs that are never reused, so those files are cached
+    for a year.
+    """
     try:
-        file_path = ROOT_DIR / 'uploads' / 'media' / filename
-        if not file_path.exists():
+        if not MEDIA_NAME_PATTERN.match(filename):
             raise HTTPException(status_code=404, detail="Media not found")
-        return FileResponse(file_path)
+        
+        stem, extension = filename.split('.', 1)
+        negotiated = '.' not in extension
+        resolved = filename
+        if negotiated:
+            accept = request.headers.get("accept", "")
+            accepts_avif = "image/avif" in accept
+            resolved = await get_resolved_name(filename, w, accepts_avif)
+            if resolved is None:
+                if not (media_directory(filename) / filename).is_file():
+                    raise HTTPException(status_code=404, detail="Media not found")
+                variant = select_variant(media_directory(filename), stem, w, accept)
+                resolved = variant.name if variant else filename
+                remember_resolved_name(filename, w, accepts_avif, resolved)
+        file_path = media_directory(resolved) / resolved
+        
+        if UUID_STEM_PATTERN.match(stem) or BLOB_NAME_PATTERN.match(filename):
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "public, no-cache"
+        
+        # Small files are kept in memory; larger ones are streamed from disk
+        cached = await get_media_file(file_path)
+        if cached is None:
+            # Only blobs that belong to a media record are public
+            if BLOB_NAME_PATTERN.match(resolved) and not await blob_referenced_by(resolved, "media"):
+                raise HTTPException(status_code=404, detail="Media not found")
+            try:
+                cached = await run_in_threadpool(load_media_file, file_path)
+            except FileNotFoundError:
+                raise HTTPException(status_code=404, detail="Media not found")
+        
+        if cached is not None:
+            data, etag, mtime = cached
+            response = bytes_response(request, data, media_type_for(resolved), etag, mtime, cache_control)
+        else:
+            response = file_response(
+                request,
+                file_path,
+                media_type_for(resolved),
+                etag=await run_in_threadpool(content_etag, file_path),
+                cache_control=cache_control
+            )
+        if negotiated:
+            response.headers["Vary"] = "Accept"
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -214,13 +311,12 @@ async def delete_media(
         if not media:
             raise HTTPException(status_code=404, detail="Media not found")
         
-        # Delete file from disk
-        file_path = ROOT_DIR / 'uploads' / 'media' / media['filename']
-        if file_path.exists():
-            file_path.unlink()
+        # Release the file and its variants
+        await release_media_files(media)
         
         # Delete from database
         await db.media.delete_one({"id": media_id})
+        await invalidate_media_cache()
         
         return {"message": "Media deleted successfully"}
     except HTTPException:
@@ -1,11 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends, Form, File, UploadFile
-from models import Order, OrderCreate
+from fastapi import APIRouter, HTTPException, Depends, Form, File, UploadFile, Query, Request, Response
+from models import Order, OrderCreate, OrderSummary, ORDER_SUMMARY_PROJECTION
 from config import db, get_current_user
-from services import generate_reference_number, get_coordinates_from_address, find_nearest_cobbler, hash_password
+from services import (
+    generate_reference_number,
+    hash_password,
+    assignment_queue_fields,
+    notify_assignment_worker,
+    save_order_image_uploads,
+    schedule_order_image_variants,
+    add_order_image_refs,
+    select_variant,
+    file_response,
+    blob_referenced_by,
+    BLOB_DIR,
+    parse_cart_items,
+    price_cart,
+    order_image_path,
+    IMAGE_MEDIA_TYPES,
+    record_order_change,
+    update_order_tracked,
+    encode_cursor,
+    keyset_after,
+    KEYSET_SORT,
+)
 from typing import List, Optional
 from datetime import datetime, timezone
-import base64
-import json
 import uuid
 import logging
 
@@ -28,85 +47,38 @@ async def create_guest_order(
 ):
     """Create order as guest with multiple services"""
     
-    # Process images (optional)
-    images = images if images else []
-    image_data_list = []
-    for image in images:
-        contents = await image.read()
-        image_base64 = base64.b64encode(contents).decode('utf-8')
-        image_data_list.append(f"data:image/jpeg;base64,{image_base64}")
-    
-    # Parse service items
-    try:
-        cart_items = json.loads(service_items)
-    except:
-        raise HTTPException(status_code=400, detail="Format de panier invalide")
-    
-    if not cart_items or len(cart_items) == 0:
-        raise HTTPException(status_code=400, detail="Le panier est vide")
-    
-    # Fetch service details and build order items
-    order_items = []
-    services_total = 0
-    commission_total = 0
-    
-    for cart_item in cart_items:
-        service = await db.services.find_one({"id": cart_item['id']})
-        if not service:
-            raise HTTPException(status_code=404, detail=f"Service {cart_item['id']} introuvable")
-        
-        quantity = cart_item.get('quantity', 1)
-        item_total = service['price'] * quantity
-        item_commission = item_total * 0.15
-        
-        order_items.append({
-            "service_id": service['id'],
-            "service_name": service['name'],
-            "service_price": service['price'],
-            "quantity": quantity
-        })
-        
-        services_total += item_total
-        commission_total += item_commission
-    
-    # Geocode address and find nearest cobbler
-    cobbler_id = None
-    client_coords = get_coordinates_from_address(delivery_address)
-    if client_coords:
-        client_lat, client_lon = client_coords
-        cobbler_id = await find_nearest_cobbler(client_lat, client_lon)
-        logger.info(f"Auto-assigned guest order to cobbler {cobbler_id}")
-    
-    # Calculate prices
-    delivery_price = 15.0 if delivery_option == 'express' else 5.0
-    total_amount = services_total + delivery_price
-    
-    # Create order
-    order_status = 'accepted' if cobbler_id else 'pending'
+    # Price the whole cart with a single catalog lookup
+    pricing = await price_cart(parse_cart_items(service_items), delivery_option)
     
+    # Stream photos (optional) into the image store once the cart is valid
+    image_data_list = await save_order_image_uploads(images or [])
+    
+    # Create order; the assignment worker geocodes the address and picks the nearest cobbler
     order = Order(
         reference_number=generate_reference_number(),
         client_name=guest_name,
         client_email=guest_email,
         client_phone=guest_phone,
-        cobbler_id=cobbler_id,
         delivery_option=delivery_option,
         delivery_address=delivery_address,
-        delivery_price=delivery_price,
-        commission=commission_total,
-        total_amount=total_amount,
-        status=order_status,
+        delivery_price=pricing['delivery_price'],
+        commission=pricing['commission'],
+        total_amount=pricing['total_amount'],
+        status='pending',
         shoe_images=image_data_list,
         notes=notes,
         is_guest=True,
-        items=order_items
+        items=pricing['items']
     )
     
     order_dict = order.model_dump()
-    order_dict['created_at'] = order_dict['created_at'].isoformat()
-    order_dict['updated_at'] = order_dict['updated_at'].isoformat()
+    order_dict.update(assignment_queue_fields())
     
     await db.orders.insert_one(order_dict)
+    await record_order_change(None, order_dict)
+    await add_order_image_refs(order.id, image_data_list)
+    notify_assignment_worker()
+    schedule_order_image_variants(order.id, image_data_list)
     
     # If create_account is True, create user account
     if create_account and password:
@@ -120,12 +92,12 @@ async def create_guest_order(
                     "phone": guest_phone,
                     "address": delivery_address,
                     "role": "client",
-                    "password": hash_password(password),
-                    "created_at": datetime.now(timezone.utc).isoformat()
+                    "password": await hash_password(password),
+                    "created_at": datetime.now(timezone.utc)
                 }
                 await db.users.insert_one(new_user)
                 # Update order with client_id
-                await db.orders.update_one(
+                await update_order_tracked(
                     {"id": order.id},
                     {"$set": {"client_id": new_user["id"], "is_guest": False}}
                 )
@@ -136,8 +108,9 @@ async def create_guest_order(
     return {
         "order_id": order.id,
         "reference_number": order.reference_number,
-        "total_amount": total_amount,
-        "cobbler_assigned": cobbler_id is not None,
+        "total_amount": pricing['total_amount'],
+        "cobbler_assigned": False,
+        "assignment_pending": True,
         "account_created": create_account and password is not None
     }
 
@@ -152,89 +125,43 @@ async def create_bulk_order(
 ):
     """Create order with multiple services for authenticated users"""
     
-    # Process images (optional)
-    images = images if images else []
-    image_data_list = []
-    for image in images:
-        contents = await image.read()
-        image_base64 = base64.b64encode(contents).decode('utf-8')
-        image_data_list.append(f"data:image/jpeg;base64,{image_base64}")
-    
-    # Parse service items
-    try:
-        cart_items = json.loads(service_items)
-    except:
-        raise HTTPException(status_code=400, detail="Format de panier invalide")
-    
-    if not cart_items or len(cart_items) == 0:
-        raise HTTPException(status_code=400, detail="Le panier est vide")
-    
-    # Fetch service details and build order items
-    order_items = []
-    services_total = 0
-    commission_total = 0
-    
-    for cart_item in cart_items:
-        service = await db.services.find_one({"id": cart_item['id']})
-        if not service:
-            raise HTTPException(status_code=404, detail=f"Service {cart_item['id']} introuvable")
-        
-        quantity = cart_item.get('quantity', 1)
-        item_total = service['price'] * quantity
-        item_commission = item_total * 0.15
-        
-        order_items.append({
-            "service_id": service['id'],
-            "service_name": service['name'],
-            "service_price": service['price'],
-            "quantity": quantity
-        })
-        
-        services_total += item_total
-        commission_total += item_commission
-    
-    # Geocode address and find nearest cobbler
-    cobbler_id = None
-    client_coords = get_coordinates_from_address(delivery_address)
-    if client_coords:
-        client_lat, client_lon = client_coords
-        cobbler_id = await find_nearest_cobbler(client_lat, client_lon)
-        logger.info(f"Auto-assigned order to cobbler {cobbler_id}")
-    
-    # Calculate prices
-    delivery_price = 15.0 if delivery_option == 'express' else 5.0
-    total_amount = services_total + delivery_price
-    
-    # Create order
-    order_status = 'accepted' if cobbler_id else 'pending'
+    # Price the whole cart with a single catalog lookup
+    pricing = await price_cart(parse_cart_items(service_items), delivery_option)
+    
+    # Stream photos (optional) into the image store once the cart is valid
+    image_data_list = await save_order_image_uploads(images or [])
     
+    # Create order; the assignment worker geocodes the address and picks the nearest cobbler
     order = Order(
         reference_number=generate_reference_number(),
         client_id=current_user['user_id'],
-        cobbler_id=cobbler_id,
         delivery_option=delivery_option,
         delivery_address=delivery_address,
-        delivery_price=delivery_price,
-        commission=commission_total,
-        total_amount=total_amount,
-        status=order_status,
+        delivery_price=pricing['delivery_price'],
+        commission=pricing['commission'],
+        total_amount=pricing['total_amount'],
+        status='pending',
         shoe_images=image_data_list,
         notes=notes,
         is_guest=False,
-        items=order_items
+        items=pricing['items']
     )
     
     order_dict = order.model_dump()
-    order_dict['created_at'] = order_dict['created_at'].isoformat()
-    order_dict['updated_at'] = order_dict['updated_at'].isoformat()
+    order_dict.update(assignment_queue_fields())
     
     await db.orders.insert_one(order_dict)
+    await record_order_change(None, order_dict)
+    await add_order_image_refs(order.id, image_data_list)
+    notify_assignment_worker()
+    schedule_order_image_variants(order.id, image_data_list)
     
     return {
         "order_id": order.id,
         "reference_number": order.reference_number,
-        "total_amount": total_amount,
-        "cobbler_assigned": cobbler_id is not None
+        "total_amount": pricing['total_amount'],
+        "cobbler_assigned": False,
+        "assignment_pending": True
     }
 
 @router.post("")
@@ -246,67 +173,46 @@ async def create_order(
     images: List[UploadFile] = File(...),
     current_user: dict = Depends(get_current_user)
 ):
-    # Get service
-    service = await db.services.find_one({"id": service_id})
-    if not service:
-        raise HTTPException(status_code=404, detail="Service not found")
-    
-    # Calculate prices
-    service_price = service['price']
-    delivery_price = 15.0 if delivery_option == 'express' else 5.0
-    commission = service_price * 0.15
-    total_amount = service_price + delivery_price
-    
-    # Process images
-    image_data_list = []
-    for image in images:
-        contents = await image.read()
-        # Convert to base64
-        image_base64 = base64.b64encode(contents).decode('utf-8')
-        image_data_list.append(f"data:image/jpeg;base64,{image_base64}")
-    
-    # Geocode client address and find nearest cobbler
-    cobbler_id = None
-    client_coords = get_coordinates_from_address(delivery_address)
-    
-    if client_coords:
-        client_lat, client_lon = client_coords
-        cobbler_id = await find_nearest_cobbler(client_lat, client_lon)
-        logger.info(f"Auto-assigned order to cobbler {cobbler_id} based on location")
-    else:
-        logger.warning(f"Could not geocode address: {delivery_address}")
+    # Price the single service through the shared pricing component
+    pricing = await price_cart([{"id": service_id, "quantity": 1}], delivery_option)
+    item = pricing['items'][0]
     
-    # Create order with auto-assigned cobbler
-    order_status = 'accepted' if cobbler_id else 'pending'
+    # Stream photos into the image store
+    image_data_list = await save_order_image_uploads(images)
     
+    # Create order; the assignment worker geocodes the address and picks the nearest cobbler
     order = Order(
         reference_number=generate_reference_number(),
         client_id=current_user['user_id'],
-        cobbler_id=cobbler_id,
         service_id=service_id,
-        service_name=service['name'],
-        service_price=service_price,
+        service_name=item['service_name'],
+        service_price=item['service_price'],
         delivery_option=delivery_option,
-        delivery_price=delivery_price,
-        commission=commission,
-        total_amount=total_amount,
-        status=order_status,
+        delivery_address=delivery_address,
+        delivery_price=pricing['delivery_price'],
+        commission=pricing['commission'],
+        total_amount=pricing['total_amount'],
+        status='pending',
         shoe_images=image_data_list,
         notes=notes
     )
     
     order_dict = order.model_dump()
-    order_dict['created_at'] = order_dict['created_at'].isoformat()
-    order_dict['updated_at'] = order_dict['updated_at'].isoformat()
+    order_dict.update(assignment_queue_fields())
     
     await db.orders.insert_one(order_dict)
+    await record_order_change(None, order_dict)
+    await add_order_image_refs(order.id, image_data_list)
+    notify_assignment_worker()
+    schedule_order_image_variants(order.id, image_data_list)
     
     return {
         "order_id": order.id,
         "reference_number": order.reference_number,
-        "total_amount": total_amount,
-        "cobbler_assigned": cobbler_id is not None,
-        "cobbler_id": cobbler_id
+        "total_amount": pricing['total_amount'],
+        "cobbler_assigned": False,
+        "assignment_pending": True,
+        "cobbler_id": None
     }
 
 @router.post("/{order_id}/payment")
@@ -347,52 +253,148 @@ async def confirm_payment(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Update order status
-    await db.orders.update_one(
+    await update_order_tracked(
         {"id": order_id},
         {"$set": {
             "status": "accepted",
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
     return {"message": "Payment confirmed", "reference_number": order['reference_number']}
 
-@router.get("", response_model=List[Order])
-async def get_orders(current_user: dict = Depends(get_current_user)):
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def check_order_access(order: dict, current_user: dict):
+    """Raise 403 unless the user is an admin or the order's client or cobbler"""
+    if current_user['role'] != 'admin':
+        if current_user['role'] == 'client' and order['client_id'] != current_user['user_id']:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        elif current_user['role'] == 'cobbler' and order.get('cobbler_id') != current_user['user_id']:
+            raise HTTPException(status_code=403, detail="Not authorized")
+
+@router.get("", response_model=List[OrderSummary])
+async def get_orders(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=200),
+    status: Optional[List[str]] = Query(None),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cobbler_id: Optional[str] = None,
+    client_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """List orders newest first, one page at a time
+    
+    Pass the X-Next-Cursor response header back as `cursor` to get the next
+    page; the header is absent on the last page. Admins may filter by
+    cobbler_id or client_id, other roles only see their own orders.
+    """
     query = {}
     if current_user['role'] == 'client':
         query['client_id'] = current_user['user_id']
     elif current_user['role'] == 'cobbler':
         query['cobbler_id'] = current_user['user_id']
+    else:
+        if cobbler_id:
+            query['cobbler_id'] = cobbler_id
+        if client_id:
+            query['client_id'] = client_id
+    
+    if status:
+        query['status'] = {"$in": status}
+    
+    created_at_range = {}
+    if date_from:
+        created_at_range["$gte"] = _as_utc(date_from)
+    if date_to:
+        created_at_range["$lt"] = _as_utc(date_to)
+    if created_at_range:
+        query['created_at'] = created_at_range
+    
+    page_filter = keyset_after(cursor)
+    if page_filter:
+        query = {"$and": [query, page_filter]}
+    
+    # Only summary fields are loaded; photos are fetched per order.
+    # One extra document tells us whether another page exists.
+    orders = await db.orders.find(query, ORDER_SUMMARY_PROJECTION).sort(KEYSET_SORT).limit(limit + 1).to_list(limit + 1)
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last['created_at'], last['id'])
     
-    # Limit to 100 most recent orders and sort by created_at descending for performance
-    orders = await db.orders.find(query, {"_id": 0}).sort("created_at", -1).limit(100).to_list(100)
-    for order in orders:
-        if isinstance(order['created_at'], str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
-        if isinstance(order['updated_at'], str):
-            order['updated_at'] = datetime.fromisoformat(order['updated_at'])
     return orders
 
+@router.get("/images/{filename}")
+async def get_order_image(
+    filename: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096)
+):
+    """Serve a stored order photo, as its best-fitting WebP/AVIF variant when one exists
+
+    Names are content hashes, so a file never changes. The original URL is
+    negotiated on Accept and ?w=; it is cached briefly until the variants exist.
+    """
+    file_path = order_image_path(filename)
+    if file_path is None or not file_path.exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    # Only blobs that belong to an order are served here
+    if file_path.is_relative_to(BLOB_DIR) and not await blob_referenced_by(filename, "order"):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    stem, extension = filename.split('.', 1)
+    if extension in IMAGE_MEDIA_TYPES:
+        variant = select_variant(file_path.parent, stem, w, request.headers.get("accept", ""))
+        if variant is None:
+            return file_response(
+                request,
+                file_path,
+                IMAGE_MEDIA_TYPES[extension],
+                etag=f'"{filename}"',
+                cache_control="private, max-age=60"
+            )
+        file_path = variant
+    
+    response = file_response(
+        request,
+        file_path,
+        IMAGE_MEDIA_TYPES[file_path.name.rsplit('.', 1)[-1]],
+        etag=f'"{file_path.name}"',
+        cache_control="private, max-age=31536000, immutable"
+    )
+    response.headers["Vary"] = "Accept"
+    return response
+
 @router.get("/{order_id}", response_model=Order)
 async def get_order(order_id: str, current_user: dict = Depends(get_current_user)):
     order = await db.orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
-    # Check authorization
-    if current_user['role'] != 'admin':
-        if current_user['role'] == 'client' and order['client_id'] != current_user['user_id']:
-            raise HTTPException(status_code=403, detail="Not authorized")
-        elif current_user['role'] == 'cobbler' and order.get('cobbler_id') != current_user['user_id']:
-            raise HTTPException(status_code=403, detail="Not authorized")
+    check_order_access(order, current_user)
     
-    if isinstance(order['created_at'], str):
-        order['created_at'] = datetime.fromisoformat(order['created_at'])
-    if isinstance(order['updated_at'], str):
-        order['updated_at'] = datetime.fromisoformat(order['updated_at'])
     return order
 
+@router.get("/{order_id}/images")
+async def get_order_images(order_id: str, current_user: dict = Depends(get_current_user)):
+    """Photo URLs of a single order, for views that only loaded the summary"""
+    order = await db.orders.find_one(
+        {"id": order_id},
+        {"_id": 0, "client_id": 1, "cobbler_id": 1, "shoe_images": 1}
+    )
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    check_order_access(order, current_user)
+    
+    return {"order_id": order_id, "images": order.get('shoe_images', [])}
+
 @router.patch("/{order_id}/status")
 async def update_order_status(
     order_id: str,
@@ -407,11 +409,11 @@ async def update_order_status(
     if current_user['role'] not in ['admin', 'cobbler']:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    await db.orders.update_one(
+    await update_order_tracked(
         {"id": order_id},
         {"$set": {
             "status": status,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
@@ -432,12 +434,12 @@ async def accept_order(
     if order['status'] != 'accepted':
         raise HTTPException(status_code=400, detail="Order is not available")
     
-    await db.orders.update_one(
+    await update_order_tracked(
         {"id": order_id},
         {"$set": {
             "cobbler_id": current_user['user_id'],
             "status": "in_progress",
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
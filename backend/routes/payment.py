@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from models import PaymentTransaction
 from config import db, get_current_user
+from services import assign_order_now, get_user_profile
 from emergentintegrations.payments.stripe.checkout import (
     StripeCheckout,
     CheckoutSessionResponse,
@@ -72,13 +73,16 @@ async def create_checkout_session(
         
         # Get cobbler's Stripe account ID
         cobbler_id = order.get('assigned_cobbler_id') or order.get('cobbler_id')
+        if not cobbler_id and order.get('assignment_status') in ('queued', 'processing'):
+            # Freshly created orders are assigned in the background; don't make the client wait for the worker
+            cobbler_id = await assign_order_now(order_id)
         if not cobbler_id:
             raise HTTPException(
                 status_code=400, 
                 detail="Order not assigned to a cobbler yet"
             )
         
-        cobbler = await db.users.find_one({"id": cobbler_id}, {"_id": 0})
+        cobbler = await get_user_profile(cobbler_id)
         if not cobbler:
             raise HTTPException(status_code=404, detail="Cobbler not found")
         
@@ -142,8 +146,6 @@ async def create_checkout_session(
         )
         
         payment_dict = payment.model_dump()
-        payment_dict['created_at'] = payment_dict['created_at'].isoformat()
-        payment_dict['updated_at'] = payment_dict['updated_at'].isoformat()
         
         await db.payment_transactions.insert_one(payment_dict)
         
@@ -201,7 +203,7 @@ async def get_checkout_status(
                     "$set": {
                         "payment_status": new_payment_status,
                         "status": new_status,
-                        "updated_at": datetime.now(timezone.utc).isoformat()
+                        "updated_at": datetime.now(timezone.utc)
                     }
                 }
             )
@@ -269,7 +271,7 @@ async def stripe_webhook(request: Request):
                             "$set": {
                                 "payment_status": new_payment_status,
                                 "status": new_status,
-                                "updated_at": datetime.now(timezone.utc).isoformat()
+                                "updated_at": datetime.now(timezone.utc)
                             }
                         }
                     )
@@ -1,81 +1,285 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from config import db, get_current_user
+from services import encode_cursor, keyset_after, KEYSET_SORT, COMMISSION_RATE, rollups_available, get_monthly_rollups
 from datetime import datetime, timezone
 from typing import Optional
+import csv
+import io
+import json
 import logging
+import zlib
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
-@router.get("/monthly")
-async def get_monthly_report(
+# Only the fields a report line needs are read from orders
+REPORT_ORDER_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "created_at": 1,
+    "reference_number": 1,
+    "total_amount": 1,
+    "status": 1,
+}
+
+# Export streaming: rows are flushed in chunks of roughly this many bytes
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = ["date", "reference", "amount", "commission", "status"]
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+def month_bounds(year: int, month: int) -> tuple:
+    """[start, end) of a calendar month in UTC"""
+    if month < 1 or month > 12:
+        raise HTTPException(status_code=400, detail="Invalid month")
+    start_date = datetime(year, month, 1, tzinfo=timezone.utc)
+    if month == 12:
+        end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    return start_date, end_date
+
+def year_bounds(year: int) -> tuple:
+    """[start, end) of a calendar year in UTC"""
+    return datetime(year, 1, 1, tzinfo=timezone.utc), datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+
+def report_query(current_user: dict, start_date: datetime, end_date: datetime) -> dict:
+    """Orders of the period visible to the user (admin: all, cobbler: their own)"""
+    query = {
+        "created_at": {
+            "$gte": start_date,
+            "$lt": end_date
+        }
+    }
+    
+    # Filter by cobbler for cobbler role
+    if current_user['role'] == 'cobbler':
+        query["cobbler_id"] = current_user['user_id']
+    elif current_user['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return query
+
+def order_detail_row(order: dict) -> dict:
+    """One report line per order"""
+    return {
+        "date": order['created_at'].strftime("%Y-%m-%d") if order.get('created_at') else '',
+        "reference": order.get('reference_number', 'N/A'),
+        "amount": order.get('total_amount', 0),
+        "commission": order.get('total_amount', 0) * COMMISSION_RATE,
+        "status": order.get('status', 'unknown')
+    }
+
+async def build_summary(query: dict, current_user: dict) -> dict:
+    """Totals for the period, computed by a $group stage"""
+    results = await db.orders.aggregate([
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total_orders": {"$sum": 1},
+            "total_revenue": {"$sum": {"$ifNull": ["$total_amount", 0]}}
+        }}
+    ]).to_list(1)
+    
+    total_orders = results[0]['total_orders'] if results else 0
+    total_revenue = results[0]['total_revenue'] if results else 0
+    cobbler_payments = total_revenue * (1 - COMMISSION_RATE)
+    
+    summary = {
+        "total_orders": total_orders,
+        "total_revenue": total_revenue,
+        "total_commission": total_revenue * COMMISSION_RATE,
+        "cobbler_payments": cobbler_payments
+    }
+    
+    # For cobblers, calculate their earnings
+    if current_user['role'] == 'cobbler':
+        summary["cobbler_earnings"] = cobbler_payments
+    
+    return summary
+
+async def build_monthly_breakdown(query: dict) -> dict:
+    """Order count and revenue per YYYY-MM, grouped inside MongoDB"""
+    breakdown = {}
+    pipeline = [
+        {"$match": query},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+            "orders": {"$sum": 1},
+            "revenue": {"$sum": {"$ifNull": ["$total_amount", 0]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+    async for row in db.orders.aggregate(pipeline):
+        breakdown[row['_id']] = {"orders": row['orders'], "revenue": row['revenue']}
+    return breakdown
+
+async def monthly_breakdown_for(year: int, query: dict, current_user: dict) -> dict:
+    """Monthly breakdown of a year, read from the precomputed rollups when they exist"""
+    if not await rollups_available():
+        return await build_monthly_breakdown(query)
+    
+    cobbler_id = current_user['user_id'] if current_user['role'] == 'cobbler' else None
+    rollups = await get_monthly_rollups(year, cobbler_id=cobbler_id)
+    return {
+        rollup['month']: {"orders": rollup['orders'], "revenue": rollup['revenue']}
+        for rollup in rollups
+        if rollup.get('orders')
+    }
+
+async def fetch_order_page(query: dict, cursor: Optional[str], limit: int) -> tuple:
+    """One page of report lines plus the cursor of the next page (None on the last page)"""
+    page_filter = keyset_after(cursor)
+    if page_filter:
+        query = {"$and": [query, page_filter]}
+    
+    orders = await db.orders.find(query, REPORT_ORDER_PROJECTION).sort(KEYSET_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1]['created_at'], orders[-1]['id'])
+    
+    return [order_detail_row(order) for order in orders], next_cursor
+
+def _encode_rows(rows: list, export_format: str, header: bool) -> bytes:
+    if export_format == "ndjson":
+        return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+    
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+async def stream_report_rows(query: dict, export_format: str, request: Request, gzip: bool):
+    """Yield encoded report lines straight from a Motor cursor
+    
+    Only one batch of orders and one output chunk are held in memory at a
+    time, whatever the size of the period.
+    """
+    cursor = db.orders.find(query, REPORT_ORDER_PROJECTION, batch_size=EXPORT_BATCH_SIZE).sort(KEYSET_SORT)
+    # wbits=31 produces a gzip container rather than a raw zlib stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    header = export_format == "csv"
+    rows = []
+    pending = 0
+    
+    def encode(final: bool = False) -> bytes:
+        nonlocal header, rows, pending
+        data = _encode_rows(rows, export_format, header) if rows or header else b""
+        header = False
+        rows = []
+        pending = 0
+        if compressor:
+            data = compressor.compress(data)
+            if final:
+                data += compressor.flush()
+        return data
+    
+    try:
+        async for order in cursor:
+            row = order_detail_row(order)
+            rows.append(row)
+            # Rough size estimate; exact accounting is not worth the extra encoding
+            pending += 64 + len(row['reference'] or '')
+            if pending >= EXPORT_CHUNK_BYTES:
+                if await request.is_disconnected():
+                    logger.info("Report export aborted by the client")
+                    return
+                data = encode()
+                if data:
+                    yield data
+        
+        data = encode(final=True)
+        if data:
+            yield data
+    except Exception as e:
+        # Headers are already sent; all we can do is cut the stream short
+        logger.error(f"Error streaming report export: {e}")
+    finally:
+        await cursor.close()
+
+@router.get("/{report_type}/export")
+async def export_report(
+    report_type: str,
+    request: Request,
     year: int = Query(...),
-    month: int = Query(...),
+    month: Optional[int] = None,
+    format: str = Query("csv"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Generate monthly report for admin or cobbler"""
+    """Stream every order line of a monthly or yearly report as CSV or NDJSON
+    
+    The body is gzip-compressed on the fly when the client accepts it.
+    """
     try:
-        # Validate month
-        if month < 1 or month > 12:
-            raise HTTPException(status_code=400, detail="Invalid month")
+        if format not in EXPORT_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail="Unsupported export format")
         
-        # Build date filter
-        start_date = datetime(year, month, 1, tzinfo=timezone.utc)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+        if report_type == "monthly":
+            if month is None:
+                raise HTTPException(status_code=400, detail="Month is required")
+            start_date, end_date = month_bounds(year, month)
+            period = f"{year}-{month:02d}"
+        elif report_type == "yearly":
+            start_date, end_date = year_bounds(year)
+            period = str(year)
         else:
-            end_date = datetime(year, month + 1, 1, tzinfo=timezone.utc)
-        
-        # Build query based on role
-        query = {
-            "created_at": {
-                "$gte": start_date.isoformat(),
-                "$lt": end_date.isoformat()
-            }
-        }
-        
-        # Filter by cobbler for cobbler role
-        if current_user['role'] == 'cobbler':
-            query["cobbler_id"] = current_user['user_id']
-        elif current_user['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Access denied")
+            raise HTTPException(status_code=404, detail="Unknown report type")
         
-        # Fetch orders
-        orders = await db.orders.find(query, {"_id": 0}).to_list(1000)
+        query = report_query(current_user, start_date, end_date)
         
-        # Calculate summary
-        total_orders = len(orders)
-        total_revenue = sum(order.get('total_amount', 0) for order in orders)
-        total_commission = total_revenue * 0.15  # 15% commission
-        cobbler_payments = total_revenue * 0.85  # 85% to cobblers
+        gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+        headers = {
+            "Content-Disposition": f'attachment; filename="rapport_{period}.{format}"',
+            "Vary": "Accept-Encoding"
+        }
+        if gzip:
+            headers["Content-Encoding"] = "gzip"
         
-        # Prepare order details
-        order_details = []
-        for order in orders:
-            order_details.append({
-                "date": order.get('created_at', '')[:10],
-                "reference": order.get('reference_number', 'N/A'),
-                "amount": order.get('total_amount', 0),
-                "commission": order.get('total_amount', 0) * 0.15,
-                "status": order.get('status', 'unknown')
-            })
+        return StreamingResponse(
+            stream_report_rows(query, format, request, gzip),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers=headers
+        )
         
-        summary = {
-            "total_orders": total_orders,
-            "total_revenue": total_revenue,
-            "total_commission": total_commission,
-            "cobbler_payments": cobbler_payments
-        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error exporting report: {e}")
+        raise HTTPException(status_code=500, detail="Error exporting report")
+
+@router.get("/monthly")
+async def get_monthly_report(
+    year: int = Query(...),
+    month: int = Query(...),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """Generate monthly report for admin or cobbler
+    
+    The summary covers the whole month; `orders` holds one page of lines,
+    continued by passing `orders_next_cursor` back as `cursor`.
+    """
+    try:
+        start_date, end_date = month_bounds(year, month)
+        query = report_query(current_user, start_date, end_date)
         
-        # For cobblers, calculate their earnings
-        if current_user['role'] == 'cobbler':
-            summary["cobbler_earnings"] = cobbler_payments
+        summary = await build_summary(query, current_user)
+        order_details, next_cursor = await fetch_order_page(query, cursor, limit)
         
         return {
             "period": f"{year}-{month:02d}",
             "summary": summary,
-            "orders": order_details
+            "orders": order_details,
+            "orders_next_cursor": next_cursor
         }
         
     except HTTPException:
@@ -88,76 +292,29 @@ async def get_monthly_report(
 @router.get("/yearly")
 async def get_yearly_report(
     year: int = Query(...),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(get_current_user)
 ):
-    """Generate yearly report for admin or cobbler"""
+    """Generate yearly report for admin or cobbler
+    
+    The summary and monthly breakdown cover the whole year; `orders` holds
+    one page of lines, continued by passing `orders_next_cursor` back as
+    `cursor`.
+    """
     try:
-        # Build date filter
-        start_date = datetime(year, 1, 1, tzinfo=timezone.utc)
-        end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
-        
-        # Build query based on role
-        query = {
-            "created_at": {
-                "$gte": start_date.isoformat(),
-                "$lt": end_date.isoformat()
-            }
-        }
-        
-        # Filter by cobbler for cobbler role
-        if current_user['role'] == 'cobbler':
-            query["cobbler_id"] = current_user['user_id']
-        elif current_user['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Fetch orders
-        orders = await db.orders.find(query, {"_id": 0}).to_list(10000)
-        
-        # Calculate summary
-        total_orders = len(orders)
-        total_revenue = sum(order.get('total_amount', 0) for order in orders)
-        total_commission = total_revenue * 0.15
-        cobbler_payments = total_revenue * 0.85
-        
-        # Prepare order details
-        order_details = []
-        for order in orders:
-            order_details.append({
-                "date": order.get('created_at', '')[:10],
-                "reference": order.get('reference_number', 'N/A'),
-                "amount": order.get('total_amount', 0),
-                "commission": order.get('total_amount', 0) * 0.15,
-                "status": order.get('status', 'unknown')
-            })
-        
-        # Calculate monthly breakdown
-        monthly_breakdown = {}
-        for order in orders:
-            month = order.get('created_at', '')[:7]  # YYYY-MM
-            if month not in monthly_breakdown:
-                monthly_breakdown[month] = {
-                    "orders": 0,
-                    "revenue": 0
-                }
-            monthly_breakdown[month]["orders"] += 1
-            monthly_breakdown[month]["revenue"] += order.get('total_amount', 0)
-        
-        summary = {
-            "total_orders": total_orders,
-            "total_revenue": total_revenue,
-            "total_commission": total_commission,
-            "cobbler_payments": cobbler_payments,
-            "monthly_breakdown": monthly_breakdown
-        }
+        start_date, end_date = year_bounds(year)
+        query = report_query(current_user, start_date, end_date)
         
-        # For cobblers, calculate their earnings
-        if current_user['role'] == 'cobbler':
-            summary["cobbler_earnings"] = cobbler_payments
+        summary = await build_summary(query, current_user)
+        summary["monthly_breakdown"] = await monthly_breakdown_for(year, query, current_user)
+        order_details, next_cursor = await fetch_order_page(query, cursor, limit)
         
         return {
             "period": str(year),
             "summary": summary,
-            "orders": order_details
+            "orders": order_details,
+            "orders_next_cursor": next_cursor
         }
         
     except HTTPException:
@@ -2,7 +2,6 @@ from fastapi import APIRouter, HTTPException, Depends
 from models import Review, ReviewCreate
 from config import db, get_current_user
 from typing import List
-from datetime import datetime
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
@@ -33,7 +32,6 @@ async def create_review(review: ReviewCreate, current_user: dict = Depends(get_c
     )
     
     review_dict = review_obj.model_dump()
-    review_dict['created_at'] = review_dict['created_at'].isoformat()
     
     await db.reviews.insert_one(review_dict)
     return review_obj
@@ -41,7 +39,4 @@ async def create_review(review: ReviewCreate, current_user: dict = Depends(get_c
 @router.get("/cobbler/{cobbler_id}", response_model=List[Review])
 async def get_cobbler_reviews(cobbler_id: str):
     reviews = await db.reviews.find({"cobbler_id": cobbler_id}, {"_id": 0}).to_list(1000)
-    for review in reviews:
-        if isinstance(review['created_at'], str):
-            review['created_at'] = datetime.fromisoformat(review['created_at'])
     return reviews
@@ -1,8 +1,8 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from models import Service, ServiceCreate
 from config import db, get_current_user
+from services import get_catalog, invalidate_catalog
 from typing import List
-from datetime import datetime
 
 router = APIRouter(prefix="/services", tags=["services"])
 
@@ -13,26 +13,27 @@ async def create_service(service: ServiceCreate, current_user: dict = Depends(ge
     
     service_obj = Service(**service.model_dump())
     service_dict = service_obj.model_dump()
-    service_dict['created_at'] = service_dict['created_at'].isoformat()
     
     await db.services.insert_one(service_dict)
+    await invalidate_catalog()
     return service_obj
 
 @router.get("", response_model=List[Service])
-async def get_services():
-    services = await db.services.find({}, {"_id": 0}).to_list(1000)
-    for service in services:
-        if isinstance(service['created_at'], str):
-            service['created_at'] = datetime.fromisoformat(service['created_at'])
-    return services
+async def get_services(request: Request):
+    # Served from the in-memory catalog; clients revalidate with If-None-Match
+    catalog = await get_catalog()
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if catalog.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
 
 @router.get("/{service_id}", response_model=Service)
 async def get_service(service_id: str):
-    service = await db.services.find_one({"id": service_id}, {"_id": 0})
+    catalog = await get_catalog()
+    service = catalog.by_id.get(service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
-    if isinstance(service['created_at'], str):
-        service['created_at'] = datetime.fromisoformat(service['created_at'])
     return service
 
 @router.put("/{service_id}")
@@ -48,6 +49,7 @@ async def update_service(service_id: str, service_data: dict, current_user: dict
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    await invalidate_catalog()
     return {"message": "Service updated successfully"}
 
 @router.delete("/{service_id}")
@@ -60,4 +62,5 @@ async def delete_service(service_id: str, current_user: dict = Depends(get_curre
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
     
+    await invalidate_catalog()
     return {"message": "Service deleted successfully"}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from config import db, get_current_user
+from services import invalidate_user_profile
 import stripe
 import os
 import logging
@@ -21,8 +22,12 @@ async def create_connected_account(current_user: dict = Depends(get_current_user
         if current_user['role'] != 'cobbler':
             raise HTTPException(status_code=403, detail="Only cobblers can create connected accounts")
         
-        # Check if user already has a connected account
-        user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+        # Check if user already has a connected account; read from MongoDB, not
+        # the per-worker profile cache, which may predate another worker's write
+        user = await db.users.find_one(
+            {"id": current_user['user_id']},
+            {"_id": 0, "email": 1, "stripe_account_id": 1}
+        )
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -44,11 +49,30 @@ async def create_connected_account(current_user: dict = Depends(get_current_user
             business_type='individual',
         )
         
-        # Save account ID to database
-        await db.users.update_one(
-            {"id": current_user['user_id']},
+        # Save account ID to database, unless a concurrent request got there first
+        result = await db.users.update_one(
+            {"id": current_user['user_id'], "stripe_account_id": None},
             {"$set": {"stripe_account_id": account.id}}
         )
+        invalidate_user_profile(current_user['user_id'])
+        
+        if result.modified_count == 0:
+            winner = await db.users.find_one(
+                {"id": current_user['user_id']},
+                {"_id": 0, "stripe_account_id": 1}
+            )
+            logger.warning(
+                f"Concurrent Stripe Connect account creation for user {current_user['user_id']}, "
+                f"deleting duplicate account {account.id}"
+            )
+            try:
+                stripe.Account.delete(account.id)
+            except stripe.error.StripeError as e:
+                logger.error(f"Failed to delete duplicate Stripe account {account.id}: {e}")
+            return {
+                "account_id": (winner or {}).get('stripe_account_id'),
+                "message": "Connected account already exists"
+            }
         
         logger.info(f"Created Stripe Connect account {account.id} for user {current_user['user_id']}")
         
@@ -76,7 +100,10 @@ async def create_onboarding_link(current_user: dict = Depends(get_current_user))
             raise HTTPException(status_code=403, detail="Only cobblers can access onboarding")
         
         # Get user's connected account ID
-        user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+        user = await db.users.find_one(
+            {"id": current_user['user_id']},
+            {"_id": 0, "stripe_account_id": 1}
+        )
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -124,7 +151,10 @@ async def get_account_status(current_user: dict = Depends(get_current_user)):
             raise HTTPException(status_code=403, detail="Only cobblers can check account status")
         
         # Get user's connected account ID
-        user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0})
+        user = await db.users.find_one(
+            {"id": current_user['user_id']},
+            {"_id": 0, "stripe_account_id": 1}
+        )
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
@@ -6,7 +6,19 @@ import logging
 from pathlib import Path
 
 # Import configuration
-from config import client, ROOT_DIR
+from config import client, ROOT_DIR, ensure_indexes, report_indexes
+from config.upload_limit import UploadSizeLimitMiddleware
+from services import (
+    ensure_geo_index,
+    start_assignment_worker,
+    stop_assignment_worker,
+    load_catalog,
+    ensure_order_stats,
+    ensure_monthly_rollups,
+    shutdown_password_pool,
+    shutdown_image_pool,
+    ORDER_UPLOAD_MAX_BYTES,
+)
 
 # Import all route modules
 from routes import (
@@ -51,6 +63,13 @@ try:
 except Exception as e:
     logging.warning(f"Could not mount static files: {e}")
 
+# Order photo uploads; the slack covers the other form fields and multipart framing
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=ORDER_UPLOAD_MAX_BYTES + 1024 * 1024,
+    path_prefix="/api/orders",
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -58,6 +77,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Content-Disposition"],
 )
 
 # Logging configuration
@@ -67,6 +87,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def prepare_indexes():
+    await ensure_indexes()
+    try:
+        await report_indexes()
+    except Exception as e:
+        logger.warning(f"Could not verify indexes: {e}")
+
+@app.on_event("startup")
+async def prepare_geo_index():
+    try:
+        await ensure_geo_index()
+    except Exception as e:
+        # find_nearest_cobbler falls back to an in-process index
+        logger.warning(f"Could not prepare geo index: {e}")
+
+@app.on_event("startup")
+async def preload_catalog():
+    try:
+        await load_catalog()
+    except Exception as e:
+        # get_catalog loads it lazily on the first request instead
+        logger.warning(f"Could not preload service catalog: {e}")
+
+@app.on_event("startup")
+async def prepare_order_stats():
+    try:
+        await ensure_order_stats()
+    except Exception as e:
+        # get_stats aggregates on the fly while the counters are missing
+        logger.warning(f"Could not build stats counters: {e}")
+
+@app.on_event("startup")
+async def prepare_monthly_rollups():
+    try:
+        await ensure_monthly_rollups()
+    except Exception as e:
+        # Yearly reports aggregate raw orders while the rollups are missing
+        logger.warning(f"Could not build monthly rollups: {e}")
+
+@app.on_event("startup")
+async def start_background_workers():
+    start_assignment_worker()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await stop_assignment_worker()
+    shutdown_password_pool()
+    shutdown_image_pool()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -1,14 +1,198 @@
-from .auth_service import hash_password, verify_password, create_access_token, generate_reference_number
-from .file_service import save_base64_file, load_file_as_base64
-from .geo_service import get_coordinates_from_address, find_nearest_cobbler
+from .auth_service import create_access_token, generate_reference_number
+from .password_service import (
+    hash_password,
+    verify_password,
+    verify_and_update_password,
+    get_password_pool_stats,
+    shutdown_password_pool,
+)
+from .file_service import (
+    save_base64_file,
+    load_file_as_base64,
+    file_response,
+    bytes_response,
+    content_etag,
+    sniff_document_type,
+    document_preview,
+    save_base64_document,
+    add_partner_document_refs,
+)
+from .stats_service import (
+    stats_scope_query,
+    compute_order_stats,
+    get_order_stats,
+    record_order_change,
+    update_order_tracked,
+    rebuild_order_stats,
+    ensure_order_stats,
+)
+from .rollup_service import (
+    record_rollup_change,
+    rebuild_monthly_rollups,
+    ensure_monthly_rollups,
+    rollups_available,
+    get_monthly_rollups,
+)
+from .media_cache import (
+    get_media_listing,
+    get_resolved_name,
+    remember_resolved_name,
+    get_media_file,
+    load_media_file,
+    invalidate_media_cache,
+    get_media_cache_stats,
+)
+from .user_cache import get_user_profile, invalidate_user_profile, get_user_cache_stats
+from .catalog_service import get_catalog, load_catalog, invalidate_catalog
+from .pricing_service import parse_cart_items, price_cart, delivery_price_for, COMMISSION_RATE
+from .pagination import encode_cursor, keyset_after, KEYSET_SORT
+from .image_store import (
+    save_image_upload,
+    save_order_image,
+    save_order_image_upload,
+    save_order_image_uploads,
+    order_image_path,
+    migrate_inline_order_images,
+    render_order_image_variants,
+    schedule_order_image_variants,
+    add_order_image_refs,
+    IMAGE_MEDIA_TYPES,
+    ORDER_UPLOAD_MAX_BYTES,
+    sniff_image_extension,
+)
+from .image_processing import (
+    render_image_variants,
+    select_variant,
+    shutdown_image_pool,
+    VARIANT_MEDIA_TYPES,
+)
+from .blob_store import (
+    blob_path,
+    blob_referenced_by,
+    BLOB_DIR,
+    add_blob_ref,
+    release_blob_refs,
+    write_blob_upload,
+    rebuild_blob_refs,
+    collect_garbage,
+    storage_report,
+    BLOB_NAME_PATTERN,
+)
+from .migrations import migrate_datetime_fields, migrate_files_to_blob_store
+from .geo_service import (
+    get_coordinates_from_address,
+    geocode_address,
+    GeocodeUnavailable,
+    find_nearest_cobbler,
+    location_fields,
+    invalidate_cobbler_index,
+    ensure_geo_index,
+)
+from .geocode_cache import (
+    get_cached_coordinates,
+    purge_geocode_cache,
+    get_geocode_cache_stats,
+)
+from .assignment_service import (
+    assignment_queue_fields,
+    notify_assignment_worker,
+    assign_order_now,
+    requeue_order,
+    start_assignment_worker,
+    stop_assignment_worker,
+)
 
 __all__ = [
     "hash_password",
     "verify_password",
+    "verify_and_update_password",
+    "get_password_pool_stats",
+    "shutdown_password_pool",
     "create_access_token",
     "generate_reference_number",
     "save_base64_file",
     "load_file_as_base64",
+    "file_response",
+    "bytes_response",
+    "content_etag",
+    "sniff_document_type",
+    "document_preview",
+    "save_base64_document",
+    "add_partner_document_refs",
+    "stats_scope_query",
+    "compute_order_stats",
+    "get_order_stats",
+    "record_order_change",
+    "update_order_tracked",
+    "rebuild_order_stats",
+    "ensure_order_stats",
+    "record_rollup_change",
+    "rebuild_monthly_rollups",
+    "ensure_monthly_rollups",
+    "rollups_available",
+    "get_monthly_rollups",
+    "get_user_profile",
+    "invalidate_user_profile",
+    "get_user_cache_stats",
+    "get_media_listing",
+    "get_resolved_name",
+    "remember_resolved_name",
+    "get_media_file",
+    "load_media_file",
+    "invalidate_media_cache",
+    "get_media_cache_stats",
+    "get_catalog",
+    "load_catalog",
+    "invalidate_catalog",
+    "parse_cart_items",
+    "price_cart",
+    "delivery_price_for",
+    "COMMISSION_RATE",
+    "encode_cursor",
+    "keyset_after",
+    "KEYSET_SORT",
+    "save_image_upload",
+    "save_order_image",
+    "save_order_image_upload",
+    "save_order_image_uploads",
+    "order_image_path",
+    "migrate_inline_order_images",
+    "render_order_image_variants",
+    "schedule_order_image_variants",
+    "add_order_image_refs",
+    "IMAGE_MEDIA_TYPES",
+    "ORDER_UPLOAD_MAX_BYTES",
+    "sniff_image_extension",
+    "render_image_variants",
+    "select_variant",
+    "shutdown_image_pool",
+    "VARIANT_MEDIA_TYPES",
+    "blob_path",
+    "blob_referenced_by",
+    "BLOB_DIR",
+    "add_blob_ref",
+    "release_blob_refs",
+    "write_blob_upload",
+    "rebuild_blob_refs",
+    "collect_garbage",
+    "storage_report",
+    "BLOB_NAME_PATTERN",
+    "migrate_datetime_fields",
+    "migrate_files_to_blob_store",
     "get_coordinates_from_address",
+    "geocode_address",
+    "GeocodeUnavailable",
     "find_nearest_cobbler",
+    "location_fields",
+    "invalidate_cobbler_index",
+    "ensure_geo_index",
+    "get_cached_coordinates",
+    "purge_geocode_cache",
+    "get_geocode_cache_stats",
+    "assignment_queue_fields",
+    "notify_assignment_worker",
+    "assign_order_now",
+    "requeue_order",
+    "start_assignment_worker",
+    "stop_assignment_worker",
 ]
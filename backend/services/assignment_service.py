@@ -0,0 +1,311 @@
+from typing import List, Optional
+from datetime import datetime, timezone, timedelta
+from pymongo import ReturnDocument
+import asyncio
+import logging
+import os
+import time
+import uuid
+from config.database import db
+from services.geo_service import find_nearest_cobbler, GeocodeAborted, GeocodeUnavailable
+from services.geocode_cache import get_cached_coordinates, normalize_address, GEOCODE_NEGATIVE_TTL_MINUTES
+from services.stats_service import update_order_tracked
+
+logger = logging.getLogger(__name__)
+
+# Worker configuration
+ASSIGNMENT_BATCH_SIZE = int(os.environ.get('ASSIGNMENT_BATCH_SIZE', 20))
+ASSIGNMENT_MAX_ATTEMPTS = int(os.environ.get('ASSIGNMENT_MAX_ATTEMPTS', 5))
+# Retry delays double from this base: 5, 10, 20, 40 minutes. Retries of addresses
+# that could not be geocoded wait at least the negative geocode cache TTL, so
+# they ask Nominatim again instead of reading back the cached failure.
+ASSIGNMENT_RETRY_BASE_SECONDS = int(os.environ.get('ASSIGNMENT_RETRY_BASE_SECONDS', 300))
+ASSIGNMENT_LEASE_SECONDS = 120
+# The worker geocodes one address at a time with its own deadline, which
+# covers waiting behind interactive lookups for the Nominatim rate limit.
+# A batch stops geocoding after half its lease; the rest goes back on the queue.
+ASSIGNMENT_GEOCODE_TIMEOUT_SECONDS = float(os.environ.get('ASSIGNMENT_GEOCODE_TIMEOUT_SECONDS', 30))
+ASSIGNMENT_GEOCODE_BUDGET_SECONDS = ASSIGNMENT_LEASE_SECONDS / 2
+ASSIGNMENT_POLL_SECONDS = 5
+ASSIGN_NOW_WAIT_SECONDS = 10
+
+# assignment_status values stored on orders
+QUEUED = "queued"
+PROCESSING = "processing"
+ASSIGNED = "assigned"
+UNASSIGNED = "unassigned"  # geocoded, but no cobbler was available
+DEAD_LETTER = "dead_letter"  # address could not be geocoded
+SKIPPED = "skipped"  # order was picked up or changed before the worker got to it
+
+_wake_event: Optional[asyncio.Event] = None
+_worker_task: Optional[asyncio.Task] = None
+
+def assignment_queue_fields() -> dict:
+    """Fields that put a newly created order on the assignment queue"""
+    return {
+        "assignment_status": QUEUED,
+        "assignment_attempts": 0,
+        "assignment_next_attempt_at": datetime.now(timezone.utc)
+    }
+
+def notify_assignment_worker():
+    """Wake the worker so a freshly queued order is picked up right away"""
+    if _wake_event is not None:
+        _wake_event.set()
+
+def _claimable_query(now: datetime) -> dict:
+    return {
+        "$or": [
+            {"assignment_status": QUEUED, "assignment_next_attempt_at": {"$lte": now}},
+            # Orders whose worker died mid-batch
+            {"assignment_status": PROCESSING, "assignment_lease_until": {"$lte": now}}
+        ]
+    }
+
+async def _claim(extra_query: Optional[dict] = None) -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await db.orders.find_one_and_update(
+        {**_claimable_query(now), **(extra_query or {})},
+        {"$set": {
+            "assignment_status": PROCESSING,
+            "assignment_lease_until": now + timedelta(seconds=ASSIGNMENT_LEASE_SECONDS)
+        }},
+        projection={"_id": 0, "id": 1, "reference_number": 1, "delivery_address": 1, "assignment_attempts": 1},
+        sort=[("assignment_next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def _record_failure(order: dict, reason: str, dead_letter: bool):
+    attempts = order.get('assignment_attempts', 0) + 1
+    now = datetime.now(timezone.utc)
+
+    if attempts < ASSIGNMENT_MAX_ATTEMPTS:
+        delay = ASSIGNMENT_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        if dead_letter:
+            delay = max(delay, GEOCODE_NEGATIVE_TTL_MINUTES * 60)
+        await db.orders.update_one(
+            {"id": order['id']},
+            {"$set": {
+                "assignment_status": QUEUED,
+                "assignment_attempts": attempts,
+                "assignment_next_attempt_at": now + timedelta(seconds=delay),
+                "assignment_error": reason
+            }}
+        )
+        logger.info(f"Assignment of order {order['id']} failed ({reason}), retry {attempts} in {delay}s")
+        return
+
+    final_status = DEAD_LETTER if dead_letter else UNASSIGNED
+    await db.orders.update_one(
+        {"id": order['id']},
+        {"$set": {
+            "assignment_status": final_status,
+            "assignment_attempts": attempts,
+            "assignment_error": reason
+        }}
+    )
+    if dead_letter:
+        await db.assignment_dead_letters.update_one(
+            {"order_id": order['id']},
+            {"$set": {
+                "reference_number": order.get('reference_number'),
+                "delivery_address": order.get('delivery_address'),
+                "attempts": attempts,
+                "error": reason,
+                "created_at": now
+            }, "$setOnInsert": {"id": str(uuid.uuid4())}},
+            upsert=True
+        )
+    logger.warning(f"Giving up on assigning order {order['id']} after {attempts} attempts: {reason}")
+
+async def _release(order: dict, reason: str):
+    """Put a claimed order straight back on the queue without counting an attempt"""
+    await db.orders.update_one(
+        {"id": order['id'], "assignment_status": PROCESSING},
+        {
+            "$set": {
+                "assignment_status": QUEUED,
+                "assignment_next_attempt_at": datetime.now(timezone.utc),
+                "assignment_error": reason
+            },
+            "$unset": {"assignment_lease_until": ""}
+        }
+    )
+    logger.info(f"Assignment of order {order['id']} postponed ({reason})")
+
+async def _geocoding_failed(order: dict, error: GeocodeUnavailable):
+    # Time spent queued for a geocoder slot says nothing about the order
+    if isinstance(error, GeocodeAborted):
+        await _release(order, f"Geocoding postponed: {error}")
+    else:
+        await _record_failure(order, f"Geocoding unavailable: {error}", dead_letter=False)
+
+async def _assign(order: dict, coords: Optional[tuple]) -> Optional[str]:
+    if not coords:
+        await _record_failure(order, "Address could not be geocoded", dead_letter=True)
+        return None
+
+    cobbler_id = await find_nearest_cobbler(*coords)
+    if not cobbler_id:
+        await _record_failure(order, "No cobbler available", dead_letter=False)
+        return None
+
+    # Only touch orders nobody has picked up or cancelled in the meantime
+    assigned = await update_order_tracked(
+        {"id": order['id'], "status": "pending", "cobbler_id": None},
+        {
+            "$set": {
+                "cobbler_id": cobbler_id,
+                "status": "accepted",
+                "assignment_status": ASSIGNED,
+                "updated_at": datetime.now(timezone.utc)
+            },
+            "$unset": {"assignment_lease_until": "", "assignment_error": ""}
+        }
+    )
+    if not assigned:
+        await db.orders.update_one(
+            {"id": order['id']},
+            {"$set": {"assignment_status": SKIPPED}, "$unset": {"assignment_lease_until": ""}}
+        )
+        return None
+
+    logger.info(f"Auto-assigned order {order['id']} to cobbler {cobbler_id}")
+    return cobbler_id
+
+async def process_assignment_batch() -> int:
+    """Claim up to ASSIGNMENT_BATCH_SIZE due orders and assign them
+
+    Each distinct address in the batch is geocoded once, one after another.
+    Returns the number of orders processed.
+    """
+    orders: List[dict] = []
+    for _ in range(ASSIGNMENT_BATCH_SIZE):
+        order = await _claim()
+        if not order:
+            break
+        orders.append(order)
+
+    if not orders:
+        return 0
+
+    addresses = {}
+    for order in orders:
+        addresses.setdefault(normalize_address(order.get('delivery_address') or ''), order.get('delivery_address'))
+
+    coords_by_key = {}
+    budget_ends_at = time.monotonic() + ASSIGNMENT_GEOCODE_BUDGET_SECONDS
+    for key, address in addresses.items():
+        if not address:
+            coords_by_key[key] = None
+            continue
+        remaining = budget_ends_at - time.monotonic()
+        if remaining <= 0:
+            coords_by_key[key] = GeocodeAborted("batch geocoding budget used up")
+            continue
+        try:
+            coords_by_key[key] = await get_cached_coordinates(
+                address, timeout=min(ASSIGNMENT_GEOCODE_TIMEOUT_SECONDS, remaining)
+            )
+        except GeocodeUnavailable as e:
+            # Not an answer about the address: the order is retried, not dead-lettered
+            logger.error(f"Error geocoding '{address}' for assignment: {e}")
+            coords_by_key[key] = e
+        except Exception as e:
+            logger.error(f"Error geocoding '{address}' for assignment: {e}")
+            coords_by_key[key] = GeocodeUnavailable(str(e))
+
+    for order in orders:
+        try:
+            coords = coords_by_key[normalize_address(order.get('delivery_address') or '')]
+            if isinstance(coords, GeocodeUnavailable):
+                await _geocoding_failed(order, coords)
+                continue
+            await _assign(order, coords)
+        except Exception as e:
+            logger.error(f"Error assigning order {order['id']}: {e}")
+            await _record_failure(order, str(e), dead_letter=False)
+
+    return len(orders)
+
+async def assign_order_now(order_id: str) -> Optional[str]:
+    """Assign a queued order immediately instead of waiting for the worker
+
+    Used when a caller needs the cobbler right away (e.g. to open a payment
+    session). Returns the order's cobbler id, which may still be None.
+    """
+    order = await _claim({"id": order_id})
+    if order:
+        address = order.get('delivery_address')
+        try:
+            coords = await get_cached_coordinates(address) if address else None
+            return await _assign(order, coords)
+        except GeocodeUnavailable as e:
+            await _geocoding_failed(order, e)
+            return None
+        except Exception as e:
+            # Never leave the order claimed until its lease runs out
+            logger.error(f"Error assigning order {order['id']}: {e}")
+            await _record_failure(order, str(e), dead_letter=False)
+            return None
+
+    # The worker may be holding the order right now; give it a moment to finish
+    for _ in range(ASSIGN_NOW_WAIT_SECONDS * 2):
+        order = await db.orders.find_one({"id": order_id}, {"_id": 0, "cobbler_id": 1, "assignment_status": 1})
+        if not order or order.get('assignment_status') != PROCESSING:
+            break
+        await asyncio.sleep(0.5)
+
+    return order.get('cobbler_id') if order else None
+
+async def requeue_order(order_id: str, delivery_address: Optional[str] = None) -> bool:
+    """Put a dead-lettered or unassigned order back on the queue, optionally with a corrected address"""
+    update = assignment_queue_fields()
+    if delivery_address:
+        update['delivery_address'] = delivery_address
+
+    result = await db.orders.update_one(
+        {"id": order_id, "assignment_status": {"$in": [DEAD_LETTER, UNASSIGNED]}},
+        {"$set": update, "$unset": {"assignment_error": ""}}
+    )
+    if result.matched_count == 0:
+        return False
+
+    await db.assignment_dead_letters.delete_one({"order_id": order_id})
+    notify_assignment_worker()
+    return True
+
+async def _run_worker():
+    while True:
+        try:
+            processed = await process_assignment_batch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Assignment worker error: {e}")
+            processed = 0
+
+        if processed < ASSIGNMENT_BATCH_SIZE:
+            _wake_event.clear()
+            try:
+                await asyncio.wait_for(_wake_event.wait(), timeout=ASSIGNMENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+def start_assignment_worker():
+    """Start the background assignment loop on the running event loop"""
+    global _wake_event, _worker_task
+    if _worker_task is None or _worker_task.done():
+        _wake_event = asyncio.Event()
+        _worker_task = asyncio.create_task(_run_worker())
+        logger.info("Order assignment worker started")
+
+async def stop_assignment_worker():
+    global _worker_task
+    if _worker_task is not None:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
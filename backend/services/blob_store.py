@@ -0,0 +1,383 @@
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from datetime import datetime, timezone
+from pathlib import Path
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from config.settings import ROOT_DIR
+from config.database import db
+
+logger = logging.getLogger(__name__)
+
+# Uploaded files are stored once per distinct content, as <sha256>.<ext> under
+# a directory named after the first two hex digits. Processed variants sit next
+# to their source as <sha256>.w<width>.<ext>.
+BLOB_DIR = ROOT_DIR / 'uploads' / 'blobs'
+# Partner documents use the same layout in a separate store that no public
+# route reads from
+PRIVATE_BLOB_DIR = ROOT_DIR / 'uploads' / 'private'
+PRIVATE_KEY_PREFIX = "private/"
+# Document previews are a variant too: <sha256>.preview.jpg
+BLOB_NAME_PATTERN = re.compile(r"^(?P<digest>[0-9a-f]{64})(?P<variant>\.w\d+|\.preview)?\.[a-z0-9]+$")
+PREVIEW_VARIANT = ".preview"
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Unreferenced blobs younger than this are kept, so a file written just
+# before its owner document is saved is never collected
+BLOB_GC_GRACE_SECONDS = int(os.environ.get('BLOB_GC_GRACE_SECONDS', 3600))
+
+# One document per original blob: {_id: key, size, refs: [owner, ...]}, where
+# the key is the blob name, prefixed with "private/" in the private store.
+# Owners are "media:<id>", "order:<id>" and "user:<id>:<document field>";
+# the reference count is the number of owners.
+blobs = db.blobs
+
+# Previews of documents outside the store, keyed on path, size and mtime.
+# They are only a cache and are swept once idle for the grace period.
+LEGACY_PREVIEW_DIR = ROOT_DIR / 'uploads' / 'previews'
+
+# Partner documents stored on cobbler accounts
+PARTNER_DOCUMENT_FIELDS = ("id_recto", "id_verso", "che_kbis")
+
+def blob_path(name: str, private: bool = False) -> Optional[Path]:
+    """Resolve a blob name to its file, rejecting anything that is not a content hash"""
+    if not BLOB_NAME_PATTERN.match(name):
+        return None
+    return (PRIVATE_BLOB_DIR if private else BLOB_DIR) / name[:2] / name
+
+def blob_key(name: str, private: bool = False) -> str:
+    return f"{PRIVATE_KEY_PREFIX}{name}" if private else name
+
+def blob_file(key: str) -> Optional[Path]:
+    """File of a blob key as kept in the blobs collection"""
+    if key.startswith(PRIVATE_KEY_PREFIX):
+        return blob_path(key[len(PRIVATE_KEY_PREFIX):], private=True)
+    return blob_path(key)
+
+def blob_key_for_path(path) -> Optional[str]:
+    """Blob key of a stored file path (as kept on user documents), or None for other files"""
+    if not path:
+        return None
+    path = Path(path)
+    if not BLOB_NAME_PATTERN.match(path.name):
+        return None
+    if path.parent.parent == PRIVATE_BLOB_DIR:
+        return blob_key(path.name, private=True)
+    if path.parent.parent == BLOB_DIR:
+        return path.name
+    return None
+
+def _tmp_path(private: bool = False) -> Path:
+    # Temporary files live next to the store so the final rename stays on one filesystem
+    directory = PRIVATE_BLOB_DIR if private else BLOB_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f".upload.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+
+def commit_blob(tmp_path: Path, digest: str, extension: str, private: bool = False) -> str:
+    """Move a fully written temporary file to its content-addressed name"""
+    name = f"{digest}.{extension}"
+    path = blob_path(name, private)
+    if path.exists():
+        tmp_path.unlink()
+        # A reused blob counts as fresh, so a pending GC sweep leaves it alone
+        os.utime(path)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Readers never see a partial file: the name only appears once complete
+        os.replace(tmp_path, path)
+    return name
+
+def write_blob(data: bytes, extension: str, private: bool = False) -> str:
+    """Store bytes and return the blob name; identical content shares one file"""
+    tmp_path = _tmp_path(private)
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    return commit_blob(tmp_path, hashlib.sha256(data).hexdigest(), extension, private)
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def write_blob_upload(
+    upload: UploadFile,
+    max_bytes: int,
+    extension_for: Callable[[bytes], str],
+    prepare: Optional[Callable[[Path, str], Awaitable[None]]] = None
+) -> Tuple[str, int]:
+    """Stream an upload into the store, hashing and size-checking it chunk by chunk
+
+    extension_for receives the first 16 bytes. prepare, when given, may
+    rewrite the complete file (with its extension) before it is hashed and
+    stored. Returns the blob name and the uploaded size; raises 413 once more
+    than max_bytes have been read.
+    """
+    tmp_path = _tmp_path()
+    digest = hashlib.sha256()
+    header = b""
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="File exceeds the upload size limit")
+                if len(header) < 16:
+                    header = (header + chunk)[:16]
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        extension = extension_for(header)
+        if prepare is not None:
+            await prepare(tmp_path, extension)
+            digest_hex = await run_in_threadpool(_file_digest, tmp_path)
+        else:
+            digest_hex = digest.hexdigest()
+        name = await run_in_threadpool(commit_blob, tmp_path, digest_hex, extension)
+        return name, size
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+async def add_blob_ref(key: str, owner: str):
+    """Record that `owner` uses a blob (idempotent)"""
+    path = blob_file(key)
+    if path is None or not path.exists():
+        return
+    now = datetime.now(timezone.utc)
+    await blobs.update_one(
+        {"_id": key},
+        {
+            "$addToSet": {"refs": owner},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"size": path.stat().st_size, "created_at": now},
+        },
+        upsert=True
+    )
+
+async def release_blob_refs(owner: str):
+    """Drop every reference held by `owner`; unreferenced blobs are removed by the GC sweep"""
+    await blobs.update_many(
+        {"refs": owner},
+        {"$pull": {"refs": owner}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
+
+async def blob_referenced_by(name: str, kind: str) -> bool:
+    """Whether a public blob, or the source of a variant, has an owner of this kind ("media", "order")"""
+    match = BLOB_NAME_PATTERN.match(name)
+    if not match:
+        return False
+    # Anchored on the digest, so the lookup stays on the _id index
+    doc = await blobs.find_one(
+        {"_id": {"$regex": f"^{match.group('digest')}\\."}, "refs": {"$regex": f"^{kind}:"}},
+        {"_id": 1}
+    )
+    return doc is not None
+
+def _order_image_blob(url: str) -> Optional[str]:
+    from services.image_store import ORDER_IMAGES_URL_PREFIX
+    if not url or not url.startswith(ORDER_IMAGES_URL_PREFIX):
+        return None
+    name = url[len(ORDER_IMAGES_URL_PREFIX):]
+    match = BLOB_NAME_PATTERN.match(name)
+    return name if match and not match.group("variant") else None
+
+def _iter_blob_files():
+    """(key, path) of every stored file, variants included, in both stores"""
+    for directory, private in ((BLOB_DIR, False), (PRIVATE_BLOB_DIR, True)):
+        if not directory.exists():
+            continue
+        for shard in sorted(directory.iterdir()):
+            if not shard.is_dir():
+                continue
+            for path in shard.iterdir():
+                if BLOB_NAME_PATTERN.match(path.name):
+                    yield blob_key(path.name, private), path
+
+async def referenced_blobs() -> Dict[str, Set[str]]:
+    """Blob key -> owners, read from the media, orders and users collections"""
+    refs: Dict[str, Set[str]] = {}
+
+    async for media in db.media.find({}, {"_id": 0, "id": 1, "filename": 1}):
+        if blob_path(media.get('filename', '')):
+            refs.setdefault(media['filename'], set()).add(f"media:{media['id']}")
+
+    async for order in db.orders.find({"shoe_images.0": {"$exists": True}}, {"_id": 0, "id": 1, "shoe_images": 1}):
+        for url in order['shoe_images']:
+            name = _order_image_blob(url)
+            if name:
+                refs.setdefault(name, set()).add(f"order:{order['id']}")
+
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in PARTNER_DOCUMENT_FIELDS}}
+    async for user in db.users.find({"role": "cobbler"}, projection):
+        for field in PARTNER_DOCUMENT_FIELDS:
+            key = blob_key_for_path(user.get(field))
+            if key:
+                refs.setdefault(key, set()).add(f"user:{user['id']}:{field}")
+    return refs
+
+async def rebuild_blob_refs() -> int:
+    """Recompute every blob's owners from the collections that point at it
+
+    Blobs present on disk but used by nobody get an empty reference list, so
+    the next sweep can collect them. Returns the number of blob documents.
+    """
+    refs = await referenced_blobs()
+    now = datetime.now(timezone.utc)
+    keys = []
+    for key, path in _iter_blob_files():
+        if BLOB_NAME_PATTERN.match(path.name).group("variant"):
+            continue
+        await blobs.update_one(
+            {"_id": key},
+            {
+                "$set": {"refs": sorted(refs.get(key, ())), "size": path.stat().st_size},
+                "$setOnInsert": {"created_at": now, "updated_at": now},
+            },
+            upsert=True
+        )
+        keys.append(key)
+    # Documents of files that no longer exist
+    await blobs.delete_many({"_id": {"$nin": keys}})
+    return len(keys)
+
+async def collect_garbage(dry_run: bool = False) -> dict:
+    """Delete blobs nobody references any more, with their variants and previews
+
+    A blob is only collected when its reference list is empty, no document
+    points at it, and it has been idle for BLOB_GC_GRACE_SECONDS. Abandoned
+    temporary upload files and idle legacy previews past the grace period go
+    too.
+    """
+    cutoff = time.time() - BLOB_GC_GRACE_SECONDS
+    live = await referenced_blobs()
+    counted = {}
+    async for doc in blobs.find({}, {"refs": 1, "updated_at": 1}):
+        counted[doc["_id"]] = doc
+
+    removed = {"blobs": 0, "variants": 0, "previews": 0, "temporary": 0, "bytes": 0}
+    collected = set()
+    for key, path in list(_iter_blob_files()):
+        match = BLOB_NAME_PATTERN.match(path.name)
+        if match.group("variant"):
+            continue
+        doc = counted.get(key)
+        if key in live or (doc and doc.get("refs")):
+            continue
+        updated_at = doc.get("updated_at") if doc else None
+        if path.stat().st_mtime > cutoff or (updated_at and updated_at.timestamp() > cutoff):
+            continue
+        collected.add((path.parent, match.group("digest")))
+        removed["blobs"] += 1
+        removed["bytes"] += path.stat().st_size
+        if not dry_run:
+            path.unlink()
+            await blobs.delete_one({"_id": key})
+
+    for key, path in list(_iter_blob_files()):
+        match = BLOB_NAME_PATTERN.match(path.name)
+        if match.group("variant") and (path.parent, match.group("digest")) in collected:
+            removed["previews" if match.group("variant") == PREVIEW_VARIANT else "variants"] += 1
+            removed["bytes"] += path.stat().st_size
+            if not dry_run:
+                path.unlink()
+
+    for directory in (BLOB_DIR, PRIVATE_BLOB_DIR):
+        if not directory.exists():
+            continue
+        for path in directory.glob(".upload.*.tmp"):
+            if path.stat().st_mtime <= cutoff:
+                removed["temporary"] += 1
+                removed["bytes"] += path.stat().st_size
+                if not dry_run:
+                    path.unlink()
+
+    if LEGACY_PREVIEW_DIR.exists():
+        for path in LEGACY_PREVIEW_DIR.iterdir():
+            # Regenerated on the next request if the document is still around
+            if path.is_file() and path.stat().st_mtime <= cutoff:
+                removed["previews"] += 1
+                removed["bytes"] += path.stat().st_size
+                if not dry_run:
+                    path.unlink()
+    return removed
+
+def _directory_usage(directory: Path, recursive: bool = True) -> dict:
+    files = 0
+    size = 0
+    if directory.exists():
+        for path in (directory.rglob("*") if recursive else directory.iterdir()):
+            if path.is_file():
+                files += 1
+                size += path.stat().st_size
+    return {"files": files, "bytes": size}
+
+async def storage_report() -> dict:
+    """Disk usage of the blob store, what deduplication saves, and what still lives outside it"""
+    counted = {}
+    async for doc in blobs.find({}, {"refs": 1, "size": 1}):
+        counted[doc["_id"]] = doc.get("refs", [])
+
+    report = {
+        "blobs": 0,
+        "blob_bytes": 0,
+        "variants": 0,
+        "variant_bytes": 0,
+        "previews": 0,
+        "preview_bytes": 0,
+        "private_blobs": 0,
+        "private_bytes": 0,
+        "references": 0,
+        "logical_bytes": 0,
+        "unreferenced": {"blobs": 0, "bytes": 0},
+        "by_owner": {},
+    }
+    for key, path in _iter_blob_files():
+        size = path.stat().st_size
+        variant = BLOB_NAME_PATTERN.match(path.name).group("variant")
+        if variant == PREVIEW_VARIANT:
+            report["previews"] += 1
+            report["preview_bytes"] += size
+            continue
+        if variant:
+            report["variants"] += 1
+            report["variant_bytes"] += size
+            continue
+        refs = counted.get(key, [])
+        if key.startswith(PRIVATE_KEY_PREFIX):
+            report["private_blobs"] += 1
+            report["private_bytes"] += size
+        report["blobs"] += 1
+        report["blob_bytes"] += size
+        report["references"] += len(refs)
+        # What the same files would take if every owner had its own copy
+        report["logical_bytes"] += size * max(len(refs), 1)
+        if not refs:
+            report["unreferenced"]["blobs"] += 1
+            report["unreferenced"]["bytes"] += size
+        for kind in {owner.split(':', 1)[0] for owner in refs}:
+            usage = report["by_owner"].setdefault(kind, {"blobs": 0, "bytes": 0})
+            usage["blobs"] += 1
+            usage["bytes"] += size
+
+    report["saved_bytes"] = report["logical_bytes"] - report["blob_bytes"]
+    uploads_dir = ROOT_DIR / 'uploads'
+    report["outside_store"] = {
+        "media": _directory_usage(uploads_dir / 'media'),
+        "orders": _directory_usage(uploads_dir / 'orders'),
+        "previews": _directory_usage(LEGACY_PREVIEW_DIR),
+        # Partner documents saved before the blob store, directly in uploads/
+        "documents": _directory_usage(uploads_dir, recursive=False),
+    }
+    return report
@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from config.database import db
+from models.service import Service
+
+logger = logging.getLogger(__name__)
+
+# How often a worker checks the shared version counter for changes made elsewhere
+CATALOG_VERSION_CHECK_SECONDS = float(os.environ.get('CATALOG_VERSION_CHECK_SECONDS', 5))
+
+# Settings document holding the catalog version, bumped on every catalog write
+CATALOG_VERSION_QUERY = {"type": "catalog_version"}
+
+class Catalog:
+    """Immutable snapshot of the service catalog"""
+
+    def __init__(self, version: int, services: List[Service]):
+        self.version = version
+        self.services = services
+        self.by_id: Dict[str, Service] = {service.id: service for service in services}
+        # Pre-serialized list response and its validator
+        self.body = json.dumps(jsonable_encoder(services), separators=(',', ':')).encode()
+        self.etag = f'"{version}-{hashlib.sha256(self.body).hexdigest()[:16]}"'
+
+_catalog: Optional[Catalog] = None
+_checked_at = 0.0
+_lock = asyncio.Lock()
+
+async def _read_version() -> int:
+    doc = await db.settings.find_one(CATALOG_VERSION_QUERY, {"_id": 0, "version": 1})
+    return doc['version'] if doc else 0
+
+async def _load(version: int) -> Catalog:
+    global _catalog, _checked_at
+    docs = await db.services.find({}, {"_id": 0}).to_list(None)
+    _catalog = Catalog(version, [Service(**doc) for doc in docs])
+    _checked_at = time.monotonic()
+    logger.info(f"Loaded service catalog version {version} ({len(docs)} services)")
+    return _catalog
+
+async def load_catalog() -> Catalog:
+    """(Re)load the catalog from MongoDB; called at startup"""
+    async with _lock:
+        return await _load(await _read_version())
+
+async def get_catalog() -> Catalog:
+    """Current catalog, revalidated against the shared version at most every few seconds"""
+    global _checked_at
+    if _catalog is not None and time.monotonic() - _checked_at < CATALOG_VERSION_CHECK_SECONDS:
+        return _catalog
+
+    async with _lock:
+        # Another request may have refreshed it while we waited
+        if _catalog is not None and time.monotonic() - _checked_at < CATALOG_VERSION_CHECK_SECONDS:
+            return _catalog
+        version = await _read_version()
+        if _catalog is not None and _catalog.version == version:
+            _checked_at = time.monotonic()
+            return _catalog
+        return await _load(version)
+
+async def invalidate_catalog():
+    """Bump the shared version after a catalog write so every worker reloads"""
+    async with _lock:
+        doc = await db.settings.find_one_and_update(
+            CATALOG_VERSION_QUERY,
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            projection={"_id": 0, "version": 1}
+        )
+        await _load(doc['version'])
@@ -1,7 +1,26 @@
-from fastapi import HTTPException
+from typing import Optional, Tuple
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from collections import OrderedDict
+from PIL import Image, ImageOps, UnidentifiedImageError
 import base64
+import hashlib
 import logging
+import os
 from config.settings import ROOT_DIR
+from services.image_store import sniff_image_extension, IMAGE_MEDIA_TYPES
+from services.blob_store import (
+    write_blob,
+    blob_path,
+    blob_key_for_path,
+    add_blob_ref,
+    BLOB_NAME_PATTERN,
+    LEGACY_PREVIEW_DIR,
+    PARTNER_DOCUMENT_FIELDS,
+    PREVIEW_VARIANT,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -37,3 +56,234 @@ def load_file_as_base64(file_path: str) -> str:
     except Exception as e:
         logger.error(f"Error loading file {file_path}: {e}")
         return None
+
+# Binary responses are streamed in chunks of this size
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Low-resolution previews of partner documents, for the review queue
+DOCUMENT_PREVIEW_MAX_SIZE = 320
+
+# SHA-256 ETags of served files, remembered per path while size and mtime match
+CONTENT_ETAG_CACHE_SIZE = 4096
+_content_etags: "OrderedDict[str, tuple]" = OrderedDict()
+
+def sniff_document_extension(header: bytes) -> Optional[str]:
+    if header.startswith(b"%PDF"):
+        return "pdf"
+    return sniff_image_extension(header)
+
+def sniff_document_type(file_path) -> str:
+    """Content type of a stored document, from its first bytes rather than its name"""
+    with open(file_path, 'rb') as f:
+        header = f.read(16)
+    extension = sniff_document_extension(header)
+    if extension is None:
+        return "application/octet-stream"
+    return "application/pdf" if extension == "pdf" else IMAGE_MEDIA_TYPES[extension]
+
+def save_base64_document(base64_string: str) -> str:
+    """Store a base64 encoded document in the private blob store and return its file path"""
+    try:
+        if ',' in base64_string:
+            base64_string = base64_string.split(',', 1)[1]
+        data = base64.b64decode(base64_string)
+        extension = sniff_document_extension(data[:16])
+        if extension is None:
+            raise HTTPException(status_code=415, detail="Documents must be a PDF or an image")
+        name = write_blob(data, extension, private=True)
+        return str(blob_path(name, private=True))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error saving document: {e}")
+        raise HTTPException(status_code=500, detail="Error saving file")
+
+async def add_partner_document_refs(user: dict):
+    """Count a partner as a user of the blobs holding their documents"""
+    for field in PARTNER_DOCUMENT_FIELDS:
+        key = blob_key_for_path(user.get(field))
+        if key:
+            await add_blob_ref(key, f"user:{user['id']}:{field}")
+
+def _iter_file(file_path, start: int, length: int):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def content_etag(file_path) -> str:
+    """Strong ETag from the SHA-256 of a file's bytes
+
+    The digest is cached on (size, mtime), so a file is only hashed again after
+    it changed on disk.
+    """
+    key = str(file_path)
+    stat = os.stat(file_path)
+    cached = _content_etags.get(key)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        _content_etags.move_to_end(key)
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(FILE_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()}"'
+    _content_etags[key] = (stat.st_size, stat.st_mtime_ns, etag)
+    while len(_content_etags) > CONTENT_ETAG_CACHE_SIZE:
+        _content_etags.popitem(last=False)
+    return etag
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte of a single "bytes=" range, or None to serve the whole file"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, min(end, size - 1)
+
+def _conditional_headers(
+    etag: str,
+    mtime: float,
+    cache_control: str,
+    filename: Optional[str] = None
+) -> dict:
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if filename:
+        headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    return headers
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            return int(mtime) <= since.timestamp()
+        except (TypeError, ValueError):
+            pass
+    return False
+
+def _requested_range(request: Request, etag: str, size: int) -> Optional[Tuple[int, int]]:
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range when the client's copy is still current
+    if range_header and request.headers.get("if-range", etag) == etag:
+        return _parse_range(range_header, size)
+    return None
+
+def file_response(
+    request: Request,
+    file_path,
+    media_type: str,
+    etag: Optional[str] = None,
+    cache_control: str = "private, no-cache",
+    filename: Optional[str] = None
+) -> Response:
+    """Stream a file with validators, conditional GET and single-range support
+
+    The ETag defaults to one derived from the file's size and mtime. Requests
+    whose If-None-Match or If-Modified-Since still match get an empty 304.
+    """
+    stat = os.stat(file_path)
+    etag = etag or f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = _conditional_headers(etag, stat.st_mtime, cache_control, filename)
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = _requested_range(request, etag, stat.st_size)
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _iter_file(file_path, start, end - start + 1),
+            status_code=206,
+            media_type=media_type,
+            headers=headers
+        )
+
+    headers["Content-Length"] = str(stat.st_size)
+    return StreamingResponse(_iter_file(file_path, 0, stat.st_size), media_type=media_type, headers=headers)
+
+def bytes_response(
+    request: Request,
+    data: bytes,
+    media_type: str,
+    etag: str,
+    mtime: float,
+    cache_control: str = "private, no-cache"
+) -> Response:
+    """Same as file_response for content already held in memory"""
+    headers = _conditional_headers(etag, mtime, cache_control)
+    if _not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = _requested_range(request, etag, len(data))
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        return Response(data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(data, media_type=media_type, headers=headers)
+
+def document_preview(file_path) -> Optional[Path]:
+    """Path of a small JPEG preview of an image document, generated on first use
+
+    Previews of blobs sit next to them as <sha256>.preview.jpg and are
+    collected together with the blob. Documents outside the store get one in
+    LEGACY_PREVIEW_DIR, keyed on path, size and mtime. Returns None for
+    documents Pillow cannot read (PDFs, HEIC).
+    """
+    key = blob_key_for_path(file_path)
+    if key:
+        digest = BLOB_NAME_PATTERN.match(Path(file_path).name).group("digest")
+        preview_path = Path(file_path).with_name(f"{digest}{PREVIEW_VARIANT}.jpg")
+    else:
+        stat = os.stat(file_path)
+        legacy_key = hashlib.sha256(f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:32]
+        preview_path = LEGACY_PREVIEW_DIR / f"{legacy_key}.jpg"
+    if preview_path.exists():
+        return preview_path
+
+    try:
+        with Image.open(file_path) as image:
+            # JPEG sources can be decoded at reduced size directly
+            image.draft("RGB", (DOCUMENT_PREVIEW_MAX_SIZE * 2, DOCUMENT_PREVIEW_MAX_SIZE * 2))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((DOCUMENT_PREVIEW_MAX_SIZE, DOCUMENT_PREVIEW_MAX_SIZE))
+            preview_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = preview_path.with_name(f".{preview_path.name}.{os.getpid()}.tmp")
+            image.save(tmp_path, "JPEG", quality=70, optimize=True)
+            os.replace(tmp_path, preview_path)
+    except (UnidentifiedImageError, OSError) as e:
+        logger.info(f"No preview for {file_path}: {e}")
+        return None
+    return preview_path
@@ -0,0 +1,67 @@
+from typing import Iterable, Optional, Tuple
+import math
+
+def _to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    cos_lat = math.cos(lat_rad)
+    return (cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(lat_rad))
+
+class NearestPointIndex:
+    """In-process 3-d tree over lat/lon points projected onto the unit sphere.
+
+    The straight-line (chord) distance between two unit vectors grows with the
+    great-circle distance, so the Euclidean nearest neighbour in the tree is
+    also the closest point on the globe. Lookups are O(log n).
+    """
+
+    def __init__(self, points: Iterable[Tuple[str, float, float]]):
+        nodes = [(_to_unit_vector(lat, lon), key) for key, lat, lon in points]
+        self.size = len(nodes)
+        self._root = self._build(nodes, 0)
+
+    def _build(self, nodes: list, depth: int):
+        if not nodes:
+            return None
+        axis = depth % 3
+        nodes.sort(key=lambda node: node[0][axis])
+        mid = len(nodes) // 2
+        vector, key = nodes[mid]
+        return (
+            vector,
+            key,
+            axis,
+            self._build(nodes[:mid], depth + 1),
+            self._build(nodes[mid + 1:], depth + 1),
+        )
+
+    def nearest(self, lat: float, lon: float) -> Optional[str]:
+        """Return the key of the point closest to (lat, lon), or None if empty"""
+        if self._root is None:
+            return None
+
+        target = _to_unit_vector(lat, lon)
+        best_key = None
+        best_dist = math.inf
+        # Each entry carries a lower bound on the distance to anything in its subtree
+        stack = [(self._root, 0.0)]
+
+        while stack:
+            node, bound = stack.pop()
+            if node is None or bound >= best_dist:
+                continue
+            vector, key, axis, left, right = node
+
+            dist = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if dist < best_dist:
+                best_dist = dist
+                best_key = key
+
+            diff = target[axis] - vector[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # The far side is only worth visiting if the splitting plane is
+            # closer than the best match; push it first so it is popped last
+            stack.append((far, diff * diff))
+            stack.append((near, bound))
+
+        return best_key
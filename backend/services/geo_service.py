@@ -1,24 +1,117 @@
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Request
+import asyncio
 import logging
-from geopy import distance
+import os
+import threading
+import time
 from geopy.geocoders import Nominatim
+from pymongo.errors import OperationFailure
 from config.database import db
+from services.geo_index import NearestPointIndex
 
 logger = logging.getLogger(__name__)
 
-def get_coordinates_from_address(address: str, strict: bool = False) -> Optional[tuple]:
+# Approved cobblers eligible for automatic order assignment
+ASSIGNABLE_COBBLER_QUERY = {
+    "role": "cobbler",
+    "status": "approved",
+    "latitude": {"$exists": True, "$ne": None},
+    "longitude": {"$exists": True, "$ne": None}
+}
+
+# How long the in-process fallback index is reused before being rebuilt
+FALLBACK_INDEX_TTL_SECONDS = 60
+
+_fallback_index: Optional[NearestPointIndex] = None
+_fallback_index_built_at = 0.0
+
+# Geocoding limits. Nominatim's usage policy allows at most one request per second.
+NOMINATIM_TIMEOUT_SECONDS = 15
+NOMINATIM_MIN_INTERVAL_SECONDS = float(os.environ.get('NOMINATIM_MIN_INTERVAL_SECONDS', 1.0))
+GEOCODE_DEADLINE_SECONDS = float(os.environ.get('GEOCODE_DEADLINE_SECONDS', 10))
+GEOCODER_MAX_CONCURRENCY = int(os.environ.get('GEOCODER_MAX_CONCURRENCY', 2))
+DISCONNECT_POLL_SECONDS = 0.5
+
+_geocoder_executor = ThreadPoolExecutor(max_workers=GEOCODER_MAX_CONCURRENCY, thread_name_prefix="geocoder")
+_geocode_slots = asyncio.Semaphore(GEOCODER_MAX_CONCURRENCY)
+_throttle_lock = threading.Lock()
+_last_request_at = 0.0
+
+def geo_point(latitude: float, longitude: float) -> dict:
+    """Build a GeoJSON point (GeoJSON stores longitude first)"""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def location_fields(latitude: float, longitude: float) -> dict:
+    """Fields to $set on a user whenever their coordinates change"""
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "location": geo_point(latitude, longitude)
+    }
+
+class GeocodeUnavailable(Exception):
+    """The lookup could not complete (deadline, Nominatim or network error)
+
+    Unlike a None result, this says nothing about the address itself, so it
+    must not be cached as "not found".
+    """
+
+class GeocodeAborted(GeocodeUnavailable):
+    """The caller's deadline passed, or it gave up, before Nominatim answered
+
+    Usually the lookup spent its time queued behind others for a geocoder
+    slot or the rate limit, not talking to Nominatim.
+    """
+
+def _throttle(deadline: Optional[float], cancelled: Optional[threading.Event]):
+    """Space remote calls at least NOMINATIM_MIN_INTERVAL_SECONDS apart across all threads"""
+    global _last_request_at
+    with _throttle_lock:
+        wait = _last_request_at + NOMINATIM_MIN_INTERVAL_SECONDS - time.monotonic()
+        if wait > 0:
+            if deadline is not None and time.monotonic() + wait >= deadline:
+                raise GeocodeAborted("deadline exceeded while waiting for a Nominatim slot")
+            time.sleep(wait)
+        if cancelled is not None and cancelled.is_set():
+            raise GeocodeAborted("lookup cancelled")
+        _last_request_at = time.monotonic()
+
+def _geocode_once(geolocator, query: str, deadline: Optional[float], cancelled: Optional[threading.Event], **kwargs):
+    _throttle(deadline, cancelled)
+    timeout = NOMINATIM_TIMEOUT_SECONDS
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise GeocodeAborted("deadline exceeded")
+        timeout = min(timeout, remaining)
+    return geolocator.geocode(query, timeout=timeout, **kwargs)
+
+def get_coordinates_from_address(
+    address: str,
+    strict: bool = False,
+    deadline: Optional[float] = None,
+    cancelled: Optional[threading.Event] = None
+) -> Optional[tuple]:
     """Get latitude and longitude from address using Nominatim
     
+    This call blocks; async code should use geocode_address instead.
+    Returns None when Nominatim has no match, and raises GeocodeUnavailable
+    when the lookup could not be completed.
+    
     Args:
         address: The address to geocode
         strict: If False, will try multiple formats and be more lenient
+        deadline: time.monotonic() value after which no further attempt is made
+        cancelled: Event set by the caller when it no longer needs the result
     """
     try:
-        geolocator = Nominatim(user_agent="shoerepair_app_v2", timeout=15)
+        geolocator = Nominatim(user_agent="shoerepair_app_v2", timeout=NOMINATIM_TIMEOUT_SECONDS)
         
         # Try exact address first
         logger.info(f"Geocoding address: {address}")
-        location = geolocator.geocode(address, timeout=15, language='fr')
+        location = _geocode_once(geolocator, address, deadline, cancelled, language='fr')
         
         if location:
             logger.info(f"Geocoding successful: {location.latitude}, {location.longitude}")
@@ -31,7 +124,7 @@ def get_coordinates_from_address(address: str, strict: bool = False) -> Optional
         
         # Try with more generic search (country-biased)
         logger.info("Trying with addressdetails...")
-        location = geolocator.geocode(address, addressdetails=True, timeout=15)
+        location = _geocode_once(geolocator, address, deadline, cancelled, addressdetails=True)
         
         if location:
             logger.info(f"Geocoding successful with addressdetails: {location.latitude}, {location.longitude}")
@@ -43,7 +136,7 @@ def get_coordinates_from_address(address: str, strict: bool = False) -> Optional
             # Try with last two parts (usually city, country)
             simplified = ', '.join(parts[-2:])
             logger.info(f"Trying simplified address: {simplified}")
-            location = geolocator.geocode(simplified, timeout=15)
+            location = _geocode_once(geolocator, simplified, deadline, cancelled)
             if location:
                 logger.info(f"Geocoding successful with simplified address: {location.latitude}, {location.longitude}")
                 return (location.latitude, location.longitude)
@@ -51,38 +144,126 @@ def get_coordinates_from_address(address: str, strict: bool = False) -> Optional
         logger.warning(f"Could not geocode address after all attempts: {address}")
         return None
         
+    except GeocodeAborted as e:
+        logger.warning(f"Geocoding aborted for '{address}': {e}")
+        raise
     except Exception as e:
         logger.error(f"Geocoding error for '{address}': {e}")
-        return None
+        raise GeocodeUnavailable(str(e)) from e
+
+async def _wait_for_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+async def geocode_address(
+    address: str,
+    strict: bool = False,
+    timeout: float = GEOCODE_DEADLINE_SECONDS,
+    request: Optional[Request] = None
+) -> Optional[tuple]:
+    """Geocode an address without blocking the event loop
+
+    The lookup runs on a small dedicated thread pool, at most
+    GEOCODER_MAX_CONCURRENCY at a time, and gives up after `timeout` seconds
+    with GeocodeAborted. The timeout includes the wait for a slot and for the
+    rate limit. When `request` is given and the client
+    disconnects first, the lookup is abandoned and a 499 HTTPException is
+    raised.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = time.monotonic() + timeout
+    cancelled = threading.Event()
+
+    async def lookup():
+        async with _geocode_slots:
+            return await loop.run_in_executor(
+                _geocoder_executor,
+                get_coordinates_from_address, address, strict, deadline, cancelled
+            )
+
+    lookup_task = asyncio.ensure_future(lookup())
+    watchers = {lookup_task}
+    disconnect_task = None
+    if request is not None:
+        disconnect_task = asyncio.ensure_future(_wait_for_disconnect(request))
+        watchers.add(disconnect_task)
+
+    try:
+        done, _ = await asyncio.wait(watchers, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if lookup_task in done:
+            return lookup_task.result()
+        if disconnect_task is not None and disconnect_task in done:
+            logger.info(f"Client disconnected, abandoning geocoding of '{address}'")
+            raise HTTPException(status_code=499, detail="Client closed request")
+        logger.warning(f"Geocoding deadline of {timeout}s exceeded for '{address}'")
+        raise GeocodeAborted(f"deadline of {timeout}s exceeded")
+    finally:
+        # Stops the worker thread before its next remote attempt
+        cancelled.set()
+        for task in watchers:
+            task.cancel()
+
+def invalidate_cobbler_index():
+    """Drop the in-process fallback index after a cobbler is added, moved or removed"""
+    global _fallback_index
+    _fallback_index = None
+
+async def ensure_geo_index():
+    """Backfill GeoJSON points for cobblers saved before users.location existed
+
+    The 2dsphere index itself is declared in config.indexes.
+    """
+    cursor = db.users.find(
+        {**ASSIGNABLE_COBBLER_QUERY, "location": {"$exists": False}},
+        {"_id": 0, "id": 1, "latitude": 1, "longitude": 1}
+    )
+    backfilled = 0
+    async for cobbler in cursor:
+        await db.users.update_one(
+            {"id": cobbler['id']},
+            {"$set": {"location": geo_point(cobbler['latitude'], cobbler['longitude'])}}
+        )
+        backfilled += 1
+
+    if backfilled:
+        logger.info(f"Backfilled GeoJSON location for {backfilled} cobblers")
+    invalidate_cobbler_index()
+
+async def _get_fallback_index() -> NearestPointIndex:
+    global _fallback_index, _fallback_index_built_at
+
+    if _fallback_index is None or time.monotonic() - _fallback_index_built_at > FALLBACK_INDEX_TTL_SECONDS:
+        points = []
+        cursor = db.users.find(ASSIGNABLE_COBBLER_QUERY, {"_id": 0, "id": 1, "latitude": 1, "longitude": 1})
+        async for cobbler in cursor:
+            points.append((cobbler['id'], cobbler['latitude'], cobbler['longitude']))
+        _fallback_index = NearestPointIndex(points)
+        _fallback_index_built_at = time.monotonic()
+        logger.info(f"Built in-process cobbler index with {_fallback_index.size} entries")
+
+    return _fallback_index
 
 async def find_nearest_cobbler(client_lat: float, client_lon: float) -> Optional[str]:
-    """Find the nearest approved cobbler to the client"""
+    """Find the nearest approved cobbler to the client
+
+    Uses a $near query on the users.location 2dsphere index. Deployments where
+    the index has not been created yet fall back to an in-process tree.
+    """
     try:
-        # Get all approved cobblers with coordinates
-        cobblers = await db.users.find({
-            "role": "cobbler",
-            "status": "approved",
-            "latitude": {"$exists": True, "$ne": None},
-            "longitude": {"$exists": True, "$ne": None}
-        }, {"_id": 0}).to_list(1000)
-        
-        if not cobblers:
-            return None
-        
-        # Calculate distances and find nearest
-        nearest_cobbler = None
-        min_distance = float('inf')
-        
-        for cobbler in cobblers:
-            cobbler_coords = (cobbler['latitude'], cobbler['longitude'])
-            client_coords = (client_lat, client_lon)
-            dist = distance.distance(client_coords, cobbler_coords).km
-            
-            if dist < min_distance:
-                min_distance = dist
-                nearest_cobbler = cobbler['id']
-        
-        return nearest_cobbler
+        try:
+            cobbler = await db.users.find_one(
+                {
+                    **ASSIGNABLE_COBBLER_QUERY,
+                    "location": {"$near": {"$geometry": geo_point(client_lat, client_lon)}}
+                },
+                {"_id": 0, "id": 1}
+            )
+            return cobbler['id'] if cobbler else None
+        except OperationFailure as e:
+            logger.warning(f"Geo index unavailable, using in-process cobbler index: {e}")
+
+        index = await _get_fallback_index()
+        return index.nearest(client_lat, client_lon)
     except Exception as e:
         logger.error(f"Error finding nearest cobbler: {e}")
         return None
@@ -0,0 +1,193 @@
+from typing import Optional
+from fastapi import Request
+from pymongo import ReturnDocument
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+import logging
+import os
+import re
+import time
+import unicodedata
+from config.database import db
+from config.cache_stats import CacheStats
+from services.geo_service import geocode_address, GeocodeUnavailable, GEOCODE_DEADLINE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+GEOCODE_CACHE_TTL_DAYS = int(os.environ.get('GEOCODE_CACHE_TTL_DAYS', 90))
+GEOCODE_NEGATIVE_TTL_MINUTES = int(os.environ.get('GEOCODE_NEGATIVE_TTL_MINUTES', 15))
+GEOCODE_LRU_SIZE = int(os.environ.get('GEOCODE_LRU_SIZE', 2048))
+# How often a worker checks whether another worker purged the cache
+GEOCODE_PURGE_CHECK_SECONDS = float(os.environ.get('GEOCODE_PURGE_CHECK_SECONDS', 5))
+
+# Settings document holding the purge generation, bumped on every purge
+GEOCODE_PURGE_QUERY = {"type": "geocode_cache_purge"}
+
+# Persistent cache collection; documents expire through the TTL index on
+# expires_at declared in config.indexes
+geocode_cache = db.geocode_cache
+
+# normalized key -> (coordinates or None, monotonic expiry)
+_lru: "OrderedDict[str, tuple]" = OrderedDict()
+_generation: Optional[int] = None
+_generation_checked_at = 0.0
+
+_stats = CacheStats("memory_hits", "store_hits", "negative_hits", "failed_lookups", "unavailable")
+
+def normalize_address(address: str, strict: bool = False) -> str:
+    """Build the cache key for an address
+
+    Case, Unicode compatibility forms, whitespace and comma spacing do not
+    change the result of a Nominatim lookup, so they are folded away.
+    """
+    key = unicodedata.normalize("NFKC", address or "").casefold()
+    key = re.sub(r"\s*,\s*", ", ", key)
+    key = re.sub(r"\s+", " ", key).strip(" ,")
+    if key and strict:
+        key = f"strict:{key}"
+    return key
+
+def _remember(key: str, coords: Optional[tuple], ttl_seconds: float):
+    _lru[key] = (coords, time.monotonic() + ttl_seconds)
+    _lru.move_to_end(key)
+    while len(_lru) > GEOCODE_LRU_SIZE:
+        _lru.popitem(last=False)
+
+def _ttl_for(coords: Optional[tuple]) -> timedelta:
+    if coords:
+        return timedelta(days=GEOCODE_CACHE_TTL_DAYS)
+    return timedelta(minutes=GEOCODE_NEGATIVE_TTL_MINUTES)
+
+async def get_cached_coordinates(
+    address: str,
+    strict: bool = False,
+    request: Optional[Request] = None,
+    timeout: float = GEOCODE_DEADLINE_SECONDS
+) -> Optional[tuple]:
+    """Geocode an address through the in-process LRU and the persistent cache
+
+    Only addresses missing from both caches reach Nominatim, through
+    geocode_address. Addresses Nominatim has no match for are cached too, for
+    GEOCODE_NEGATIVE_TTL_MINUTES. Lookups that could not complete raise
+    GeocodeUnavailable and are not cached.
+    """
+    key = normalize_address(address, strict)
+    if not key:
+        return None
+
+    await _sync_generation()
+    entry = _lru.get(key)
+    if entry is not None:
+        coords, expires_at = entry
+        if expires_at > time.monotonic():
+            _lru.move_to_end(key)
+            _stats.hit("memory_hits")
+            if coords is None:
+                _stats.add("negative_hits")
+            return coords
+        del _lru[key]
+
+    now = datetime.now(timezone.utc)
+    try:
+        cached = await geocode_cache.find_one({"_id": key, "expires_at": {"$gt": now}})
+    except Exception as e:
+        logger.error(f"Error reading geocode cache: {e}")
+        cached = None
+
+    if cached:
+        coords = (cached['latitude'], cached['longitude']) if cached.get('found') else None
+        _stats.hit("store_hits")
+        if coords is None:
+            _stats.add("negative_hits")
+        remaining = cached['expires_at'].replace(tzinfo=timezone.utc) - now
+        _remember(key, coords, remaining.total_seconds())
+        return coords
+
+    _stats.miss()
+    try:
+        coords = await geocode_address(address, strict=strict, timeout=timeout, request=request)
+    except GeocodeUnavailable:
+        _stats.add("unavailable")
+        raise
+    if coords is None:
+        _stats.add("failed_lookups")
+
+    ttl = _ttl_for(coords)
+    _remember(key, coords, ttl.total_seconds())
+    try:
+        await geocode_cache.update_one(
+            {"_id": key},
+            {"$set": {
+                "address": address,
+                "found": coords is not None,
+                "latitude": coords[0] if coords else None,
+                "longitude": coords[1] if coords else None,
+                "cached_at": now,
+                "expires_at": now + ttl
+            }},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error(f"Error writing geocode cache: {e}")
+
+    return coords
+
+async def _sync_generation():
+    """Drop the LRU when another worker purged the cache since we last looked"""
+    global _generation, _generation_checked_at
+    if time.monotonic() - _generation_checked_at < GEOCODE_PURGE_CHECK_SECONDS:
+        return
+    _generation_checked_at = time.monotonic()
+    try:
+        doc = await db.settings.find_one(GEOCODE_PURGE_QUERY, {"_id": 0, "generation": 1})
+    except Exception as e:
+        logger.error(f"Error reading geocode purge generation: {e}")
+        return
+    generation = doc['generation'] if doc else 0
+    if _generation is not None and generation != _generation:
+        # Entries are re-read from the persistent cache on the next lookup
+        _lru.clear()
+    _generation = generation
+
+async def purge_geocode_cache(address: Optional[str] = None, failed_only: bool = False) -> int:
+    """Remove cached entries, either for one address or for the whole cache
+
+    The calling worker's LRU is purged right away. Other workers drop their
+    LRU within GEOCODE_PURGE_CHECK_SECONDS, when they see the bumped purge
+    generation.
+    """
+    global _generation
+    query = {}
+    if address:
+        keys = [normalize_address(address), normalize_address(address, strict=True)]
+        query["_id"] = {"$in": keys}
+    else:
+        keys = list(_lru)
+    for key in keys:
+        entry = _lru.get(key)
+        if entry is not None and (entry[0] is None or not failed_only):
+            del _lru[key]
+    if failed_only:
+        query["found"] = False
+
+    result = await geocode_cache.delete_many(query)
+    doc = await db.settings.find_one_and_update(
+        GEOCODE_PURGE_QUERY,
+        {"$inc": {"generation": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0, "generation": 1}
+    )
+    # Our own LRU is already purged; only bumps by other workers should clear it
+    if _generation is not None and doc['generation'] == _generation + 1:
+        _generation = doc['generation']
+    return result.deleted_count
+
+async def get_geocode_cache_stats() -> dict:
+    """Cache counters (see CacheStats) plus the size of the shared cache"""
+    return _stats.snapshot(
+        entries=len(_lru),
+        stored_entries=await geocode_cache.count_documents({}),
+        stored_failed_entries=await geocode_cache.count_documents({"found": False})
+    )
@@ -0,0 +1,214 @@
+from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Images are downscaled to fit IMAGE_MAX_DIMENSION, then re-encoded at each
+# of the smaller VARIANT_WIDTHS as well
+IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 2048))
+VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_PROCESS_WORKERS = int(os.environ.get('IMAGE_PROCESS_WORKERS', 2))
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+# Lossy originals are re-encoded at this quality when their metadata is removed;
+# JPEGs keep their own quantization tables instead
+ORIGINAL_QUALITY = 90
+
+# Stored extension -> Pillow format of originals whose metadata can be removed
+ORIGINAL_FORMATS = {
+    "jpg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+    "gif": "GIF",
+    "avif": "AVIF",
+}
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+VARIANT_MEDIA_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+}
+
+# Variant files sit next to their source: <stem>.w<width>.<format>
+VARIANT_NAME_PATTERN = re.compile(r"^(?P<stem>.+)\.w(?P<width>\d+)\.(?P<format>avif|webp)$")
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def variant_name(stem: str, width: int, image_format: str) -> str:
+    return f"{stem}.w{width}.{image_format}"
+
+def _variant_formats() -> List[str]:
+    from PIL import features
+    formats = ["webp"]
+    if features.check("avif"):
+        formats.append("avif")
+    return formats
+
+def _render_variants(source_path: str, out_dir: str, stem: str) -> List[dict]:
+    """Decode, normalize and re-encode one image (runs in a worker process)
+
+    The EXIF orientation is applied to the pixels and no metadata is copied
+    to the outputs, so location and camera data never leave the server.
+    """
+    from PIL import Image, ImageOps
+
+    variants = []
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+
+        widths = sorted({width for width in VARIANT_WIDTHS if width < image.width} | {image.width})
+        for width in widths:
+            if width == image.width:
+                resized = image
+            else:
+                resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            for image_format in _variant_formats():
+                name = variant_name(stem, width, image_format)
+                path = os.path.join(out_dir, name)
+                tmp_path = os.path.join(out_dir, f".{name}.{os.getpid()}.tmp")
+                quality = AVIF_QUALITY if image_format == "avif" else WEBP_QUALITY
+                resized.save(tmp_path, image_format.upper(), quality=quality)
+                os.replace(tmp_path, path)
+                variants.append({
+                    "name": name,
+                    "width": resized.width,
+                    "height": resized.height,
+                    "format": image_format,
+                    "bytes": os.path.getsize(path),
+                })
+    return variants
+
+def _strip_metadata(source, target, extension: str):
+    """Re-save an original without EXIF, XMP or comments
+
+    Only the orientation tag and the ICC profile are kept, so the image looks
+    the same. Raises ValueError when the source does not decode as `extension`.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(source)
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Not a decodable image: {e}")
+    with image:
+        if image.format != ORIGINAL_FORMATS.get(extension):
+            raise ValueError(f"Not a {extension} image")
+        options = {}
+        orientation = image.getexif().get(EXIF_ORIENTATION_TAG)
+        if orientation and orientation != 1:
+            exif = Image.Exif()
+            exif[EXIF_ORIENTATION_TAG] = orientation
+            options["exif"] = exif.tobytes()
+        if image.info.get("icc_profile"):
+            options["icc_profile"] = image.info["icc_profile"]
+        if image.format == "JPEG":
+            options.update(quality="keep", subsampling="keep", qtables="keep")
+        elif image.format in ("WEBP", "AVIF"):
+            options["quality"] = ORIGINAL_QUALITY
+        if getattr(image, "n_frames", 1) > 1:
+            options["save_all"] = True
+        # Some encoders fall back to the source's info for these
+        for key in ("exif", "xmp", "XML:com.adobe.xmp", "comment"):
+            image.info.pop(key, None)
+        image.save(target, image.format, **options)
+
+def _strip_file_metadata(path: str, extension: str):
+    # Runs in a worker process; the file is replaced only once fully written
+    tmp_path = f"{path}.{os.getpid()}.strip"
+    try:
+        with open(tmp_path, 'wb') as f:
+            _strip_metadata(path, f, extension)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def _strip_bytes_metadata(data: bytes, extension: str) -> bytes:
+    # Runs in a worker process
+    output = io.BytesIO()
+    _strip_metadata(io.BytesIO(data), output, extension)
+    return output.getvalue()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Spawned workers start clean instead of inheriting the event loop and DB client
+        _executor = ProcessPoolExecutor(
+            max_workers=IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+async def render_image_variants(source_path: Path, stem: Optional[str] = None) -> List[dict]:
+    """Write normalized WebP/AVIF variants of an image next to it, off the event loop
+
+    Returns one entry per file written (name, width, height, format, bytes),
+    or an empty list when the source cannot be decoded.
+    """
+    stem = stem or source_path.name.split('.', 1)[0]
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), _render_variants, str(source_path), str(source_path.parent), stem)
+    except Exception as e:
+        logger.warning(f"Could not render variants of {source_path.name}: {e}")
+        return []
+
+async def strip_image_metadata(path: Path, extension: str):
+    """Rewrite an uploaded original in place without its metadata, off the event loop
+
+    Location and camera data must not be served with the original any more
+    than with its variants. Raises ValueError when the file cannot be decoded.
+    """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(_get_executor(), _strip_file_metadata, str(path), extension)
+
+async def strip_metadata_bytes(data: bytes, extension: str) -> bytes:
+    """Return image bytes without their metadata, stripped in the process pool
+
+    For images that are held in memory rather than streamed to a file.
+    Raises ValueError when the data cannot be decoded.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _strip_bytes_metadata, data, extension)
+
+def select_variant(directory: Path, stem: str, width: Optional[int], accept: str) -> Optional[Path]:
+    """Smallest stored variant at least `width` wide (the largest when width is None)
+
+    AVIF is preferred when the client accepts it. Returns None when the image
+    has no variants yet.
+    """
+    formats = ["avif", "webp"] if "image/avif" in (accept or "") else ["webp"]
+    by_format = {image_format: [] for image_format in formats}
+    for path in directory.glob(f"{stem}.w*.*"):
+        match = VARIANT_NAME_PATTERN.match(path.name)
+        if match and match.group("stem") == stem and match.group("format") in by_format:
+            by_format[match.group("format")].append((int(match.group("width")), path))
+
+    for image_format in formats:
+        candidates = sorted(by_format[image_format])
+        if not candidates:
+            continue
+        if width:
+            for candidate_width, path in candidates:
+                if candidate_width >= width:
+                    return path
+        return candidates[-1][1]
+    return None
+
+def shutdown_image_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,204 @@
+from typing import List, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from pathlib import Path
+import asyncio
+import base64
+import logging
+import os
+import re
+from config.settings import ROOT_DIR
+from config.database import db
+from services.image_processing import render_image_variants, strip_image_metadata, strip_metadata_bytes
+from services.blob_store import blob_path, write_blob, write_blob_upload, add_blob_ref
+
+logger = logging.getLogger(__name__)
+
+# Order photos live in the content-addressed blob store; this is where they
+# were kept before it existed
+LEGACY_ORDER_IMAGES_DIR = ROOT_DIR / 'uploads' / 'orders'
+ORDER_IMAGES_URL_PREFIX = "/api/orders/images/"
+
+# Upload limits: per photo, and for all the photos of one request
+ORDER_IMAGE_MAX_BYTES = int(os.environ.get('ORDER_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+ORDER_UPLOAD_MAX_BYTES = int(os.environ.get('ORDER_UPLOAD_MAX_BYTES', 60 * 1024 * 1024))
+
+# Originals are <sha256>.<ext>; their processed variants <sha256>.w<width>.<webp|avif>
+ORDER_IMAGE_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}(\.w\d+)?\.(jpg|png|webp|gif|heic|avif)$")
+
+IMAGE_MEDIA_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif",
+    "heic": "image/heic",
+    "avif": "image/avif",
+}
+
+def sniff_image_extension(header: bytes) -> Optional[str]:
+    """Image format from its first bytes, or None when it is not a known image"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if header[4:8] == b"ftyp" and header[8:12] in (b"heic", b"heix", b"heif", b"mif1", b"msf1"):
+        return "heic"
+    if header[4:8] == b"ftyp" and header[8:12] in (b"avif", b"avis"):
+        return "avif"
+    return None
+
+def require_image_extension(header: bytes) -> str:
+    extension = sniff_image_extension(header)
+    if extension is None:
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+    return extension
+
+async def _strip_upload_metadata(path: Path, extension: str):
+    try:
+        await strip_image_metadata(path, extension)
+    except ValueError as e:
+        logger.warning(f"Rejected undecodable {extension} upload: {e}")
+        raise HTTPException(status_code=415, detail="Unsupported image format")
+
+async def save_image_upload(upload: UploadFile, max_bytes: int) -> Tuple[str, int]:
+    """Stream an uploaded image into the blob store without its EXIF/XMP metadata
+
+    Returns the blob name and the uploaded size. Files that are not a
+    decodable image are rejected with 415, oversized ones with 413.
+    """
+    return await write_blob_upload(upload, max_bytes, require_image_extension, _strip_upload_metadata)
+
+def order_image_path(name: str):
+    """Resolve a stored image name to its file, rejecting anything that is not a content hash"""
+    if not ORDER_IMAGE_NAME_PATTERN.match(name):
+        return None
+    path = blob_path(name)
+    legacy_path = LEGACY_ORDER_IMAGES_DIR / name[:2] / name
+    # Photos stored before the blob store stay readable until they are migrated
+    if not path.exists() and legacy_path.exists():
+        return legacy_path
+    return path
+
+async def save_order_image(data: bytes) -> str:
+    """Store an order photo and return the URL to keep on the order
+
+    Identical photos share one file, so re-uploads cost no extra disk. Raises
+    ValueError when the data is not a decodable image.
+    """
+    extension = sniff_image_extension(data[:16])
+    if extension is None:
+        raise ValueError("Unsupported image format")
+    data = await strip_metadata_bytes(data, extension)
+    return f"{ORDER_IMAGES_URL_PREFIX}{write_blob(data, extension)}"
+
+async def save_order_image_upload(upload: UploadFile, max_bytes: int = ORDER_IMAGE_MAX_BYTES) -> Tuple[str, int]:
+    """Stream an uploaded photo into the store, hashing and size-checking it chunk by chunk
+
+    Only one chunk is held in memory at a time. Returns the image URL and its
+    size; raises 413 once more than max_bytes have been read.
+    """
+    name, size = await save_image_upload(upload, max_bytes)
+    return f"{ORDER_IMAGES_URL_PREFIX}{name}", size
+
+async def save_order_image_uploads(uploads: List[UploadFile]) -> List[str]:
+    """Store every photo of a request, enforcing the per-file and per-request limits"""
+    urls = []
+    remaining = ORDER_UPLOAD_MAX_BYTES
+    for upload in uploads:
+        url, size = await save_order_image_upload(upload, min(ORDER_IMAGE_MAX_BYTES, remaining))
+        remaining -= size
+        urls.append(url)
+    return urls
+
+async def save_inline_order_image(data_uri: str) -> Optional[str]:
+    """Move a base64 data URI image into the store and return its URL"""
+    if not data_uri.startswith("data:"):
+        return None
+    try:
+        encoded = data_uri.split(',', 1)[1]
+        return await save_order_image(base64.b64decode(encoded))
+    except Exception as e:
+        logger.error(f"Could not decode inline order image: {e}")
+        return None
+
+async def render_order_image_variants(order_id: str, urls: List[str]) -> List[dict]:
+    """Render the variants of an order's photos and record them on the order"""
+    image_variants = []
+    for url in urls:
+        if not url.startswith(ORDER_IMAGES_URL_PREFIX):
+            continue
+        path = order_image_path(url[len(ORDER_IMAGES_URL_PREFIX):])
+        if path is None or not path.exists():
+            continue
+        variants = await render_image_variants(path)
+        image_variants.append({
+            "source": url,
+            "variants": [
+                {"url": f"{ORDER_IMAGES_URL_PREFIX}{variant.pop('name')}", **variant}
+                for variant in variants
+            ]
+        })
+
+    await db.orders.update_one({"id": order_id}, {"$set": {"image_variants": image_variants}})
+    return image_variants
+
+async def add_order_image_refs(order_id: str, urls: List[str]):
+    """Count an order as a user of the blobs behind its photo URLs"""
+    for url in urls:
+        if url.startswith(ORDER_IMAGES_URL_PREFIX):
+            await add_blob_ref(url[len(ORDER_IMAGES_URL_PREFIX):], f"order:{order_id}")
+
+_variant_tasks = set()
+
+def schedule_order_image_variants(order_id: str, urls: List[str]):
+    """Render an order's photo variants in the background; the order is usable meanwhile"""
+    if not urls:
+        return
+
+    async def run():
+        try:
+            await render_order_image_variants(order_id, urls)
+        except Exception as e:
+            logger.error(f"Error rendering image variants of order {order_id}: {e}")
+
+    task = asyncio.create_task(run())
+    # Keep a reference so the task is not garbage collected before it finishes
+    _variant_tasks.add(task)
+    task.add_done_callback(_variant_tasks.discard)
+
+async def migrate_inline_order_images(batch_size: int = 100) -> dict:
+    """Extract base64 images embedded in orders.shoe_images into the image store"""
+    migrated_orders = 0
+    migrated_images = 0
+    failed_images = 0
+
+    cursor = db.orders.find(
+        {"shoe_images": {"$regex": "^data:"}},
+        {"_id": 0, "id": 1, "shoe_images": 1},
+        batch_size=batch_size
+    )
+    async for order in cursor:
+        images = []
+        for image in order.get('shoe_images', []):
+            url = await save_inline_order_image(image) if image.startswith("data:") else None
+            if url:
+                migrated_images += 1
+                images.append(url)
+            else:
+                if image.startswith("data:"):
+                    failed_images += 1
+                images.append(image)
+
+        await db.orders.update_one({"id": order['id']}, {"$set": {"shoe_images": images}})
+        await add_order_image_refs(order['id'], images)
+        migrated_orders += 1
+        logger.info(f"Migrated images of order {order['id']}")
+
+    return {
+        "orders": migrated_orders,
+        "images": migrated_images,
+        "failed_images": failed_images
+    }
@@ -0,0 +1,159 @@
+from typing import List, Optional
+from collections import OrderedDict
+import copy
+import hashlib
+import logging
+import os
+import time
+from pymongo import ReturnDocument
+from config.cache_stats import CacheStats
+from config.database import db
+
+logger = logging.getLogger(__name__)
+
+# Homepage media held in memory per worker, bounded by total bytes. Admin
+# writes clear it on the worker that made them and bump a shared version;
+# other workers see the bump within MEDIA_VERSION_CHECK_SECONDS and clear
+# theirs too.
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+MEDIA_CACHE_MAX_FILE_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_FILE_BYTES', 512 * 1024))
+MEDIA_CACHE_TTL_SECONDS = float(os.environ.get('MEDIA_CACHE_TTL_SECONDS', 300))
+MEDIA_VERSION_CHECK_SECONDS = float(os.environ.get('MEDIA_VERSION_CHECK_SECONDS', 5))
+
+# Settings document holding the media version, bumped on every media write
+MEDIA_VERSION_QUERY = {"type": "media_version"}
+
+# Rough per-entry weight of listings and resolved names, which are not raw bytes
+LISTING_ENTRY_BYTES = 1024
+NAME_ENTRY_BYTES = 256
+
+# key -> (value, size in bytes, monotonic expiry), least recently used first
+_entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cached_bytes = 0
+_version: Optional[int] = None
+_version_checked_at = 0.0
+
+_stats = CacheStats("evictions", "invalidations", "uncacheable")
+
+def _clear():
+    global _cached_bytes
+    if _entries:
+        _stats.add("invalidations")
+    _entries.clear()
+    _cached_bytes = 0
+
+async def _sync_version():
+    """Clear the cache when another worker changed media since we last looked"""
+    global _version, _version_checked_at
+    if time.monotonic() - _version_checked_at < MEDIA_VERSION_CHECK_SECONDS:
+        return
+    _version_checked_at = time.monotonic()
+    try:
+        doc = await db.settings.find_one(MEDIA_VERSION_QUERY, {"_id": 0, "version": 1})
+    except Exception as e:
+        logger.error(f"Error reading media version: {e}")
+        return
+    version = doc['version'] if doc else 0
+    if _version is not None and version != _version:
+        _clear()
+    _version = version
+
+def _get(key: tuple):
+    entry = _entries.get(key)
+    if entry is not None:
+        value, size, expires_at = entry
+        if expires_at > time.monotonic():
+            _entries.move_to_end(key)
+            _stats.hit()
+            return value
+        _drop(key)
+    _stats.miss()
+    return None
+
+def _drop(key: tuple):
+    global _cached_bytes
+    _, size, _ = _entries.pop(key)
+    _cached_bytes -= size
+
+def _put(key: tuple, value, size: int):
+    global _cached_bytes
+    if key in _entries:
+        _drop(key)
+    _entries[key] = (value, size, time.monotonic() + MEDIA_CACHE_TTL_SECONDS)
+    _cached_bytes += size
+    while _cached_bytes > MEDIA_CACHE_MAX_BYTES and _entries:
+        _drop(next(iter(_entries)))
+        _stats.add("evictions")
+
+async def get_media_listing(category: str, limit: int) -> List[dict]:
+    """Media of a category sorted by position, as served by the public carousel/gallery endpoints
+
+    Callers get their own copies and may modify them freely.
+    """
+    await _sync_version()
+    key = ("listing", category, limit)
+    images = _get(key)
+    if images is None:
+        images = await db.media.find(
+            {"category": category},
+            {"_id": 0}
+        ).sort("position", 1).to_list(limit)
+        _put(key, images, LISTING_ENTRY_BYTES * max(len(images), 1))
+    return copy.deepcopy(images)
+
+async def get_resolved_name(filename: str, width: Optional[int], accepts_avif: bool) -> Optional[str]:
+    """File name a negotiated media request was answered with last time"""
+    await _sync_version()
+    return _get(("name", filename, width, accepts_avif))
+
+def remember_resolved_name(filename: str, width: Optional[int], accepts_avif: bool, resolved: str):
+    _put(("name", filename, width, accepts_avif), resolved, NAME_ENTRY_BYTES)
+
+async def get_media_file(file_path) -> Optional[tuple]:
+    """(bytes, etag, mtime) of a cached file, or None"""
+    await _sync_version()
+    return _get(("file", str(file_path)))
+
+def load_media_file(file_path) -> Optional[tuple]:
+    """Read a small file into the cache and return (bytes, etag, mtime)
+
+    Files above MEDIA_CACHE_MAX_FILE_BYTES are not cached and give None, so
+    the caller streams them from disk instead.
+    """
+    stat = os.stat(file_path)
+    if stat.st_size > MEDIA_CACHE_MAX_FILE_BYTES:
+        _stats.add("uncacheable")
+        return None
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    # Same strong ETag as file_service.content_etag
+    entry = (data, f'"{hashlib.sha256(data).hexdigest()}"', stat.st_mtime)
+    _put(("file", str(file_path)), entry, len(data))
+    return entry
+
+async def invalidate_media_cache():
+    """Forget every cached listing and file after media was uploaded, changed or deleted
+
+    Bumps the shared version so the other workers follow.
+    """
+    global _version
+    _clear()
+    doc = await db.settings.find_one_and_update(
+        MEDIA_VERSION_QUERY,
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        projection={"_id": 0, "version": 1}
+    )
+    # Our own cache is already clear; only bumps by other workers should clear it
+    if _version is not None and doc['version'] == _version + 1:
+        _version = doc['version']
+
+def get_media_cache_stats() -> dict:
+    """Counters of the media cache (see CacheStats) and its memory use"""
+    return _stats.snapshot(
+        entries=len(_entries),
+        bytes=_cached_bytes,
+        max_bytes=MEDIA_CACHE_MAX_BYTES,
+        ttl_seconds=MEDIA_CACHE_TTL_SECONDS
+    )
@@ -0,0 +1,162 @@
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+import logging
+import os
+from config.settings import ROOT_DIR
+from config.database import db
+
+logger = logging.getLogger(__name__)
+
+# Timestamp fields that older releases stored as ISO 8601 strings
+DATETIME_FIELDS = {
+    "users": ["created_at", "updated_at", "approved_at", "rejected_at", "terms_signed_at", "address_updated_at"],
+    "orders": ["created_at", "updated_at"],
+    "services": ["created_at"],
+    "reviews": ["created_at"],
+    "payment_transactions": ["created_at", "updated_at"],
+    "media": ["created_at"],
+    "settings": ["updated_at"],
+}
+
+def _parse_timestamp(value: str):
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+async def migrate_datetime_fields(batch_size: int = 500) -> dict:
+    """Convert string timestamps to native BSON dates, collection by collection
+
+    Safe to re-run: only fields still holding a string are touched, and each
+    update is conditional on the value not having changed since it was read.
+    Returns the number of converted fields per collection.
+    """
+    converted = {}
+    for collection_name, fields in DATETIME_FIELDS.items():
+        collection = db[collection_name]
+        count = 0
+        unparseable = 0
+        for field in fields:
+            requests = []
+            cursor = collection.find(
+                {field: {"$type": "string"}},
+                {"_id": 1, field: 1},
+                batch_size=batch_size
+            )
+            async for doc in cursor:
+                value = _parse_timestamp(doc[field])
+                if value is None:
+                    unparseable += 1
+                    continue
+                requests.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: value}}))
+                if len(requests) >= batch_size:
+                    result = await collection.bulk_write(requests, ordered=False)
+                    count += result.modified_count
+                    requests = []
+            if requests:
+                result = await collection.bulk_write(requests, ordered=False)
+                count += result.modified_count
+
+        if unparseable:
+            logger.warning(f"{collection_name}: {unparseable} timestamps could not be parsed and were left as strings")
+        logger.info(f"{collection_name}: converted {count} timestamps")
+        converted[collection_name] = count
+    return converted
+
+async def migrate_files_to_blob_store() -> dict:
+    """Move order photos, media files and partner documents into the blob store
+
+    Files keep their content but are renamed after it, so duplicates collapse
+    into one blob. Documents are updated to point at the new names, then the
+    blob reference lists are rebuilt. Safe to re-run.
+    """
+    from services.blob_store import (
+        BLOB_DIR,
+        PRIVATE_KEY_PREFIX,
+        blob_path,
+        blob_key_for_path,
+        write_blob,
+        rebuild_blob_refs,
+        PARTNER_DOCUMENT_FIELDS,
+    )
+    from services.image_store import LEGACY_ORDER_IMAGES_DIR, sniff_image_extension
+    from services.file_service import sniff_document_extension
+    from services.image_processing import VARIANT_NAME_PATTERN, strip_metadata_bytes
+
+    moved = {"order_images": 0, "media": 0, "documents": 0}
+
+    # Order photos already have content-addressed names; only their directory changes
+    if LEGACY_ORDER_IMAGES_DIR.exists():
+        for path in LEGACY_ORDER_IMAGES_DIR.glob("*/*"):
+            target = blob_path(path.name)
+            if target is None:
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.exists():
+                path.unlink()
+            else:
+                os.replace(path, target)
+            moved["order_images"] += 1
+
+    media_dir = ROOT_DIR / 'uploads' / 'media'
+    async for media in db.media.find({}, {"_id": 0, "id": 1, "filename": 1, "variants": 1}):
+        source = media_dir / media['filename']
+        if blob_path(media['filename']) or not source.is_file():
+            continue
+        with open(source, 'rb') as f:
+            data = f.read()
+        extension = sniff_image_extension(data[:16]) or "jpg"
+        try:
+            data = await strip_metadata_bytes(data, extension)
+        except Exception as e:
+            logger.warning(f"Could not remove metadata from media {media['filename']}: {e}")
+        name = write_blob(data, extension)
+        digest = name.split('.', 1)[0]
+        stem = media['filename'].split('.', 1)[0]
+        variants = []
+        for variant in media.get('variants', []):
+            variant_file = media_dir / variant['url'].rsplit('/', 1)[-1]
+            match = VARIANT_NAME_PATTERN.match(variant_file.name)
+            if not match or match.group("stem") != stem:
+                continue
+            variant_name = f"{digest}.w{match.group('width')}.{match.group('format')}"
+            if variant_file.exists():
+                os.replace(variant_file, blob_path(variant_name))
+            variants.append({**variant, "url": f"/api/media/{variant_name}"})
+        await db.media.update_one(
+            {"id": media['id']},
+            {"$set": {"filename": name, "url": f"/api/media/{name}", "variants": variants}}
+        )
+        source.unlink()
+        moved["media"] += 1
+
+    # Partner documents go to the private store, including any that were
+    # written to the public one
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in PARTNER_DOCUMENT_FIELDS}}
+    async for user in db.users.find({"role": "cobbler"}, projection):
+        update = {}
+        legacy_files = []
+        for field in PARTNER_DOCUMENT_FIELDS:
+            path = user.get(field)
+            key = blob_key_for_path(path)
+            if not path or (key and key.startswith(PRIVATE_KEY_PREFIX)) or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            name = write_blob(data, sniff_document_extension(data[:16]) or "bin", private=True)
+            update[field] = str(blob_path(name, private=True))
+            # Public blobs may be shared; once unreferenced the GC sweep removes them
+            if key is None:
+                legacy_files.append(path)
+        if update:
+            await db.users.update_one({"id": user['id']}, {"$set": update})
+            for path in legacy_files:
+                os.unlink(path)
+            moved["documents"] += len(update)
+
+    moved["blobs"] = await rebuild_blob_refs()
+    logger.info(f"Blob store now holds {moved['blobs']} blobs under {BLOB_DIR}")
+    return moved
@@ -0,0 +1,39 @@
+from fastapi import HTTPException
+from typing import Optional, Tuple
+from datetime import datetime, timezone
+import base64
+import json
+
+def encode_cursor(created_at: datetime, item_id: str) -> str:
+    """Opaque cursor pointing just after the given (created_at, id) position"""
+    payload = json.dumps([created_at.isoformat(), item_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Cursors come back from clients; anything but the shape we encode is rejected
+        if not isinstance(created_at, str) or not isinstance(item_id, str):
+            raise ValueError("malformed cursor")
+        created_at = datetime.fromisoformat(created_at)
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return created_at, item_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_after(cursor: Optional[str]) -> dict:
+    """Filter selecting documents after the cursor in (created_at desc, id desc) order"""
+    if not cursor:
+        return {}
+    created_at, item_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": item_id}}
+        ]
+    }
+
+# Sort order matching keyset_after; ties on created_at are broken by id
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
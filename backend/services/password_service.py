@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+import asyncio
+import logging
+import os
+import time
+from config.settings import pwd_context
+from config.cache_stats import CacheStats
+
+logger = logging.getLogger(__name__)
+
+# bcrypt releases the GIL while hashing, so a small thread pool runs hashes in
+# parallel without blocking the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+# Hashes allowed to wait for a worker before new ones are turned away with a 503
+PASSWORD_QUEUE_LIMIT = int(os.environ.get('PASSWORD_QUEUE_LIMIT', 64))
+PASSWORD_RETRY_AFTER_SECONDS = 2
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password")
+
+_stats = CacheStats(
+    "queue_depth", "running", "completed", "rejected", "max_queue_depth",
+    "total_wait_seconds", "total_run_seconds",
+    hits=False
+)
+
+def _timed(func, submitted_at: float, *args):
+    started_at = time.monotonic()
+    _stats.add(queue_depth=-1, running=1, total_wait_seconds=started_at - submitted_at)
+    try:
+        return func(*args)
+    finally:
+        _stats.add("completed", running=-1, total_run_seconds=time.monotonic() - started_at)
+
+def _release_if_cancelled(future):
+    # A job cancelled before it started never reaches _timed
+    if future.cancelled():
+        _stats.add(queue_depth=-1)
+
+async def _run(func, *args):
+    if not _stats.reserve("queue_depth", PASSWORD_QUEUE_LIMIT, peak="max_queue_depth"):
+        _stats.add("rejected")
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please retry",
+            headers={"Retry-After": str(PASSWORD_RETRY_AFTER_SECONDS)}
+        )
+    future = _executor.submit(_timed, func, time.monotonic(), *args)
+    future.add_done_callback(_release_if_cancelled)
+    return await asyncio.wrap_future(future)
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _run(pwd_context.verify, plain_password, hashed_password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple:
+    """Verify a password and return (valid, new_hash)
+
+    new_hash is set when the stored hash uses other bcrypt rounds than
+    BCRYPT_ROUNDS, so callers can upgrade it on a successful login.
+    """
+    return await _run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+def get_password_pool_stats() -> dict:
+    """Pool counters (see CacheStats) with average wait and run times"""
+    stats = _stats.snapshot(workers=PASSWORD_HASH_WORKERS, queue_limit=PASSWORD_QUEUE_LIMIT)
+    completed = stats["completed"]
+    total_wait = stats.pop("total_wait_seconds")
+    total_run = stats.pop("total_run_seconds")
+    stats["avg_wait_ms"] = round(total_wait / completed * 1000, 1) if completed else None
+    stats["avg_run_ms"] = round(total_run / completed * 1000, 1) if completed else None
+    return stats
+
+def shutdown_password_pool():
+    _executor.shutdown(wait=True)
@@ -0,0 +1,94 @@
+from fastapi import HTTPException
+from typing import List
+import json
+from config.database import db
+from services.catalog_service import get_catalog
+
+# Pricing rules
+COMMISSION_RATE = 0.15
+EXPRESS_DELIVERY_PRICE = 15.0
+STANDARD_DELIVERY_PRICE = 5.0
+
+def delivery_price_for(delivery_option: str) -> float:
+    return EXPRESS_DELIVERY_PRICE if delivery_option == 'express' else STANDARD_DELIVERY_PRICE
+
+def parse_cart_items(service_items: str) -> List[dict]:
+    """Parse the JSON cart sent by the checkout form"""
+    try:
+        cart_items = json.loads(service_items)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Format de panier invalide")
+    
+    if not isinstance(cart_items, list):
+        raise HTTPException(status_code=400, detail="Format de panier invalide")
+    
+    if not cart_items:
+        raise HTTPException(status_code=400, detail="Le panier est vide")
+    
+    if not all(isinstance(item, dict) and isinstance(item.get('id'), str) for item in cart_items):
+        raise HTTPException(status_code=400, detail="Format de panier invalide")
+    
+    for item in cart_items:
+        quantity = item.get('quantity', 1)
+        # bool is an int subclass; true/false are not quantities
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise HTTPException(status_code=400, detail="Quantité invalide")
+    
+    return cart_items
+
+async def price_cart(cart_items: List[dict], delivery_option: str) -> dict:
+    """Resolve every service in the cart and compute the order totals
+    
+    Services come from the in-memory catalog; ids it does not know yet (a
+    service created moments ago on another worker) are fetched with one
+    query. Returns the order line items together with services_total,
+    commission, delivery_price and total_amount.
+    """
+    catalog = await get_catalog()
+    services_by_id = {}
+    missing_ids = set()
+    for item in cart_items:
+        service = catalog.by_id.get(item['id'])
+        if service:
+            services_by_id[service.id] = {"id": service.id, "name": service.name, "price": service.price}
+        else:
+            missing_ids.add(item['id'])
+    
+    if missing_ids:
+        services = await db.services.find(
+            {"id": {"$in": list(missing_ids)}},
+            {"_id": 0, "id": 1, "name": 1, "price": 1}
+        ).to_list(len(missing_ids))
+        services_by_id.update({service['id']: service for service in services})
+    
+    order_items = []
+    services_total = 0
+    commission_total = 0
+    
+    for cart_item in cart_items:
+        service = services_by_id.get(cart_item['id'])
+        if not service:
+            raise HTTPException(status_code=404, detail=f"Service {cart_item['id']} introuvable")
+        
+        quantity = cart_item.get('quantity', 1)
+        item_total = service['price'] * quantity
+        
+        order_items.append({
+            "service_id": service['id'],
+            "service_name": service['name'],
+            "service_price": service['price'],
+            "quantity": quantity
+        })
+        
+        services_total += item_total
+        commission_total += item_total * COMMISSION_RATE
+    
+    delivery_price = delivery_price_for(delivery_option)
+    
+    return {
+        "items": order_items,
+        "services_total": services_total,
+        "commission": commission_total,
+        "delivery_price": delivery_price,
+        "total_amount": services_total + delivery_price
+    }
@@ -0,0 +1,179 @@
+from typing import Optional
+from datetime import datetime, timezone
+from pymongo import ReplaceOne
+import logging
+from config.database import db
+
+logger = logging.getLogger(__name__)
+
+# One document per (scope, month): "global:2024-05", "cobbler:<id>:2024-05"
+monthly_rollups = db["monthly_rollups"]
+GLOBAL_SCOPE = "global"
+REBUILD_MARKER_ID = "_rebuild"
+
+ROLLUP_PROJECTION = {
+    "_id": 0,
+    "month": 1,
+    "orders": 1,
+    "revenue": 1,
+    "commission": 1,
+    "status_counts": 1,
+}
+
+def month_key(created_at: Optional[datetime]) -> Optional[str]:
+    """YYYY-MM bucket of an order's created_at"""
+    return created_at.strftime("%Y-%m") if isinstance(created_at, datetime) else None
+
+def rollup_scope(cobbler_id: Optional[str] = None) -> str:
+    return f"cobbler:{cobbler_id}" if cobbler_id else GLOBAL_SCOPE
+
+def _rollup_id(scope: str, month: str) -> str:
+    return f"{scope}:{month}"
+
+def _contributions(order: Optional[dict]) -> dict:
+    """(scope, month) -> what a single order adds to that rollup"""
+    if not order:
+        return {}
+    month = month_key(order.get('created_at'))
+    if not month:
+        return {}
+
+    inc = {
+        "orders": 1,
+        "revenue": order.get('total_amount', 0) or 0,
+        "commission": order.get('commission', 0) or 0,
+        f"status_counts.{order.get('status') or 'unknown'}": 1
+    }
+    scopes = [GLOBAL_SCOPE]
+    if order.get('cobbler_id'):
+        scopes.append(rollup_scope(order['cobbler_id']))
+    return {(scope, month): (order.get('cobbler_id') if scope != GLOBAL_SCOPE else None, inc) for scope in scopes}
+
+def _rollup_deltas(before: Optional[dict], after: Optional[dict]) -> dict:
+    """(scope, month) -> (cobbler_id, $inc) moving an order from `before` to `after`
+
+    Rollups and fields that do not change are left out.
+    """
+    deltas = {}
+    for sign, order in ((-1, before), (1, after)):
+        for key, (cobbler_id, inc) in _contributions(order).items():
+            entry = deltas.setdefault(key, (cobbler_id, {}))
+            for field, value in inc.items():
+                entry[1][field] = entry[1].get(field, 0) + sign * value
+
+    changed = {}
+    for key, (cobbler_id, inc) in deltas.items():
+        inc = {field: value for field, value in inc.items() if value}
+        if inc:
+            changed[key] = (cobbler_id, inc)
+    return changed
+
+async def record_rollup_change(before: Optional[dict], after: Optional[dict]):
+    """Move an order's contribution between monthly rollups as it changes
+
+    Takes the same before/after pair as stats_service.record_order_change.
+    """
+    for (scope, month), (cobbler_id, inc) in _rollup_deltas(before, after).items():
+        try:
+            await monthly_rollups.update_one(
+                {"_id": _rollup_id(scope, month)},
+                {
+                    "$inc": inc,
+                    "$setOnInsert": {
+                        "scope": scope,
+                        "cobbler_id": cobbler_id,
+                        "month": month,
+                        "year": int(month[:4])
+                    }
+                },
+                upsert=True
+            )
+        except Exception as e:
+            # The next rebuild_monthly_rollups run corrects any drift
+            logger.error(f"Error updating monthly rollup {scope}:{month}: {e}")
+
+def _rollup_pipeline(by_cobbler: bool) -> list:
+    month = {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}}
+    group_id = {"month": month, "status": "$status"}
+    match = {"created_at": {"$type": "date"}}
+    if by_cobbler:
+        group_id["cobbler_id"] = "$cobbler_id"
+        match["cobbler_id"] = {"$nin": [None, ""]}
+
+    outer_id = {"month": "$_id.month"}
+    if by_cobbler:
+        outer_id["cobbler_id"] = "$_id.cobbler_id"
+
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": group_id,
+            "orders": {"$sum": 1},
+            "revenue": {"$sum": {"$ifNull": ["$total_amount", 0]}},
+            "commission": {"$sum": {"$ifNull": ["$commission", 0]}}
+        }},
+        {"$group": {
+            "_id": outer_id,
+            "orders": {"$sum": "$orders"},
+            "revenue": {"$sum": "$revenue"},
+            "commission": {"$sum": "$commission"},
+            "status_counts": {"$push": {"k": {"$ifNull": ["$_id.status", "unknown"]}, "v": "$orders"}}
+        }},
+        {"$set": {"status_counts": {"$arrayToObject": "$status_counts"}}}
+    ]
+
+async def rebuild_monthly_rollups() -> int:
+    """Recompute every monthly rollup from the orders collection
+
+    Returns the number of rollup documents written. Months without orders
+    are removed.
+    """
+    rebuilt_at = datetime.now(timezone.utc)
+    requests = []
+    for by_cobbler in (False, True):
+        async for row in db.orders.aggregate(_rollup_pipeline(by_cobbler)):
+            month = row["_id"]["month"]
+            cobbler_id = row["_id"].get("cobbler_id")
+            scope = rollup_scope(cobbler_id)
+            doc = {
+                "scope": scope,
+                "cobbler_id": cobbler_id,
+                "month": month,
+                "year": int(month[:4]),
+                "orders": row["orders"],
+                "revenue": row["revenue"],
+                "commission": row["commission"],
+                "status_counts": row["status_counts"],
+                "rebuilt_at": rebuilt_at
+            }
+            requests.append(ReplaceOne({"_id": _rollup_id(scope, month)}, doc, upsert=True))
+
+    if requests:
+        await monthly_rollups.bulk_write(requests, ordered=False)
+    await monthly_rollups.delete_many({"_id": {"$ne": REBUILD_MARKER_ID}, "rebuilt_at": {"$lt": rebuilt_at}})
+    await monthly_rollups.replace_one(
+        {"_id": REBUILD_MARKER_ID},
+        {"rebuilt_at": rebuilt_at, "rollups": len(requests)},
+        upsert=True
+    )
+    logger.info(f"Rebuilt {len(requests)} monthly rollups")
+    return len(requests)
+
+async def ensure_monthly_rollups():
+    """Backfill the rollups once on a deployment that has never had them"""
+    if not await monthly_rollups.find_one({"_id": REBUILD_MARKER_ID}):
+        await rebuild_monthly_rollups()
+
+async def rollups_available() -> bool:
+    return await monthly_rollups.find_one({"_id": REBUILD_MARKER_ID}, {"_id": 1}) is not None
+
+async def get_monthly_rollups(first_year: int, last_year: Optional[int] = None, cobbler_id: Optional[str] = None) -> list:
+    """Rollup documents for a range of years, oldest month first
+
+    At most 12 documents per year are read, whatever the order volume.
+    """
+    query = {
+        "scope": rollup_scope(cobbler_id),
+        "year": {"$gte": first_year, "$lte": last_year or first_year}
+    }
+    return await monthly_rollups.find(query, ROLLUP_PROJECTION).sort("month", 1).to_list(None)
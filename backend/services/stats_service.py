@@ -0,0 +1,206 @@
+from typing import Optional
+from datetime import datetime, timezone
+from pymongo import ReturnDocument, ReplaceOne
+import logging
+from config.database import db
+from services.rollup_service import record_rollup_change
+
+logger = logging.getLogger(__name__)
+
+# Order statuses counted as "pending" on the dashboards
+PENDING_STATUSES = ['pending', 'accepted', 'in_progress']
+COMPLETED_STATUS = 'delivered'
+
+STAT_FIELDS = ["total_orders", "total_revenue", "total_commission", "pending_orders", "completed_orders"]
+
+# Materialized counters: one document per scope ("global", "cobbler:<id>", "client:<id>")
+order_stats = db["stats"]
+GLOBAL_SCOPE = "global"
+REBUILD_MARKER_ID = "_rebuild"
+
+# Order fields the counters depend on
+STATS_PROJECTION = {
+    "_id": 0,
+    "status": 1,
+    "total_amount": 1,
+    "commission": 1,
+    "cobbler_id": 1,
+    "client_id": 1,
+    "created_at": 1,
+}
+
+def stats_scope_query(current_user: dict) -> dict:
+    """Orders visible in the user's dashboard stats"""
+    if current_user['role'] == 'admin':
+        return {}
+    if current_user['role'] == 'cobbler':
+        return {"cobbler_id": current_user['user_id']}
+    return {"client_id": current_user['user_id']}
+
+def stats_scope_id(current_user: dict) -> str:
+    """Counter document holding the user's dashboard stats"""
+    if current_user['role'] == 'admin':
+        return GLOBAL_SCOPE
+    if current_user['role'] == 'cobbler':
+        return f"cobbler:{current_user['user_id']}"
+    return f"client:{current_user['user_id']}"
+
+def _group_stage(group_id) -> dict:
+    is_completed = {"$eq": ["$status", COMPLETED_STATUS]}
+    return {"$group": {
+        "_id": group_id,
+        "total_orders": {"$sum": 1},
+        "total_revenue": {"$sum": {"$cond": [is_completed, "$total_amount", 0]}},
+        "total_commission": {"$sum": {"$cond": [is_completed, "$commission", 0]}},
+        "pending_orders": {"$sum": {"$cond": [{"$in": ["$status", PENDING_STATUSES]}, 1, 0]}},
+        "completed_orders": {"$sum": {"$cond": [is_completed, 1, 0]}}
+    }}
+
+async def compute_order_stats(query: dict) -> dict:
+    """Count and sum the matching orders in a single $group aggregation
+    
+    Revenue and commission only include delivered orders.
+    """
+    results = await db.orders.aggregate([{"$match": query}, _group_stage(None)]).to_list(1)
+    if not results:
+        return {
+            "total_orders": 0,
+            "total_revenue": 0.0,
+            "total_commission": 0.0,
+            "pending_orders": 0,
+            "completed_orders": 0
+        }
+    stats = results[0]
+    stats.pop("_id")
+    return stats
+
+async def get_order_stats(current_user: dict) -> dict:
+    """Read the user's materialized counters, aggregating only if they don't exist yet"""
+    stats = await order_stats.find_one({"_id": stats_scope_id(current_user)})
+    if stats:
+        return {field: stats.get(field, 0) for field in STAT_FIELDS}
+    return await compute_order_stats(stats_scope_query(current_user))
+
+def _contribution(order: Optional[dict]) -> dict:
+    """What a single order adds to each counter"""
+    if not order:
+        return {}
+    completed = order.get('status') == COMPLETED_STATUS
+    return {
+        "total_orders": 1,
+        "total_revenue": order.get('total_amount', 0) if completed else 0,
+        "total_commission": order.get('commission', 0) if completed else 0,
+        "pending_orders": 1 if order.get('status') in PENDING_STATUSES else 0,
+        "completed_orders": 1 if completed else 0
+    }
+
+def _scopes(order: Optional[dict]) -> list:
+    if not order:
+        return []
+    scopes = [GLOBAL_SCOPE]
+    if order.get('cobbler_id'):
+        scopes.append(f"cobbler:{order['cobbler_id']}")
+    if order.get('client_id'):
+        scopes.append(f"client:{order['client_id']}")
+    return scopes
+
+def _stats_deltas(before: Optional[dict], after: Optional[dict]) -> dict:
+    """scope -> $inc moving an order's contribution from `before` to `after`
+
+    Scopes and fields that do not change are left out.
+    """
+    deltas = {}
+    for scope in _scopes(before):
+        for field, value in _contribution(before).items():
+            deltas.setdefault(scope, {}).setdefault(field, 0)
+            deltas[scope][field] -= value
+    for scope in _scopes(after):
+        for field, value in _contribution(after).items():
+            deltas.setdefault(scope, {}).setdefault(field, 0)
+            deltas[scope][field] += value
+
+    changed = {}
+    for scope, inc in deltas.items():
+        inc = {field: value for field, value in inc.items() if value}
+        if inc:
+            changed[scope] = inc
+    return changed
+
+async def record_order_change(before: Optional[dict], after: Optional[dict]):
+    """Apply the difference between two versions of an order to every affected counter
+    
+    `before` is None for a new order. A change of cobbler or client moves the
+    order's contribution from one scope to the other. The monthly rollups
+    are kept in step as well.
+    """
+    for scope, inc in _stats_deltas(before, after).items():
+        try:
+            await order_stats.update_one({"_id": scope}, {"$inc": inc}, upsert=True)
+        except Exception as e:
+            # The next rebuild_order_stats run corrects any drift
+            logger.error(f"Error updating stats counters for {scope}: {e}")
+
+    await record_rollup_change(before, after)
+
+async def update_order_tracked(query: dict, update: dict) -> Optional[dict]:
+    """Update one order and keep the stats counters in step
+    
+    Returns the order's tracked fields as they were before the update, or
+    None when nothing matched.
+    """
+    before = await db.orders.find_one_and_update(
+        query,
+        update,
+        projection=STATS_PROJECTION,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before:
+        after = {**before, **update.get("$set", {})}
+        for field in update.get("$unset", {}):
+            after.pop(field, None)
+        await record_order_change(before, after)
+    return before
+
+async def rebuild_order_stats() -> int:
+    """Recompute every counter document from the orders collection
+    
+    Returns the number of scopes written. Scopes without orders are removed.
+    """
+    group_keys = {
+        GLOBAL_SCOPE: None,
+        "cobbler": "$cobbler_id",
+        "client": "$client_id",
+    }
+    rebuilt_at = datetime.now(timezone.utc)
+    requests = []
+    scopes = []
+    for prefix, group_id in group_keys.items():
+        pipeline = [_group_stage(group_id)]
+        async for row in db.orders.aggregate(pipeline):
+            if prefix == GLOBAL_SCOPE:
+                scope = GLOBAL_SCOPE
+            elif row["_id"]:
+                scope = f"{prefix}:{row['_id']}"
+            else:
+                continue
+            row["_id"] = scope
+            row["rebuilt_at"] = rebuilt_at
+            scopes.append(scope)
+            requests.append(ReplaceOne({"_id": scope}, row, upsert=True))
+
+    if requests:
+        await order_stats.bulk_write(requests, ordered=False)
+    # Scopes left over from an earlier rebuild no longer have any orders
+    await order_stats.delete_many({"_id": {"$ne": REBUILD_MARKER_ID}, "rebuilt_at": {"$lt": rebuilt_at}})
+    await order_stats.replace_one(
+        {"_id": REBUILD_MARKER_ID},
+        {"rebuilt_at": rebuilt_at, "scopes": len(scopes)},
+        upsert=True
+    )
+    logger.info(f"Rebuilt stats counters for {len(scopes)} scopes")
+    return len(scopes)
+
+async def ensure_order_stats():
+    """Build the counters once on a deployment that has never had them"""
+    if not await order_stats.find_one({"_id": REBUILD_MARKER_ID}):
+        await rebuild_order_stats()
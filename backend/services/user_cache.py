@@ -0,0 +1,55 @@
+from typing import Optional
+from collections import OrderedDict
+import copy
+import logging
+import os
+import time
+from config.cache_stats import CacheStats
+from config.database import db
+
+logger = logging.getLogger(__name__)
+
+# Profiles are cached per worker; writes made through another worker become
+# visible once the entry expires
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+
+USER_PROFILE_PROJECTION = {"_id": 0, "password": 0}
+
+# user id -> (profile, monotonic expiry)
+_profiles: "OrderedDict[str, tuple]" = OrderedDict()
+
+_stats = CacheStats("invalidations")
+
+async def get_user_profile(user_id: str) -> Optional[dict]:
+    """User document without its password, served from the cache while fresh
+
+    Callers get their own copy and may modify it freely.
+    """
+    entry = _profiles.get(user_id)
+    if entry is not None:
+        profile, expires_at = entry
+        if expires_at > time.monotonic():
+            _profiles.move_to_end(user_id)
+            _stats.hit()
+            return copy.deepcopy(profile)
+        del _profiles[user_id]
+
+    _stats.miss()
+    profile = await db.users.find_one({"id": user_id}, USER_PROFILE_PROJECTION)
+    if profile is None:
+        return None
+
+    _profiles[user_id] = (profile, time.monotonic() + USER_CACHE_TTL_SECONDS)
+    while len(_profiles) > USER_CACHE_SIZE:
+        _profiles.popitem(last=False)
+    return copy.deepcopy(profile)
+
+def invalidate_user_profile(user_id: str):
+    """Drop a cached profile after the user document was written"""
+    if _profiles.pop(user_id, None) is not None:
+        _stats.add("invalidations")
+
+def get_user_cache_stats() -> dict:
+    """Counters of the profile cache (see CacheStats)"""
+    return _stats.snapshot(entries=len(_profiles), ttl_seconds=USER_CACHE_TTL_SECONDS)
@@ -283,7 +283,7 @@ export default function MediaManager() {
                         </div>
                       )}
                       <img
-                        src={`${BACKEND_URL}${media.url}`}
+                        src={`${BACKEND_URL}${media.url}?w=320`}
                         alt={media.title || media.original_name}
                         className="w-full h-40 object-cover rounded-lg border"
                       />
@@ -10,6 +10,36 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Small thumbnail of an image document; documents are served with auth, so they
+// are fetched as blobs rather than linked directly
+function DocumentPreview({ partnerId, docType, label, onClick }) {
+  const [previewUrl, setPreviewUrl] = useState(null);
+
+  useEffect(() => {
+    let url = null;
+    let cancelled = false;
+    axios.get(`${API}/admin/partners/${partnerId}/document/${docType}/preview`, { responseType: 'blob' })
+      .then((response) => {
+        if (cancelled) return;
+        url = URL.createObjectURL(response.data);
+        setPreviewUrl(url);
+      })
+      .catch(() => {});
+    return () => {
+      cancelled = true;
+      if (url) URL.revokeObjectURL(url);
+    };
+  }, [partnerId, docType]);
+
+  if (!previewUrl) return null;
+
+  return (
+    <button type="button" onClick={onClick} className="border rounded overflow-hidden">
+      <img src={previewUrl} alt={label} loading="lazy" className="h-20 w-auto object-cover" />
+    </button>
+  );
+}
+
 export default function PartnerManagement() {
   const [pendingPartners, setPendingPartners] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -66,8 +96,15 @@ export default function PartnerManagement() {
       }
 
       // Load document on-demand from API
-      const response = await axios.get(`${API}/admin/partners/${partner.id}/document/${docType}`);
-      setDocumentToView({ data: response.data.document, name: docName });
+      const response = await axios.get(`${API}/admin/partners/${partner.id}/document/${docType}`, {
+        responseType: 'blob'
+      });
+      if (documentToView?.url) URL.revokeObjectURL(documentToView.url);
+      setDocumentToView({
+        url: URL.createObjectURL(response.data),
+        type: response.data.type,
+        name: docName
+      });
       setViewDocumentOpen(true);
     } catch (error) {
       toast.error('Erreur lors du chargement du document');
@@ -120,6 +157,26 @@ export default function PartnerManagement() {
 
                   <div>
                     <p className="text-sm font-medium text-gray-700 mb-2">Documents :</p>
+                    <div className="flex gap-2 flex-wrap mb-2">
+                      <DocumentPreview
+                        partnerId={partner.id}
+                        docType="id_recto"
+                        label="ID Recto"
+                        onClick={() => viewDocument(partner, 'id_recto')}
+                      />
+                      <DocumentPreview
+                        partnerId={partner.id}
+                        docType="id_verso"
+                        label="ID Verso"
+                        onClick={() => viewDocument(partner, 'id_verso')}
+                      />
+                      <DocumentPreview
+                        partnerId={partner.id}
+                        docType="che_kbis"
+                        label="CHE/KBIS"
+                        onClick={() => viewDocument(partner, 'che_kbis')}
+                      />
+                    </div>
                     <div className="flex gap-2 flex-wrap">
                       <Button
                         size="sm"
@@ -182,13 +239,19 @@ export default function PartnerManagement() {
             <DialogTitle>{documentToView?.name}</DialogTitle>
           </DialogHeader>
           <div className="mt-4">
-            {documentToView?.data && (
+            {documentToView?.url && (documentToView.type === 'application/pdf' ? (
+              <iframe
+                src={documentToView.url}
+                title={documentToView.name}
+                className="w-full h-[70vh]"
+              />
+            ) : (
               <img
-                src={`data:image/jpeg;base64,${documentToView.data}`}
+                src={documentToView.url}
                 alt={documentToView.name}
                 className="w-full h-auto max-h-[70vh] object-contain"
               />
-            )}
+            ))}
           </div>
         </DialogContent>
       </Dialog>
@@ -54,49 +54,43 @@ export default function ReportGenerator({ userRole }) {
     }
   };
 
-  const downloadCSV = () => {
+  const downloadCSV = async () => {
     if (!reportData) return;
 
-    const csv = convertToCSV(reportData);
-    const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-    const link = document.createElement('a');
-    const url = URL.createObjectURL(blob);
-    
-    const filename = reportType === 'monthly' 
-      ? `rapport_${selectedYear}_${selectedMonth.padStart(2, '0')}.csv`
-      : `rapport_${selectedYear}.csv`;
-    
-    link.setAttribute('href', url);
-    link.setAttribute('download', filename);
-    link.style.visibility = 'hidden';
-    document.body.appendChild(link);
-    link.click();
-    document.body.removeChild(link);
-    
-    toast.success('Rapport téléchargé!');
-  };
+    try {
+      const params = {
+        year: selectedYear,
+        format: 'csv',
+        ...(reportType === 'monthly' && { month: selectedMonth })
+      };
 
-  const convertToCSV = (data) => {
-    const headers = Object.keys(data.summary || data).join(',');
-    const values = Object.values(data.summary || data).join(',');
-    
-    let csv = 'Rapport de Comptabilité\n\n';
-    csv += 'Période,' + (reportType === 'monthly' 
-      ? `${months.find(m => m.value === selectedMonth)?.label} ${selectedYear}` 
-      : selectedYear) + '\n\n';
-    
-    csv += headers + '\n';
-    csv += values + '\n\n';
-    
-    if (data.orders && data.orders.length > 0) {
-      csv += '\nDétail des Commandes\n';
-      csv += 'Date,Référence,Montant,Commission,Statut\n';
-      data.orders.forEach(order => {
-        csv += `${order.date},${order.reference},${order.amount},${order.commission || 0},${order.status}\n`;
+      // The export is streamed by the server and covers every order of the period
+      const response = await axios.get(`${API}/reports/${reportType}/export`, {
+        params,
+        responseType: 'blob'
       });
+
+      const blob = new Blob([response.data], { type: 'text/csv;charset=utf-8;' });
+      const link = document.createElement('a');
+      const url = URL.createObjectURL(blob);
+
+      const filename = reportType === 'monthly'
+        ? `rapport_${selectedYear}_${selectedMonth.padStart(2, '0')}.csv`
+        : `rapport_${selectedYear}.csv`;
+
+      link.setAttribute('href', url);
+      link.setAttribute('download', filename);
+      link.style.visibility = 'hidden';
+      document.body.appendChild(link);
+      link.click();
+      document.body.removeChild(link);
+      URL.revokeObjectURL(url);
+
+      toast.success('Rapport téléchargé!');
+    } catch (error) {
+      toast.error('Erreur lors du téléchargement du rapport');
+      console.error(error);
     }
-    
-    return csv;
   };
 
   return (
@@ -314,9 +308,9 @@ export default function ReportGenerator({ userRole }) {
                     </tbody>
                   </table>
                 </div>
-                {reportData.orders.length > 10 && (
+                {(reportData.summary?.total_orders || 0) > 10 && (
                   <div className="px-4 py-3 bg-green-50 text-sm text-green-700 text-center">
-                    Affichage des 10 premières commandes sur {reportData.orders.length}. 
+                    Affichage des 10 premières commandes sur {reportData.summary?.total_orders}. 
                     Téléchargez le CSV pour voir toutes les données.
                   </div>
                 )}
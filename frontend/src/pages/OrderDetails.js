@@ -238,7 +238,7 @@ export default function OrderDetails({ user }) {
                     {order.shoe_images.map((image, index) => (
                       <img
                         key={index}
-                        src={image}
+                        src={image.startsWith('/') ? `${BACKEND_URL}${image}?w=640` : image}
                         alt={`Shoe ${index + 1}`}
                         className="w-full h-48 object-cover rounded-lg border border-amber-200"
                         data-testid={`shoe-image-${index}`}
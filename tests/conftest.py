@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend is not an installed package; import it the way server.py does
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# config.database builds a (lazy) Motor client at import time; these unit
+# tests never talk to MongoDB
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
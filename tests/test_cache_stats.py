@@ -0,0 +1,66 @@
+import threading
+
+from config.cache_stats import CacheStats
+
+
+def test_snapshot_reports_counters_and_hit_rate():
+    stats = CacheStats("memory_hits", "evictions")
+    stats.hit("memory_hits")
+    stats.hit()
+    stats.miss()
+    stats.add(evictions=3)
+
+    assert stats.snapshot(entries=7) == {
+        "hits": 2,
+        "misses": 1,
+        "memory_hits": 1,
+        "evictions": 3,
+        "hit_rate": 0.6667,
+        "entries": 7,
+    }
+
+
+def test_hit_rate_is_none_before_any_lookup():
+    assert CacheStats().snapshot()["hit_rate"] is None
+
+
+def test_counters_without_hits():
+    stats = CacheStats("completed", hits=False)
+    stats.add("completed")
+
+    assert stats.snapshot() == {"completed": 1}
+    assert stats.get("completed") == 1
+
+
+def test_add_several_counters_at_once():
+    stats = CacheStats("queued", "running", "seconds", hits=False)
+    stats.add("running", queued=-1, seconds=0.5)
+
+    assert stats.snapshot() == {"queued": -1, "running": 1, "seconds": 0.5}
+
+
+def test_reserve_stops_at_the_limit_and_tracks_the_peak():
+    stats = CacheStats("queued", "peak", hits=False)
+
+    assert stats.reserve("queued", 2, peak="peak")
+    assert stats.reserve("queued", 2, peak="peak")
+    assert not stats.reserve("queued", 2, peak="peak")
+    stats.add(queued=-2)
+
+    assert stats.snapshot() == {"queued": 0, "peak": 2}
+
+
+def test_updates_from_threads_are_not_lost():
+    stats = CacheStats()
+
+    def work():
+        for _ in range(10000):
+            stats.hit()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats.get("hits") == 40000
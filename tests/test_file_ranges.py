@@ -0,0 +1,64 @@
+import pytest
+from fastapi import HTTPException
+
+from services.file_service import _parse_range
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-499", (0, 499)),
+    ("bytes=500-999", (500, 999)),
+    ("bytes=0-0", (0, 0)),
+    # The end is clamped to the last byte
+    ("bytes=900-5000", (900, 999)),
+    (" bytes = 10-19", (10, 19)),
+])
+def test_closed_range(header, expected):
+    assert _parse_range(header, SIZE) == expected
+
+
+def test_open_ended_range():
+    assert _parse_range("bytes=990-", SIZE) == (990, 999)
+    assert _parse_range("bytes=0-", SIZE) == (0, 999)
+
+
+def test_suffix_range():
+    assert _parse_range("bytes=-100", SIZE) == (900, 999)
+    # A suffix longer than the file means the whole file
+    assert _parse_range("bytes=-5000", SIZE) == (0, 999)
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",
+    "bytes=1000-1200",
+    "bytes=500-100",
+    "bytes=-0",
+])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as excinfo:
+        _parse_range(header, SIZE)
+
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers["Content-Range"] == f"bytes */{SIZE}"
+
+
+def test_any_range_of_an_empty_file_is_unsatisfiable():
+    with pytest.raises(HTTPException) as excinfo:
+        _parse_range("bytes=0-", 0)
+
+    assert excinfo.value.status_code == 416
+
+
+@pytest.mark.parametrize("header", [
+    # Multiple ranges are answered with the whole file rather than multipart
+    "bytes=0-99,200-299",
+    "bytes=0-99, -100",
+    # Other units and malformed specs are ignored
+    "items=0-5",
+    "bytes=abc-def",
+    "bytes=-",
+    "bytes=10",
+])
+def test_ignored_range(header):
+    assert _parse_range(header, SIZE) is None
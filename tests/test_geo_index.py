@@ -0,0 +1,54 @@
+from services.geo_index import NearestPointIndex, _to_unit_vector
+
+CITIES = [
+    ("geneva", 46.2044, 6.1432),
+    ("lausanne", 46.5197, 6.6323),
+    ("bern", 46.9480, 7.4474),
+    ("zurich", 47.3769, 8.5417),
+    ("lugano", 46.0037, 8.9511),
+]
+
+
+def test_nearest_returns_closest_point():
+    index = NearestPointIndex(CITIES)
+
+    assert index.size == len(CITIES)
+    # Nyon lies between Geneva and Lausanne, closer to Geneva
+    assert index.nearest(46.3833, 6.2398) == "geneva"
+    assert index.nearest(47.5596, 7.5886) == "bern"  # Basel
+    assert index.nearest(46.1670, 8.7943) == "lugano"  # Locarno
+
+
+def test_nearest_matches_brute_force():
+    index = NearestPointIndex(CITIES)
+
+    def brute_force(lat, lon):
+        target = _to_unit_vector(lat, lon)
+        return min(
+            CITIES,
+            key=lambda city: sum((a - b) ** 2 for a, b in zip(_to_unit_vector(city[1], city[2]), target))
+        )[0]
+
+    for lat in range(45, 49):
+        for lon in range(5, 11):
+            assert index.nearest(lat + 0.5, lon + 0.5) == brute_force(lat + 0.5, lon + 0.5)
+
+
+def test_nearest_across_the_antimeridian():
+    index = NearestPointIndex([("fiji", -17.7, 178.0), ("tahiti", -17.6, -149.4)])
+
+    # Longitude -179 is next to Fiji, even though the raw numbers are far apart
+    assert index.nearest(-17.0, -179.0) == "fiji"
+
+
+def test_single_point():
+    index = NearestPointIndex([("only", 46.2, 6.1)])
+
+    assert index.nearest(-33.9, 151.2) == "only"
+
+
+def test_empty_index():
+    index = NearestPointIndex([])
+
+    assert index.size == 0
+    assert index.nearest(46.2, 6.1) is None
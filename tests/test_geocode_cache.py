@@ -0,0 +1,33 @@
+from services.geocode_cache import normalize_address
+
+
+def test_case_and_whitespace_are_folded():
+    assert normalize_address("  Rue du Rhône 1,Genève  ") == "rue du rhône 1, genève"
+    assert normalize_address("RUE DU RHÔNE 1 ,  GENÈVE") == "rue du rhône 1, genève"
+    assert normalize_address("Rue\tdu\nRhône   1, Genève") == "rue du rhône 1, genève"
+
+
+def test_unicode_forms_share_a_key():
+    composed = "Genève"
+    decomposed = "Gene\u0300ve"
+    fullwidth = "\uff27\uff45\uff4e\u00e8\uff56\uff45"
+
+    assert normalize_address(decomposed) == normalize_address(composed)
+    assert normalize_address(fullwidth) == normalize_address(composed)
+    # casefold, not lower: ß and ss are the same street
+    assert normalize_address("Hauptstraße 5") == normalize_address("HAUPTSTRASSE 5")
+
+
+def test_leading_and_trailing_commas_are_dropped():
+    assert normalize_address(", Bahnhofstrasse 1, Zürich,") == "bahnhofstrasse 1, zürich"
+
+
+def test_strict_lookups_get_their_own_key():
+    assert normalize_address("Bern", strict=True) == "strict:bern"
+    assert normalize_address("Bern", strict=True) != normalize_address("Bern")
+
+
+def test_empty_addresses_give_an_empty_key():
+    assert normalize_address("") == ""
+    assert normalize_address(None) == ""
+    assert normalize_address(" , ", strict=True) == ""
@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from services.pagination import decode_cursor, encode_cursor, keyset_after
+
+
+def _raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 8, 30, 12, 345000, tzinfo=timezone.utc)
+
+    cursor = encode_cursor(created_at, "order-42")
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (created_at, "order-42")
+
+
+def test_naive_timestamps_decode_as_utc():
+    cursor = _raw_cursor(["2024-05-17T08:30:12", "order-42"])
+
+    created_at, _ = decode_cursor(cursor)
+
+    assert created_at == datetime(2024, 5, 17, 8, 30, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    encode_cursor(datetime(2024, 5, 17, tzinfo=timezone.utc), "order-42")[:-4],
+    _raw_cursor(["2024-05-17T08:30:12"]),
+    _raw_cursor(["yesterday", "order-42"]),
+    _raw_cursor({"created_at": "2024-05-17T08:30:12", "id": "order-42"}),
+    _raw_cursor(["2024-05-17T08:30:12", {"$gt": ""}]),
+    _raw_cursor([1715934612, "order-42"]),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor)
+
+    assert excinfo.value.status_code == 400
+
+
+def test_keyset_after_orders_by_created_at_then_id():
+    created_at = datetime(2024, 5, 17, tzinfo=timezone.utc)
+
+    assert keyset_after(None) == {}
+    assert keyset_after(encode_cursor(created_at, "b")) == {
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": "b"}}
+        ]
+    }
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from services.pricing_service import delivery_price_for, parse_cart_items
+
+
+def test_valid_cart_is_returned():
+    cart = [{"id": "svc-1", "quantity": 2}, {"id": "svc-2"}]
+
+    assert parse_cart_items(json.dumps(cart)) == cart
+
+
+@pytest.mark.parametrize("service_items", [
+    "not json",
+    None,
+    "42",
+    '"svc-1"',
+    "null",
+    '{"id": "svc-1"}',
+    "[1, 2]",
+    '[{"quantity": 1}]',
+    '[{"id": 7}]',
+])
+def test_malformed_cart_is_rejected(service_items):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_cart_items(service_items)
+
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == "Format de panier invalide"
+
+
+def test_empty_cart_is_rejected():
+    with pytest.raises(HTTPException) as excinfo:
+        parse_cart_items("[]")
+
+    assert excinfo.value.status_code == 400
+    assert excinfo.value.detail == "Le panier est vide"
+
+
+@pytest.mark.parametrize("quantity", [0, -1, 1.5, "2", None, True, [1]])
+def test_bad_quantity_is_rejected(quantity):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_cart_items(json.dumps([{"id": "svc-1", "quantity": quantity}]))
+
+    assert excinfo.value.status_code == 400
+
+
+def test_delivery_price():
+    assert delivery_price_for("express") == 15.0
+    assert delivery_price_for("standard") == 5.0
+    assert delivery_price_for("anything else") == 5.0
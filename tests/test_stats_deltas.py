@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+
+from services.rollup_service import _rollup_deltas
+from services.stats_service import _stats_deltas
+
+CREATED_AT = datetime(2024, 5, 17, 9, 0, tzinfo=timezone.utc)
+
+
+def _order(**fields):
+    order = {
+        "status": "pending",
+        "total_amount": 100.0,
+        "commission": 15.0,
+        "cobbler_id": "cob-1",
+        "client_id": "cli-1",
+        "created_at": CREATED_AT,
+    }
+    order.update(fields)
+    return order
+
+
+SCOPES = ["global", "cobbler:cob-1", "client:cli-1"]
+
+
+def test_new_order_counts_as_pending_everywhere():
+    deltas = _stats_deltas(None, _order())
+
+    assert sorted(deltas) == sorted(SCOPES)
+    for scope in SCOPES:
+        assert deltas[scope] == {"total_orders": 1, "pending_orders": 1}
+
+
+def test_delivery_moves_order_from_pending_to_completed_with_revenue():
+    deltas = _stats_deltas(_order(status="in_progress"), _order(status="delivered"))
+
+    for scope in SCOPES:
+        assert deltas[scope] == {
+            "pending_orders": -1,
+            "completed_orders": 1,
+            "total_revenue": 100.0,
+            "total_commission": 15.0,
+        }
+
+
+def test_status_change_within_pending_changes_nothing():
+    assert _stats_deltas(_order(status="pending"), _order(status="accepted")) == {}
+
+
+def test_cancellation_leaves_the_pending_count_only():
+    deltas = _stats_deltas(_order(status="accepted"), _order(status="cancelled"))
+
+    for scope in SCOPES:
+        assert deltas[scope] == {"pending_orders": -1}
+
+
+def test_cancelling_a_delivered_order_takes_back_its_revenue():
+    deltas = _stats_deltas(_order(status="delivered"), _order(status="cancelled"))
+
+    assert deltas["global"] == {
+        "completed_orders": -1,
+        "total_revenue": -100.0,
+        "total_commission": -15.0,
+    }
+
+
+def test_amount_change_only_counts_once_delivered():
+    assert _stats_deltas(_order(), _order(total_amount=120.0, commission=18.0)) == {}
+
+    deltas = _stats_deltas(_order(status="delivered"), _order(status="delivered", total_amount=120.0, commission=18.0))
+
+    assert deltas["global"] == {"total_revenue": 20.0, "total_commission": 3.0}
+
+
+def test_reassignment_moves_the_order_between_cobblers():
+    deltas = _stats_deltas(_order(), _order(cobbler_id="cob-2"))
+
+    assert "global" not in deltas
+    assert "client:cli-1" not in deltas
+    assert deltas["cobbler:cob-1"] == {"total_orders": -1, "pending_orders": -1}
+    assert deltas["cobbler:cob-2"] == {"total_orders": 1, "pending_orders": 1}
+
+
+def test_deleted_order_is_subtracted():
+    deltas = _stats_deltas(_order(status="delivered"), None)
+
+    assert deltas["global"] == {
+        "total_orders": -1,
+        "completed_orders": -1,
+        "total_revenue": -100.0,
+        "total_commission": -15.0,
+    }
+
+
+def test_rollup_new_order():
+    deltas = _rollup_deltas(None, _order())
+
+    assert deltas == {
+        ("global", "2024-05"): (None, {
+            "orders": 1,
+            "revenue": 100.0,
+            "commission": 15.0,
+            "status_counts.pending": 1,
+        }),
+        ("cobbler:cob-1", "2024-05"): ("cob-1", {
+            "orders": 1,
+            "revenue": 100.0,
+            "commission": 15.0,
+            "status_counts.pending": 1,
+        }),
+    }
+
+
+def test_rollup_status_transition_moves_the_status_count():
+    deltas = _rollup_deltas(_order(status="pending"), _order(status="cancelled"))
+
+    assert deltas[("global", "2024-05")] == (None, {"status_counts.pending": -1, "status_counts.cancelled": 1})
+
+
+def test_rollup_amount_change():
+    deltas = _rollup_deltas(_order(), _order(total_amount=80.0, commission=12.0))
+
+    assert deltas[("global", "2024-05")] == (None, {"revenue": -20.0, "commission": -3.0})
+
+
+def test_rollup_unchanged_order_gives_no_delta():
+    assert _rollup_deltas(_order(), _order()) == {}
+
+
+def test_rollup_ignores_orders_without_created_at():
+    assert _rollup_deltas(None, _order(created_at=None)) == {}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+from fastapi import FastAPI, Request
+
+from config.upload_limit import UploadSizeLimitMiddleware
+
+LIMIT = 100
+
+
+def _app():
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/api/orders/upload")
+    async def upload(request: Request):
+        app.state.calls += 1
+        return {"received": len(await request.body())}
+
+    @app.post("/api/other")
+    async def other(request: Request):
+        return {"received": len(await request.body())}
+
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=LIMIT, path_prefix="/api/orders")
+    return app
+
+
+def _post(app, path, chunks, headers=()):
+    """Send a POST through the ASGI app; returns (status, JSON body)"""
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, json.loads(body)
+
+
+def test_body_within_limit_passes():
+    app = _app()
+
+    status, body = _post(app, "/api/orders/upload", [b"x" * LIMIT], [("content-length", str(LIMIT))])
+
+    assert status == 200
+    assert body == {"received": LIMIT}
+
+
+def test_declared_length_over_limit_is_refused_up_front():
+    app = _app()
+
+    status, body = _post(app, "/api/orders/upload", [b"x" * (LIMIT + 1)], [("content-length", str(LIMIT + 1))])
+
+    assert status == 413
+    assert body == {"detail": "Upload exceeds the request size limit"}
+    # The route never ran
+    assert app.state.calls == 0
+
+
+def test_chunked_body_over_limit_is_refused_while_streaming():
+    app = _app()
+
+    status, body = _post(
+        app,
+        "/api/orders/upload",
+        [b"x" * 60, b"x" * 60, b"x" * 60],
+        [("transfer-encoding", "chunked")]
+    )
+
+    assert status == 413
+    assert body == {"detail": "Upload exceeds the request size limit"}
+
+
+def test_chunked_body_within_limit_passes():
+    app = _app()
+
+    status, body = _post(app, "/api/orders/upload", [b"x" * 50, b"x" * 50], [("transfer-encoding", "chunked")])
+
+    assert status == 200
+    assert body == {"received": 100}
+
+
+def test_other_paths_are_not_limited():
+    app = _app()
+
+    status, body = _post(app, "/api/other", [b"x" * (LIMIT * 3)], [("content-length", str(LIMIT * 3))])
+
+    assert status == 200
+    assert body == {"received": LIMIT * 3}